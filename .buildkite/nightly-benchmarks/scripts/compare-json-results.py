@@ -6,128 +6,124 @@ import os
 from importlib import util
 
 import pandas as pd
+from latency_sketch import parse_percentiles, sketch_percentiles
 
 plotly_found = util.find_spec("plotly.express") is not None
 
 
-def compare_data_columns(
-    files, name_column, data_column, info_cols, drop_column, debug=False
-):
-    """
-    Align concatenation by keys derived from info_cols instead of row order.
-    - Pick one canonical key list: subset of info_cols present in ALL files.
-    - For each file: set index to those keys, aggregate duplicates
-    - (mean for metric, first for names).
-    - Concat along axis=1 (indexes align), then reset_index so callers can
-    - group by columns.
-    - If --debug, add a <file_label>_name column per file.
+def file_label(file: str) -> str:
+    """Column label of a results file: its folder, or its name if it has none."""
+    return "/".join(file.split("/")[:-1]) or os.path.basename(file)
+
+
+def load_long_frame(files, info_cols, drop_column):
     """
-    print("\ncompare_data_column:", data_column)
+    Read every results file once into a single long-format frame.
 
+    Each row keeps its file's label in a `source` column. Returns the frame
+    and the key columns: the info_cols present in ALL files, or as a soft
+    fallback the info_cols present in the first one.
+    """
     frames = []
-    raw_data_cols = []
-    compare_frames = []
-
-    # 1) choose a canonical key list from info_cols that exists in ALL files
-    cols_per_file = []
-    for f in files:
+    for file in files:
         try:
-            df_tmp = pd.read_json(f, orient="records")
+            df = pd.read_json(file, orient="records")
         except Exception as err:
-            raise ValueError(f"Failed to read {f}") from err
-        cols_per_file.append(set(df_tmp.columns))
+            raise ValueError(f"Failed to read {file}") from err
 
-    key_cols = [c for c in info_cols if all(c in cset for cset in cols_per_file)]
+        # Keep rows that actually have the compared metrics
+        if drop_column in df.columns:
+            df = df.dropna(subset=[drop_column], ignore_index=True)
+        df["source"] = file_label(file)
+        frames.append(df)
+
+    key_cols = [c for c in info_cols if all(c in df.columns for df in frames)]
     if not key_cols:
-        # soft fallback: use any info_cols present in the first file
-        key_cols = [c for c in info_cols if c in list(cols_per_file[0])]
+        key_cols = [c for c in info_cols if c in frames[0].columns]
     if not key_cols:
         raise ValueError(
             "No common key columns found from info_cols across the input files."
         )
 
-    # 2) build a single "meta" block (keys as columns) once, aligned by the key index
-    meta_added = False
+    long_df = pd.concat(frames, ignore_index=True)
+    # Stabilize numeric key columns (harmless if missing)
+    for c in (
+        "Input Len",
+        "Output Len",
+        "TP Size",
+        "PP Size",
+        "# of max concurrency.",
+        "qps",
+    ):
+        if c in long_df.columns:
+            long_df[c] = pd.to_numeric(long_df[c], errors="coerce")
+    return long_df, key_cols
+
 
-    for file in files:
-        df = pd.read_json(file, orient="records")
+def add_pooled_percentiles(long_df, key_cols, percentiles):
+    """
+    Add TTFT/TPOT/ITL percentile columns computed from latency sketches.
 
-        # Keep rows that actually have the compared metric (same as original behavior)
-        if drop_column in df.columns:
-            df = df.dropna(subset=[drop_column], ignore_index=True)
+    Rows sharing key columns and source (repeated runs) are pooled by
+    merging their sketches, so a P99 is that of all their requests rather
+    than a mean of per-run P99s. Returns the frame and the added columns.
+    """
+    if not percentiles or "Latency sketches" not in long_df.columns:
+        return long_df, []
+    pooled = []
+    for _, group in long_df.groupby(key_cols + ["source"], dropna=False):
+        values = sketch_percentiles(list(group["Latency sketches"]), percentiles)
+        pooled.append(pd.DataFrame(values, index=group.index))
+    pooled = pd.concat(pooled)
+    columns = list(pooled.columns)
+    long_df = long_df.drop(columns=columns, errors="ignore").join(pooled)
+    return long_df, columns
+
+
+def compare_data_columns(
+    long_df, key_cols, name_column, data_columns, info_cols, debug=False
+):
+    """
+    Align every metric of every file by key columns in one pivot.
 
-        # Stabilize numeric key columns (harmless if missing)
-        for c in (
-            "Input Len",
-            "Output Len",
-            "TP Size",
-            "PP Size",
-            "# of max concurrency.",
-            "qps",
-        ):
-            if c in df.columns:
-                df[c] = pd.to_numeric(df[c], errors="coerce")
-
-        # Ensure all key columns exist
-        for c in key_cols:
-            if c not in df.columns:
-                df[c] = pd.NA
-
-        # Set index = key_cols and aggregate duplicates → unique MultiIndex
-        df_idx = df.set_index(key_cols, drop=False)
-
-        # meta (key columns), unique per key
-        meta = df_idx[key_cols]
-        if not meta.index.is_unique:
-            meta = meta.groupby(level=key_cols, dropna=False).first()
-
-        # metric series for this file, aggregated to one row per key
-        file_label = "/".join(file.split("/")[:-1]) or os.path.basename(file)
-        s = df_idx[data_column]
-        if not s.index.is_unique:
-            s = s.groupby(level=key_cols, dropna=False).mean()
-        s.name = file_label  # column label like original
-
-        # add meta once (from first file) so keys are the leftmost columns
-        if not meta_added:
-            frames.append(meta)
-            meta_added = True
-
-        # (NEW) debug: aligned test-name column per file
-        if debug and name_column in df_idx.columns:
-            name_s = df_idx[name_column]
-            if not name_s.index.is_unique:
-                name_s = name_s.groupby(level=key_cols, dropna=False).first()
-            name_s.name = f"{file_label}_name"
-            frames.append(name_s)
-
-        frames.append(s)
-        raw_data_cols.append(file_label)
-        compare_frames.append(s)
-
-        # Generalize ratio: for any file N>=2, add ratio (fileN / file1)
-        if len(compare_frames) >= 2:
-            base = compare_frames[0]
-            current = compare_frames[-1]
-            ratio = current / base
-            ratio = ratio.mask(base == 0)  # avoid inf when baseline is 0
-            ratio.name = f"Ratio 1 vs {len(compare_frames)}"
-            frames.append(ratio)
-
-    # 4) concat on columns with aligned MultiIndex;
-    # then reset_index to return keys as columns
-    concat_df = pd.concat(frames, axis=1)
-    concat_df = concat_df.reset_index(drop=True).reset_index()
-    if "index" in concat_df.columns:
-        concat_df = concat_df.drop(columns=["index"])
-
-    # Ensure key/info columns appear first (in your info_cols order)
-    front = [c for c in info_cols if c in concat_df.columns]
-    rest = [c for c in concat_df.columns if c not in front]
-    concat_df = concat_df[front + rest]
-
-    print(raw_data_cols)
-    return concat_df, raw_data_cols
+    - Rows of all files are grouped by key_cols and source once
+    - (mean for metrics, first for names), then unstacked so each file
+    - becomes a column per metric.
+    - For any file N>=2 a "Ratio 1 vs N" (fileN / file1) column follows it.
+    - If --debug, add a <file_label>_name column per file.
+
+    Returns {metric: (frame, raw data column labels)} with key columns first.
+    """
+    sources = list(dict.fromkeys(long_df["source"]))
+    data_columns = [c for c in data_columns if c in long_df.columns]
+    grouped = long_df.groupby(key_cols + ["source"], dropna=False)
+    wide = grouped[data_columns].mean()
+    if debug and name_column in long_df.columns:
+        wide[name_column] = grouped[name_column].first()
+    wide = wide.unstack("source")
+    keys = wide.index.to_frame(index=False)
+
+    results = {}
+    for data_column in data_columns:
+        print("\ncompare_data_column:", data_column)
+        values = wide[data_column].reindex(columns=sources)
+        base = values[sources[0]]
+        columns = {}
+        for n, source in enumerate(sources, start=1):
+            if debug and name_column in long_df.columns:
+                columns[f"{source}_name"] = wide[name_column][source]
+            columns[source] = values[source]
+            if n >= 2:
+                # avoid inf when baseline is 0
+                columns[f"Ratio 1 vs {n}"] = (values[source] / base).mask(base == 0)
+        frame = pd.concat([keys, pd.DataFrame(columns).reset_index(drop=True)], axis=1)
+
+        # Ensure key/info columns appear first (in your info_cols order)
+        front = [c for c in info_cols if c in frame.columns]
+        rest = [c for c in frame.columns if c not in front]
+        print(sources)
+        results[data_column] = (frame[front + rest], list(sources))
+    return results
 
 
 def split_json_by_tp_pp(
@@ -220,6 +216,13 @@ if __name__ == "__main__":
         default="# of max concurrency.",
         help="column name to use as X Axis in comparison graph",
     )
+    parser.add_argument(
+        "--percentiles",
+        type=parse_percentiles,
+        default=[],
+        help="comma-separated TTFT/TPOT/ITL percentiles to compare, e.g. 90,99.9, "
+        "pooled over repeated runs from the results' latency sketches",
+    )
     args = parser.parse_args()
 
     drop_column = "P99"
@@ -251,16 +254,18 @@ if __name__ == "__main__":
     plot = args.plot
     # For Plot feature, assign y axis from one of info_cols
     y_axis_index = info_cols.index(args.xaxis) if args.xaxis in info_cols else 6
+    long_df, key_cols = load_long_frame(files, info_cols, drop_column)
+    long_df, percentile_cols = add_pooled_percentiles(
+        long_df, key_cols, args.percentiles
+    )
+    data_cols_to_compare += percentile_cols
+    html_msgs_for_data_cols += [f"{c} /n" for c in percentile_cols]
+    comparisons = compare_data_columns(
+        long_df, key_cols, name_column, data_cols_to_compare, info_cols, debug=debug
+    )
     with open("perf_comparison.html", "w") as text_file:
         for i in range(len(data_cols_to_compare)):
-            output_df, raw_data_cols = compare_data_columns(
-                files,
-                name_column,
-                data_cols_to_compare[i],
-                info_cols,
-                drop_column,
-                debug=debug,
-            )
+            output_df, raw_data_cols = comparisons[data_cols_to_compare[i]]
 
             # For Plot feature, insert y axis from one of info_cols
             raw_data_cols.insert(0, info_cols[y_axis_index])
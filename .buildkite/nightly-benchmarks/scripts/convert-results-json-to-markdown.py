@@ -5,15 +5,30 @@ import argparse
 import json
 import os
 import shlex
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from importlib import util
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
 import pandas as pd
 import psutil
 import regex as re
+from latency_sketch import (
+    compact_serving_result,
+    parse_percentiles,
+    sketch_percentiles,
+)
 from tabulate import tabulate
 
+if util.find_spec("orjson") is not None:
+    from orjson import loads as json_loads
+else:
+    json_loads = json.loads
+
+# below this many result files a process pool costs more than it saves
+PARALLEL_MIN_FILES = 64
+
 # latency results and the keys that will be printed into markdown
 latency_results = []
 latency_column_mapping = {
@@ -128,8 +143,14 @@ def _coerce(val: str) -> Any:
     return val
 
 
+@lru_cache(maxsize=1024)
 def parse_client_command(cmd: str) -> dict[str, Any]:
-    """Parse the client_command shell string into {executable, script, args}."""
+    """
+    Parse the client_command shell string into {executable, script, args}.
+
+    Results are cached by command string, since most result files share a
+    server command; treat the returned dict as read-only.
+    """
     toks = shlex.split(cmd)
     if len(toks) < 2:
         raise ValueError("client_command must include an executable and a script")
@@ -189,129 +210,220 @@ def parse_client_command(cmd: str) -> dict[str, Any]:
     return {"executable": executable, "script": script, "args": args}
 
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument(
-        "-r",
-        "--result",
-        type=str,
-        default="results",
-        help="Folder name for benchmark output results.",
-    )
-    args = parser.parse_args()
-    results_folder = Path(args.result)
-    if not results_folder.exists():
-        raise FileNotFoundError(f"results folder does not exist: {results_folder}")
-    # collect results
-    for test_file in results_folder.glob("*.json"):
-        with open(test_file) as f:
-            raw_result = json.loads(f.read())
-
-        if "serving" in str(test_file):
-            # this result is generated via `vllm bench serve` command
-            # attach the benchmarking command to raw_result
-            try:
-                with open(test_file.with_suffix(".commands")) as f:
-                    command = json.loads(f.read())
-            except OSError as e:
-                print(e)
-                continue
-            # Parse Server Command Arg
-            out: dict[str, Any] = {
-                "server_command": parse_client_command(command["server_command"])
-            }
-            parse_args = [
-                "--tensor-parallel-size",
-                "--pipeline-parallel-size",
-                "--dtype",
-            ]
-            col_mapping = ["tp_size", "pp_size", "dtype"]
-            for index, arg in enumerate(parse_args):
-                if arg in out["server_command"]["args"]:
-                    raw_result.update(
-                        {col_mapping[index]: out["server_command"]["args"][arg]}
-                    )
-
-            # Parse Client Command Arg
-            out: dict[str, Any] = {
-                "client_command": parse_client_command(command["client_command"])
-            }
-            parse_args = [
-                "--dataset-name",
-                "--random-input-len",
-                "--random-output-len",
-                "--request-rate",
-            ]
-            col_mapping = ["dataset_name", "input_len", "output_len", "qps"]
-
-            for index, arg in enumerate(parse_args):
-                if arg in out["client_command"]["args"]:
-                    raw_result.update(
-                        {col_mapping[index]: out["client_command"]["args"][arg]}
-                    )
-            # Add Server, Client command
-            raw_result.update(command)
-
-            # update the test name of this result
-            raw_result.update({"test_name": test_file.stem})
-            # add the result to raw_result
-            serving_results.append(raw_result)
-            continue
+def parallel_config(cmd: str) -> dict[str, Any]:
+    """Model and TP/PP sizes from a `vllm bench latency/throughput` command."""
+    try:
+        args = parse_client_command(cmd)["args"]
+    except ValueError:
+        return {}
+    config = {}
+    for arg, key in (
+        ("--model", "model"),
+        ("--tensor-parallel-size", "tp_size"),
+        ("--pipeline-parallel-size", "pp_size"),
+    ):
+        if arg in args:
+            config[key] = args[arg]
+    return config
 
-        elif "latency" in f.name:
-            # this result is generated via `vllm bench latency` command
 
-            # attach the benchmarking command to raw_result
-            try:
-                with open(test_file.with_suffix(".commands")) as f:
-                    command = json.loads(f.read())
-            except OSError as e:
-                print(e)
-                continue
+def read_json(path: Path) -> Any:
+    with open(path, "rb") as f:
+        return json_loads(f.read())
 
-            raw_result.update(command)
 
-            # update the test name of this result
-            raw_result.update({"test_name": test_file.stem})
+def load_result(test_file: Path) -> Optional[tuple[str, dict[str, Any]]]:
+    """
+    Read one result file and its .commands sidecar.
 
-            # get different percentiles
-            for perc in [10, 25, 50, 75, 90, 99]:
-                # Multiply 1000 to convert the time unit from s to ms
+    Returns the benchmark kind ("serving", "latency" or "throughput") and the
+    result with the command details merged in, or None if it is skipped.
+    """
+    raw_result = read_json(test_file)
+
+    if "serving" in str(test_file):
+        # this result is generated via `vllm bench serve` command
+        # attach the benchmarking command to raw_result
+        try:
+            command = read_json(test_file.with_suffix(".commands"))
+        except OSError as e:
+            print(e)
+            return None
+        # Parse Server Command Arg
+        out: dict[str, Any] = {
+            "server_command": parse_client_command(command["server_command"])
+        }
+        parse_args = [
+            "--tensor-parallel-size",
+            "--pipeline-parallel-size",
+            "--dtype",
+        ]
+        col_mapping = ["tp_size", "pp_size", "dtype"]
+        for index, arg in enumerate(parse_args):
+            if arg in out["server_command"]["args"]:
                 raw_result.update(
-                    {f"P{perc}": 1000 * raw_result["percentiles"][str(perc)]}
+                    {col_mapping[index]: out["server_command"]["args"][arg]}
                 )
-            raw_result["avg_latency"] = raw_result["avg_latency"] * 1000
 
-            # add the result to raw_result
-            latency_results.append(raw_result)
-            continue
+        # Parse Client Command Arg
+        out: dict[str, Any] = {
+            "client_command": parse_client_command(command["client_command"])
+        }
+        parse_args = [
+            "--dataset-name",
+            "--random-input-len",
+            "--random-output-len",
+            "--request-rate",
+        ]
+        col_mapping = ["dataset_name", "input_len", "output_len", "qps"]
 
-        elif "throughput" in f.name:
-            # this result is generated via `vllm bench throughput` command
+        for index, arg in enumerate(parse_args):
+            if arg in out["client_command"]["args"]:
+                raw_result.update(
+                    {col_mapping[index]: out["client_command"]["args"][arg]}
+                )
+        # Add Server, Client command
+        raw_result.update(command)
 
-            # attach the benchmarking command to raw_result
-            try:
-                with open(test_file.with_suffix(".commands")) as f:
-                    command = json.loads(f.read())
-            except OSError as e:
-                print(e)
-                continue
+        # collapse per-request latencies into mergeable sketches, unless
+        # run-performance-benchmarks.sh already did when saving the file
+        compact_serving_result(raw_result)
 
-            raw_result.update(command)
+        # update the test name of this result
+        raw_result.update({"test_name": test_file.stem})
+        # add the result to raw_result
+        return "serving", raw_result
 
-            # update the test name of this result
-            raw_result.update({"test_name": test_file.stem})
+    elif "latency" in str(test_file):
+        # this result is generated via `vllm bench latency` command
 
-            # add the result to raw_result
-            throughput_results.append(raw_result)
-            continue
+        # attach the benchmarking command to raw_result
+        try:
+            command = read_json(test_file.with_suffix(".commands"))
+        except OSError as e:
+            print(e)
+            return None
+
+        raw_result.update(command)
+        raw_result.update(parallel_config(command.get("latency_command", "")))
+
+        # update the test name of this result
+        raw_result.update({"test_name": test_file.stem})
+
+        # get different percentiles
+        for perc in [10, 25, 50, 75, 90, 99]:
+            # Multiply 1000 to convert the time unit from s to ms
+            raw_result.update({f"P{perc}": 1000 * raw_result["percentiles"][str(perc)]})
+        raw_result["avg_latency"] = raw_result["avg_latency"] * 1000
+
+        # add the result to raw_result
+        return "latency", raw_result
 
-        print(f"Skipping {test_file}")
+    elif "throughput" in str(test_file):
+        # this result is generated via `vllm bench throughput` command
+
+        # attach the benchmarking command to raw_result
+        try:
+            command = read_json(test_file.with_suffix(".commands"))
+        except OSError as e:
+            print(e)
+            return None
+
+        raw_result.update(command)
+        raw_result.update(parallel_config(command.get("throughput_command", "")))
+
+        # update the test name of this result
+        raw_result.update({"test_name": test_file.stem})
+
+        # add the result to raw_result
+        return "throughput", raw_result
+
+    print(f"Skipping {test_file}")
+    return None
+
+
+def load_results(
+    test_files: list[Path], jobs: Optional[int] = None
+) -> list[Optional[tuple[str, dict[str, Any]]]]:
+    """load_result for every file, in order, across a process pool."""
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(test_files) < PARALLEL_MIN_FILES:
+        return [load_result(test_file) for test_file in test_files]
+    chunksize = max(1, len(test_files) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(load_result, test_files, chunksize=chunksize))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-r",
+        "--result",
+        type=str,
+        default="results",
+        help="Folder name for benchmark output results.",
+    )
+    parser.add_argument(
+        "--store",
+        type=str,
+        default=None,
+        help="Parquet results store to append this run to (see results_store.py).",
+    )
+    parser.add_argument(
+        "--commit",
+        type=str,
+        default=None,
+        help="Commit recorded in the store, defaults to $BUILDKITE_COMMIT or HEAD.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Processes used to read results, defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--percentiles",
+        type=parse_percentiles,
+        default=[],
+        help="Comma-separated TTFT/TPOT/ITL percentiles to add to the serving "
+        "table, e.g. 90,99.9 (needs `vllm bench serve --save-detailed`).",
+    )
+    args = parser.parse_args()
+    results_folder = Path(args.result)
+    if not results_folder.exists():
+        raise FileNotFoundError(f"results folder does not exist: {results_folder}")
+    # collect results, in parallel for the large CPU matrices
+    test_files = sorted(results_folder.glob("*.json"))
+    results_by_kind = {
+        "serving": serving_results,
+        "latency": latency_results,
+        "throughput": throughput_results,
+    }
+    for loaded in load_results(test_files, args.jobs):
+        if loaded is not None:
+            kind, raw_result = loaded
+            results_by_kind[kind].append(raw_result)
 
     latency_results = pd.DataFrame.from_dict(latency_results)
     serving_results = pd.DataFrame.from_dict(serving_results)
     throughput_results = pd.DataFrame.from_dict(throughput_results)
 
+    if args.store:
+        # keep the full history in the columnar store
+        from results_store import append_results
+
+        rows = append_results(
+            args.store,
+            {
+                "latency": latency_results,
+                "throughput": throughput_results,
+                "serving": serving_results,
+            },
+            commit=args.commit,
+        )
+        print(f"Appended {rows} results to {args.store}")
+
     svmem = psutil.virtual_memory()
     platform_data = {
         "Physical cores": [psutil.cpu_count(logical=False)],
@@ -333,9 +445,12 @@ if __name__ == "__main__":
         platform_data, orient="index", columns=["Platform Info"]
     )
 
-    raw_results_json = results_to_json(
-        latency_results, throughput_results, serving_results
-    )
+    # sketches go to the json results only, not to the markdown tables
+    latency_sketches = None
+    if "latency_sketches" in serving_results.columns:
+        latency_sketches = serving_results["latency_sketches"].map(
+            lambda s: s if isinstance(s, dict) else None
+        )
 
     # remapping the key, for visualization purpose
     if not latency_results.empty:
@@ -349,6 +464,15 @@ if __name__ == "__main__":
         serving_results = serving_results[valid_columns].rename(
             columns=serving_column_mapping
         )
+        if args.percentiles and latency_sketches is not None:
+            percentiles = pd.DataFrame.from_records(
+                [
+                    sketch_percentiles(s, args.percentiles) if s else {}
+                    for s in latency_sketches
+                ],
+                index=serving_results.index,
+            )
+            serving_results = pd.concat([serving_results, percentiles], axis=1)
     if not throughput_results.empty:
         throughput_results = throughput_results[
             list(throughput_results_column_mapping.keys())
@@ -407,6 +531,10 @@ if __name__ == "__main__":
         results = (
             latency_results.to_dict(orient="records")
             + throughput_results.to_dict(orient="records")
-            + serving_results.to_dict(orient="records")
+            + (
+                serving_results.assign(**{"Latency sketches": latency_sketches})
+                if latency_sketches is not None
+                else serving_results
+            ).to_dict(orient="records")
         )
         f.write(json.dumps(results))
@@ -0,0 +1,276 @@
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright contributors to the vLLM project
+"""
+Flag performance regressions against the history in the results store.
+
+For every benchmark configuration (model, dataset, input/output length,
+TP, PP, qps, max concurrency, hardware) the latest run is compared with a
+rolling baseline made of the previous runs of the same configuration. The
+baseline is the median of the last --window runs and its spread is the
+median absolute deviation, so a single noisy night neither hides nor fakes
+a regression. A metric regresses when it is worse than the baseline by
+more than --threshold robust standard deviations AND by more than
+--min-change relative to it.
+
+    python3 detect-regressions.py --store perf-store \
+        --output-json regressions.json --output-md regressions.md
+
+The JSON verdict is meant for automation; the markdown is a Buildkite
+annotation (`buildkite-agent annotate --style warning < regressions.md`).
+"""
+
+import argparse
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+from results_store import load_results
+from tabulate import tabulate
+
+KEY_COLUMNS = [
+    "benchmark",
+    "model",
+    "dataset_name",
+    "input_len",
+    "output_len",
+    "tp_size",
+    "pp_size",
+    "qps",
+    "max_concurrency",
+    "hardware",
+]
+
+# metric -> True if lower is better
+DEFAULT_METRICS = {
+    "median_ttft_ms": True,
+    "p99_ttft_ms": True,
+    "median_tpot_ms": True,
+    "p99_tpot_ms": True,
+    "output_throughput": False,
+    "avg_latency": True,
+    "P99": True,
+    "tokens_per_second": False,
+}
+
+# MAD -> standard deviation for normally distributed noise
+MAD_SCALE = 1.4826
+
+
+def run_values(history: pd.DataFrame, metric: str) -> pd.DataFrame:
+    """One value per (configuration, run): the mean of repeated results."""
+    return (
+        history.dropna(subset=[metric])
+        .groupby(KEY_COLUMNS + ["run_id"], dropna=False)
+        .agg(
+            value=(metric, "mean"),
+            timestamp=("timestamp", "max"),
+            commit=("commit", "first"),
+        )
+        .reset_index()
+    )
+
+
+def detect(
+    history: pd.DataFrame,
+    candidate_run: str,
+    metrics: dict[str, bool],
+    window: int = 10,
+    min_history: int = 3,
+    threshold: float = 3.0,
+    min_change: float = 0.05,
+    noise_floor: float = 0.01,
+) -> pd.DataFrame:
+    """
+    Compare candidate_run with the rolling baseline of each configuration.
+
+    Returns one row per (configuration, metric) with the candidate value,
+    baseline median, MAD, robust z-score (positive = worse), relative
+    change and a verdict: regression, improvement, ok or no_baseline.
+    """
+    started = history.loc[history["run_id"] == candidate_run, "timestamp"].min()
+    verdicts = []
+    for metric, lower_is_better in metrics.items():
+        if metric not in history.columns:
+            continue
+        runs = run_values(history, metric)
+        candidate = runs[runs["run_id"] == candidate_run]
+        if candidate.empty:
+            continue
+        past = runs[runs["timestamp"] < started].sort_values("timestamp")
+        past = past.groupby(KEY_COLUMNS, dropna=False).tail(window)
+        baseline = (
+            past.groupby(KEY_COLUMNS, dropna=False)["value"]
+            .agg(
+                baseline="median",
+                mad=lambda s: (s - s.median()).abs().median(),
+                runs="count",
+            )
+            .reset_index()
+        )
+        merged = candidate.merge(baseline, on=KEY_COLUMNS, how="left")
+        merged["runs"] = merged["runs"].fillna(0).astype(int)
+
+        # Robust sigma, floored so a perfectly stable history does not turn
+        # every tiny wobble into an infinite z-score
+        sigma = np.maximum(
+            MAD_SCALE * merged["mad"], noise_floor * merged["baseline"].abs()
+        )
+        sign = 1 if lower_is_better else -1
+        delta = sign * (merged["value"] - merged["baseline"])
+        merged["z"] = delta / sigma.replace(0, np.nan)
+        merged["change"] = (merged["value"] - merged["baseline"]) / merged[
+            "baseline"
+        ].replace(0, np.nan)
+        worse = delta / merged["baseline"].abs().replace(0, np.nan)
+
+        merged["verdict"] = np.select(
+            [
+                merged["runs"] < min_history,
+                (merged["z"] > threshold) & (worse > min_change),
+                (merged["z"] < -threshold) & (worse < -min_change),
+            ],
+            ["no_baseline", "regression", "improvement"],
+            default="ok",
+        )
+        merged["metric"] = metric
+        merged["lower_is_better"] = lower_is_better
+        verdicts.append(merged)
+
+    if not verdicts:
+        return pd.DataFrame()
+    return pd.concat(verdicts, ignore_index=True)
+
+
+def to_verdict(results: pd.DataFrame, candidate_run: str) -> dict:
+    """Machine-readable summary of detect()."""
+    counts = results["verdict"].value_counts().to_dict() if not results.empty else {}
+    records = json.loads(
+        results.drop(columns=["timestamp"], errors="ignore").to_json(orient="records")
+    )
+    return {
+        "status": "regression" if counts.get("regression") else "ok",
+        "candidate_run": candidate_run,
+        "commit": results["commit"].iloc[0] if not results.empty else None,
+        "counts": counts,
+        "results": records,
+    }
+
+
+def to_markdown(results: pd.DataFrame, candidate_run: str) -> str:
+    """Buildkite annotation listing regressions and improvements."""
+    lines = [f"## Performance regression check for run `{candidate_run}`", ""]
+    if results.empty:
+        return "\n".join(lines + ["No results for this run.", ""])
+
+    counts = results["verdict"].value_counts()
+    verdicts = ("regression", "improvement", "ok", "no_baseline")
+    lines.append(", ".join(f"{counts.get(v, 0)} {v}" for v in verdicts))
+    columns = {
+        "model": "Model",
+        "hardware": "Hardware",
+        "tp_size": "TP",
+        "pp_size": "PP",
+        "qps": "qps",
+        "max_concurrency": "# of max concurrency.",
+        "metric": "Metric",
+        "value": "Value",
+        "baseline": "Baseline (median)",
+        "change": "Change",
+        "z": "z",
+        "runs": "Baseline runs",
+    }
+    for verdict, title in (
+        ("regression", "Regressions"),
+        ("improvement", "Improvements"),
+    ):
+        rows = results[results["verdict"] == verdict]
+        if rows.empty:
+            continue
+        table = rows[list(columns)].rename(columns=columns).copy()
+        table["Change"] = table["Change"].map(lambda c: f"{c:+.1%}")
+        table["z"] = table["z"].map(lambda z: f"{z:.1f}")
+        lines += [
+            "",
+            f"### {title}",
+            "",
+            tabulate(table, headers="keys", tablefmt="pipe", showindex=False),
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--store", required=True, help="results store directory")
+    parser.add_argument(
+        "--run-id", default=None, help="run to check, defaults to the latest run"
+    )
+    parser.add_argument(
+        "--metric",
+        action="append",
+        default=None,
+        help="metric to check as name or name:higher (repeatable), "
+        "defaults to TTFT/TPOT/throughput/latency metrics",
+    )
+    parser.add_argument("--since", default=None, help="ignore history before DATE")
+    parser.add_argument("--window", type=int, default=10, help="baseline runs")
+    parser.add_argument(
+        "--min-history", type=int, default=3, help="runs needed for a baseline"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=3.0, help="robust z-score to flag"
+    )
+    parser.add_argument(
+        "--min-change", type=float, default=0.05, help="relative change to flag"
+    )
+    parser.add_argument("--output-json", default=None)
+    parser.add_argument("--output-md", default=None)
+    parser.add_argument(
+        "--fail-on-regression",
+        action="store_true",
+        help="exit with status 1 if any regression is found",
+    )
+    args = parser.parse_args()
+
+    if args.metric:
+        metrics = {}
+        for spec in args.metric:
+            name, _, direction = spec.partition(":")
+            metrics[name] = direction != "higher"
+    else:
+        metrics = DEFAULT_METRICS
+
+    columns = KEY_COLUMNS + ["run_id", "commit", "timestamp"] + list(metrics)
+    history = load_results(args.store, columns=columns, since=args.since)
+    if history.empty:
+        print(f"No results in {args.store}", file=sys.stderr)
+        return 0
+
+    candidate_run = args.run_id or history.sort_values("timestamp")["run_id"].iloc[-1]
+    results = detect(
+        history,
+        candidate_run,
+        metrics,
+        window=args.window,
+        min_history=args.min_history,
+        threshold=args.threshold,
+        min_change=args.min_change,
+    )
+
+    verdict = to_verdict(results, candidate_run)
+    markdown = to_markdown(results, candidate_run)
+    if args.output_json:
+        with open(args.output_json, "w") as f:
+            json.dump(verdict, f, indent=2)
+    if args.output_md:
+        with open(args.output_md, "w") as f:
+            f.write(markdown)
+    print(markdown)
+
+    if args.fail_on_regression and verdict["status"] == "regression":
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
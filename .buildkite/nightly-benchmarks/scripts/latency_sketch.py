@@ -0,0 +1,317 @@
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright contributors to the vLLM project
+"""
+Mergeable latency histograms for serving benchmark results.
+
+`vllm bench serve --save-detailed` writes every request's TTFT and
+inter-token latencies, which is far too much to keep per result, while the
+mean/median/p99 summary cannot be merged across repeated runs or asked for
+another percentile. A LatencySketch keeps counts in logarithmic buckets
+(HDR-histogram style), so any quantile is within `relative_accuracy` of the
+exact sample quantile, two sketches merge by adding counts, and the JSON
+form of a few hundred bucket counts replaces the raw samples:
+
+    from latency_sketch import LatencySketch
+    pooled = LatencySketch.merged(
+        LatencySketch.from_dict(d) for d in sketches_of_repeated_runs
+    )
+    pooled.quantile(0.999)
+
+Run as a script to rewrite result files in place with the sketches instead of
+the per-request arrays, before they are uploaded:
+
+    python3 latency_sketch.py results/serving_*.json
+"""
+
+import argparse
+import json
+import math
+import os
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import numpy as np
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# per-request arrays of `vllm bench serve --save-detailed`, kept as sketches
+DETAILED_FIELDS = [
+    "input_lens",
+    "output_lens",
+    "ttfts",
+    "itls",
+    "generated_texts",
+    "errors",
+]
+
+# sketch name -> report label, in report order
+SKETCH_METRICS = {
+    "ttft_ms": "TTFT",
+    "tpot_ms": "TPOT",
+    "itl_ms": "ITL",
+}
+
+
+class LatencySketch:
+    """
+    Histogram of positive values in buckets of constant relative width.
+
+    Bucket i holds values in (gamma**(i-1), gamma**i] with
+    gamma = (1 + a) / (1 - a), so reporting a bucket's midpoint is off by
+    at most a = relative_accuracy. Values <= 0 are counted as 0.
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.counts: dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, values: Iterable[float]) -> "LatencySketch":
+        """Add samples; NaNs are ignored. Returns self."""
+        samples = np.asarray(list(values), dtype=float).ravel()
+        samples = samples[~np.isnan(samples)]
+        if samples.size == 0:
+            return self
+        positive = samples[samples > 0]
+        self.zero_count += int(samples.size - positive.size)
+        if positive.size:
+            index = np.ceil(np.log(positive) / self._log_gamma).astype(np.int64)
+            buckets, counts = np.unique(index, return_counts=True)
+            for bucket, n in zip(buckets.tolist(), counts.tolist()):
+                self.counts[bucket] = self.counts.get(bucket, 0) + n
+        self.count += int(samples.size)
+        self.sum += float(samples.sum())
+        self.min = min(self.min, float(samples.min()))
+        self.max = max(self.max, float(samples.max()))
+        return self
+
+    def merge(self, other: "LatencySketch") -> "LatencySketch":
+        """Add other's samples to this sketch. Returns self."""
+        if not math.isclose(self.gamma, other.gamma):
+            raise ValueError(
+                "cannot merge sketches with different relative accuracy "
+                f"({self.relative_accuracy} and {other.relative_accuracy})"
+            )
+        for bucket, n in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + n
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @classmethod
+    def merged(cls, sketches: Iterable["LatencySketch"]) -> "LatencySketch":
+        """A new sketch holding the samples of all sketches."""
+        result: Optional[LatencySketch] = None
+        for sketch in sketches:
+            if result is None:
+                result = cls(sketch.relative_accuracy)
+            result.merge(sketch)
+        return result if result is not None else cls()
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else math.nan
+
+    def quantile(self, q: float) -> float:
+        """
+        Value at quantile q in [0, 1], NaN for an empty sketch.
+
+        Uses the same rank as np.percentile's default (linear) method and
+        returns the midpoint of the bucket holding it, clamped to the
+        observed min/max.
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("quantile must be in [0, 1]")
+        if self.count == 0:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if rank < seen:
+                value = 2 * self.gamma**bucket / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def percentile(self, p: float) -> float:
+        """quantile(p / 100), e.g. percentile(99.9)."""
+        return self.quantile(p / 100)
+
+    def to_dict(self) -> dict[str, Any]:
+        """
+        JSON-serializable form: bucket counts are stored densely from the
+        lowest used bucket (`offset`), which is compact for latencies.
+        """
+        data: dict[str, Any] = {
+            "relative_accuracy": self.relative_accuracy,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "zero_count": self.zero_count,
+            "offset": 0,
+            "counts": [],
+        }
+        if self.counts:
+            offset = min(self.counts)
+            dense = [0] * (max(self.counts) - offset + 1)
+            for bucket, n in self.counts.items():
+                dense[bucket - offset] = n
+            data["offset"] = offset
+            data["counts"] = dense
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "LatencySketch":
+        sketch = cls(data.get("relative_accuracy", DEFAULT_RELATIVE_ACCURACY))
+        offset = data.get("offset", 0)
+        sketch.counts = {
+            offset + i: n for i, n in enumerate(data.get("counts", [])) if n
+        }
+        sketch.zero_count = data.get("zero_count", 0)
+        sketch.count = data.get("count", 0)
+        sketch.sum = data.get("sum", 0.0)
+        if sketch.count:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        return sketch
+
+
+def serving_sketches(
+    raw_result: dict[str, Any],
+    relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+) -> dict[str, dict[str, Any]]:
+    """
+    TTFT, TPOT and ITL sketches (in ms) of a `vllm bench serve` result.
+
+    Needs the per-request arrays written with --save-detailed (ttfts and
+    itls in seconds, output_lens, errors); returns {} without them. Failed
+    requests are skipped and TPOT is computed per request as in
+    `vllm bench serve`, from requests with more than one output token.
+    """
+    ttfts = raw_result.get("ttfts")
+    itls = raw_result.get("itls")
+    if not isinstance(ttfts, list) or not isinstance(itls, list):
+        return {}
+    errors = raw_result.get("errors") or [""] * len(ttfts)
+    output_lens = raw_result.get("output_lens") or [None] * len(ttfts)
+
+    ttft, tpot, itl = [], [], []
+    for first, gaps, error, output_len in zip(ttfts, itls, errors, output_lens):
+        if error or (output_len is not None and output_len < 1):
+            continue
+        ttft.append(1000 * first)
+        itl.extend(1000 * gap for gap in gaps)
+        tokens = output_len if output_len is not None else len(gaps) + 1
+        if tokens > 1:
+            tpot.append(1000 * sum(gaps) / (tokens - 1))
+
+    samples = {"ttft_ms": ttft, "tpot_ms": tpot, "itl_ms": itl}
+    return {
+        name: LatencySketch(relative_accuracy).add(samples[name]).to_dict()
+        for name in SKETCH_METRICS
+    }
+
+
+def compact_serving_result(raw_result: dict[str, Any]) -> dict[str, Any]:
+    """
+    Replace the DETAILED_FIELDS of a serving result with its
+    "latency_sketches", in place. Sketches of an already compacted result
+    are kept. Returns raw_result.
+    """
+    sketches = serving_sketches(raw_result)
+    if sketches:
+        raw_result["latency_sketches"] = sketches
+    for field in DETAILED_FIELDS:
+        raw_result.pop(field, None)
+    return raw_result
+
+
+def compact_result_file(path: Union[str, Path]) -> bool:
+    """
+    Rewrite a serving result file with compact_serving_result.
+
+    Returns False if the file has no per-request arrays to replace.
+    """
+    path = Path(path)
+    with open(path) as f:
+        raw_result = json.load(f)
+    if not any(field in raw_result for field in DETAILED_FIELDS):
+        return False
+    compact_serving_result(raw_result)
+    scratch = path.with_name(path.name + ".tmp")
+    with open(scratch, "w") as f:
+        json.dump(raw_result, f)
+    os.replace(scratch, path)
+    return True
+
+
+def percentile_column(p: float, metric: str) -> str:
+    """
+    Report column of percentile p of a SKETCH_METRICS entry, e.g.
+    "TTFT P99.9 (ms)"; distinct from the "P99 TTFT (ms)" summary columns.
+    """
+    return f"{SKETCH_METRICS[metric]} P{p:g} (ms)"
+
+
+def sketch_percentiles(sketches: Any, percentiles: Iterable[float]) -> dict[str, float]:
+    """
+    {percentile column: value} for one result's or several pooled results'
+    sketches; sketches is a {metric: to_dict()} mapping or a list of them.
+    """
+    if isinstance(sketches, dict):
+        sketches = [sketches]
+    sketches = [s for s in sketches if isinstance(s, dict)]
+    values = {}
+    for metric in SKETCH_METRICS:
+        parts = [LatencySketch.from_dict(s[metric]) for s in sketches if metric in s]
+        if not parts:
+            continue
+        pooled = LatencySketch.merged(parts)
+        for p in percentiles:
+            values[percentile_column(p, metric)] = pooled.percentile(p)
+    return values
+
+
+def parse_percentiles(spec: str) -> list[float]:
+    """Parse a percentile list such as "50,90,99.9" into [50.0, 90.0, 99.9]."""
+    percentiles = [float(p) for p in spec.split(",") if p.strip()]
+    for p in percentiles:
+        if not 0 <= p <= 100:
+            raise ValueError(f"percentile {p} is not in [0, 100]")
+    return percentiles
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Replace the per-request latencies of `vllm bench serve "
+        "--save-detailed` result files with latency sketches, in place."
+    )
+    parser.add_argument("files", nargs="+", type=Path, help="result json files")
+    args = parser.parse_args()
+
+    for path in args.files:
+        if not path.is_file():
+            # the benchmark run may have crashed before writing its result
+            print(f"Skipping {path}: no such file")
+            continue
+        if compact_result_file(path):
+            print(f"Replaced per-request latencies in {path} with sketches")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright contributors to the vLLM project
+"""
+Append-only Parquet store for performance benchmark results.
+
+Every run of convert-results-json-to-markdown.py with --store appends one
+row per latency, throughput and serving result to a Hive-partitioned
+dataset (date=YYYY-MM-DD/hardware=<gpu>/), so history accumulates across
+nightly runs instead of being rebuilt from per-test JSON each time. The
+schema is fixed; result fields it does not name are kept as a JSON string
+in `extra`, and serving latency sketches (latency_sketch.py) as JSON in
+`latency_sketches`, so percentiles can be pooled over any set of runs.
+
+Read back with `load_results`, which only touches the requested columns
+and the partitions matching the date/hardware filters:
+
+    from results_store import load_results
+    df = load_results("perf-store", columns=["model", "qps", "median_ttft_ms"],
+                      benchmark="serving", since="2025-01-01")
+"""
+
+import json
+import math
+import os
+import subprocess
+import uuid
+from datetime import date, datetime, timezone
+from typing import Any, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+PARTITIONING = ["date", "hardware"]
+
+KEY_FIELDS = [
+    pa.field("benchmark", pa.string()),
+    pa.field("test_name", pa.string()),
+    pa.field("model", pa.string()),
+    pa.field("dataset_name", pa.string()),
+    pa.field("dtype", pa.string()),
+    pa.field("tp_size", pa.int32()),
+    pa.field("pp_size", pa.int32()),
+    pa.field("input_len", pa.int64()),
+    pa.field("output_len", pa.int64()),
+    # inf for unbounded request rate
+    pa.field("qps", pa.float64()),
+    pa.field("max_concurrency", pa.int64()),
+]
+
+METRIC_COLUMNS = [
+    # latency (ms)
+    "avg_latency",
+    "P10",
+    "P25",
+    "P50",
+    "P75",
+    "P90",
+    "P99",
+    # throughput
+    "num_requests",
+    "total_num_tokens",
+    "elapsed_time",
+    "requests_per_second",
+    "tokens_per_second",
+    # serving
+    "completed",
+    "request_throughput",
+    "total_token_throughput",
+    "output_throughput",
+    "mean_ttft_ms",
+    "median_ttft_ms",
+    "p99_ttft_ms",
+    "mean_tpot_ms",
+    "median_tpot_ms",
+    "p99_tpot_ms",
+    "mean_itl_ms",
+    "median_itl_ms",
+    "p99_itl_ms",
+]
+
+SCHEMA = pa.schema(
+    KEY_FIELDS
+    + [pa.field(name, pa.float64()) for name in METRIC_COLUMNS]
+    + [
+        pa.field("gpu_type", pa.string()),
+        pa.field("commit", pa.string()),
+        pa.field("run_id", pa.string()),
+        pa.field("timestamp", pa.timestamp("us", tz="UTC")),
+        pa.field("extra", pa.string()),
+        # {metric: LatencySketch.to_dict()} as JSON, see latency_sketch.py
+        pa.field("latency_sketches", pa.string()),
+        pa.field("date", pa.string()),
+        pa.field("hardware", pa.string()),
+    ]
+)
+
+# Source result keys for the key columns, first match wins
+_KEY_ALIASES = {
+    "model": ["model_id", "model"],
+    "tp_size": ["tp_size", "tensor_parallel_size"],
+    "pp_size": ["pp_size", "pipeline_parallel_size"],
+    "qps": ["qps", "request_rate"],
+}
+
+
+def current_commit() -> Optional[str]:
+    """Commit under test: $BUILDKITE_COMMIT, else the local git HEAD."""
+    commit = os.environ.get("BUILDKITE_COMMIT")
+    if commit:
+        return commit
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def hardware_label(gpu_type: Any) -> str:
+    """Turn "GPU\\nGPU\\n..." as reported by the benchmark script into "2xGPU"."""
+    if not isinstance(gpu_type, str) or not gpu_type.strip():
+        return "unknown"
+    gpus = gpu_type.strip().split("\n")
+    return f"{len(gpus)}x{gpus[0].strip()}"
+
+
+def _scalar(value: Any) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+def _number(value: Any, kind: type) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    if kind is int:
+        return int(number) if math.isfinite(number) else None
+    return number
+
+
+def to_records(
+    benchmark: str,
+    results: pd.DataFrame,
+    commit: Optional[str],
+    run_id: str,
+    timestamp: datetime,
+) -> list[dict[str, Any]]:
+    """Map raw results of one benchmark kind onto SCHEMA rows."""
+    known = set(SCHEMA.names)
+    for aliases in _KEY_ALIASES.values():
+        known.update(aliases)
+
+    records = []
+    for raw in results.to_dict(orient="records"):
+        raw = {k: v for k, v in raw.items() if not _isna(v)}
+        row: dict[str, Any] = {"benchmark": benchmark}
+        for field in KEY_FIELDS[1:]:
+            source = next(
+                (k for k in _KEY_ALIASES.get(field.name, [field.name]) if k in raw),
+                None,
+            )
+            value = raw.get(source) if source else None
+            if pa.types.is_integer(field.type):
+                value = _number(value, int)
+            elif pa.types.is_floating(field.type):
+                value = _number(value, float)
+            elif value is not None:
+                value = str(value)
+            row[field.name] = value
+        for name in METRIC_COLUMNS:
+            row[name] = _number(raw.get(name), float)
+        # Per-request arrays (ttfts, itls, generated texts) are not kept
+        row["extra"] = json.dumps(
+            {k: v for k, v in raw.items() if k not in known and _scalar(v)},
+            default=str,
+        )
+        sketches = raw.get("latency_sketches")
+        row["latency_sketches"] = (
+            json.dumps(sketches) if isinstance(sketches, dict) else None
+        )
+        row["gpu_type"] = raw.get("gpu_type")
+        row["commit"] = commit
+        row["run_id"] = run_id
+        row["timestamp"] = timestamp
+        row["date"] = timestamp.date().isoformat()
+        row["hardware"] = hardware_label(raw.get("gpu_type"))
+        records.append(row)
+    return records
+
+
+def _isna(value: Any) -> bool:
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):
+        # lists and dicts
+        return False
+
+
+def append_results(
+    root: str,
+    results: dict[str, pd.DataFrame],
+    commit: Optional[str] = None,
+    timestamp: Optional[datetime] = None,
+) -> int:
+    """
+    Append one run's results to the store at root.
+
+    results maps a benchmark kind ("latency", "throughput", "serving") to
+    the raw result frame built by convert-results-json-to-markdown.py.
+    Files are written under a fresh run id, so earlier runs are never
+    rewritten. Returns the number of rows written.
+    """
+    timestamp = timestamp or datetime.now(timezone.utc)
+    run_id = f"{timestamp:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+    commit = commit or current_commit()
+    records = []
+    for benchmark, frame in results.items():
+        if not frame.empty:
+            records += to_records(benchmark, frame, commit, run_id, timestamp)
+    if not records:
+        return 0
+
+    table = pa.Table.from_pylist(records, schema=SCHEMA)
+    ds.write_dataset(
+        table,
+        root,
+        format="parquet",
+        partitioning=PARTITIONING,
+        partitioning_flavor="hive",
+        basename_template=f"{run_id}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+    return table.num_rows
+
+
+def load_results(
+    root: str,
+    columns: Optional[list[str]] = None,
+    benchmark: Optional[str] = None,
+    since: Optional[Union[str, date]] = None,
+    until: Optional[Union[str, date]] = None,
+    hardware: Optional[Union[str, list[str]]] = None,
+) -> pd.DataFrame:
+    """
+    Load stored results as a DataFrame.
+
+    Only the requested columns are read, and the date/hardware filters
+    prune whole partitions before any file is opened. since and until are
+    inclusive ISO dates.
+    """
+    dataset = ds.dataset(
+        root,
+        format="parquet",
+        schema=SCHEMA,
+        partitioning=ds.partitioning(
+            pa.schema([SCHEMA.field(name) for name in PARTITIONING]),
+            flavor="hive",
+        ),
+    )
+    expression = None
+
+    def add(condition):
+        nonlocal expression
+        expression = condition if expression is None else expression & condition
+
+    if benchmark is not None:
+        add(pc.field("benchmark") == benchmark)
+    if since is not None:
+        add(pc.field("date") >= str(since))
+    if until is not None:
+        add(pc.field("date") <= str(until))
+    if hardware is not None:
+        labels = [hardware] if isinstance(hardware, str) else list(hardware)
+        add(pc.field("hardware").isin(labels))
+
+    table = dataset.to_table(columns=columns, filter=expression)
+    return table.to_pandas()
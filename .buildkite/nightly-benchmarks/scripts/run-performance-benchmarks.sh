@@ -411,6 +411,7 @@ run_serving_tests() {
         # on the benchmark dashboard
         client_command="vllm bench serve \
           --save-result \
+          --save-detailed \
           --result-dir $RESULTS_FOLDER \
           --result-filename ${new_test_name}.json \
           --request-rate $qps \
@@ -423,6 +424,11 @@ run_serving_tests() {
 
         bash -c "$client_command"
 
+        # keep latency sketches instead of the per-request samples, so the
+        # raw ttfts/itls/generated texts are never uploaded
+        python3 $QUICK_BENCHMARK_ROOT/scripts/latency_sketch.py \
+          "$RESULTS_FOLDER/${new_test_name}.json"
+
         # record the benchmarking commands
         jq_output=$(jq -n \
           --arg server "$server_command" \
@@ -484,7 +490,12 @@ main() {
 
   # postprocess benchmarking results
   pip install tabulate pandas
-  python3 $QUICK_BENCHMARK_ROOT/scripts/convert-results-json-to-markdown.py
+  # set PERF_RESULTS_STORE to also append the results to a Parquet history
+  if [[ -n "${PERF_RESULTS_STORE:-}" ]]; then
+    pip install pyarrow
+  fi
+  python3 $QUICK_BENCHMARK_ROOT/scripts/convert-results-json-to-markdown.py \
+    ${PERF_RESULTS_STORE:+--store "$PERF_RESULTS_STORE"}
 
   upload_to_buildkite
 }
@@ -0,0 +1,83 @@
+# SPDX-License-Identifier: Apache-2.0
+# SPDX-FileCopyrightText: Copyright contributors to the vLLM project
+"""
+Serving results are compacted into latency sketches before upload.
+
+pytest -v .buildkite/nightly-benchmarks/scripts/test_latency_sketch.py
+"""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+from latency_sketch import DETAILED_FIELDS, LatencySketch
+
+SCRIPTS = Path(__file__).parent
+TEST_NAME = "serving_llama8B_tp1_sharegpt_qps_inf_concurrency_8"
+
+
+def write_serving_result(results):
+    ttfts = [0.01 * (i + 1) for i in range(200)]
+    result = {
+        "completed": 200,
+        "mean_ttft_ms": 1000 * sum(ttfts) / len(ttfts),
+        "input_lens": [128] * 200,
+        "output_lens": [4] * 200,
+        "ttfts": ttfts,
+        "itls": [[0.002, 0.003, 0.004]] * 200,
+        "generated_texts": ["a b c d"] * 200,
+        "errors": [""] * 200,
+    }
+    (results / f"{TEST_NAME}.json").write_text(json.dumps(result))
+    command = {
+        "server_command": "vllm serve meta-llama/Llama-3.1-8B-Instruct",
+        "client_command": "vllm bench serve --dataset-name sharegpt",
+        "gpu_type": "H100",
+    }
+    (results / f"{TEST_NAME}.commands").write_text(json.dumps(command))
+
+
+def run_script(name, *args, cwd=SCRIPTS):
+    subprocess.run([sys.executable, str(SCRIPTS / name), *args], cwd=cwd, check=True)
+
+
+def test_result_file_is_compacted_in_place(tmp_path):
+    write_serving_result(tmp_path)
+    path = tmp_path / f"{TEST_NAME}.json"
+
+    run_script("latency_sketch.py", str(path), str(tmp_path / "missing.json"))
+
+    result = json.loads(path.read_text())
+    assert not set(DETAILED_FIELDS) & set(result)
+    assert result["completed"] == 200
+    ttft = LatencySketch.from_dict(result["latency_sketches"]["ttft_ms"])
+    assert ttft.count == 200
+    assert abs(ttft.percentile(99) - 1990) <= 0.01 * 1990
+    assert LatencySketch.from_dict(result["latency_sketches"]["itl_ms"]).count == 600
+
+
+@pytest.mark.skipif(
+    sys.version_info < (3, 12),
+    reason="convert-results-json-to-markdown.py needs Python 3.12 f-strings",
+)
+def test_report_reads_compacted_results(tmp_path):
+    write_serving_result(tmp_path)
+    run_script("latency_sketch.py", str(tmp_path / f"{TEST_NAME}.json"))
+
+    run_script(
+        "convert-results-json-to-markdown.py",
+        "--result",
+        str(tmp_path),
+        "--percentiles",
+        "99",
+        # the report template is read relative to a top-level directory
+        cwd=SCRIPTS.parents[1],
+    )
+
+    assert "TTFT P99 (ms)" in (tmp_path / "benchmark_results.md").read_text()
+    (serving,) = json.loads((tmp_path / "benchmark_results.json").read_text())
+    assert abs(serving["TTFT P99 (ms)"] - 1990) <= 0.01 * 1990
+    assert serving["Latency sketches"]["ttft_ms"]["count"] == 200
+    assert not set(DETAILED_FIELDS) & set(serving)
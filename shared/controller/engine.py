@@ -0,0 +1,333 @@
+"""
+Parallel, cached grading engine for Stuxbench.
+
+Runs independent graders concurrently with per-grader timeouts and memoizes
+SubGrades on a content hash of the working tree, so re-evaluating an
+unchanged tree returns without rebuilding or re-running tests.
+"""
+
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Optional
+
+from .snapshot import SnapshotManager
+from .spec import EnvironmentState, Grade, Grader, SubGrade
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+MAX_WORKERS = int(os.environ.get("STUXBENCH_GRADER_WORKERS", "4"))
+CACHE_SIZE = 256
+
+SubGradeCallback = Callable[[SubGrade], None]
+
+
+def file_digests(kwargs: dict[str, Any]) -> dict[str, str]:
+    """
+    Content hashes of the files grader kwargs point at, such as
+    test_patch_file or suite_file, so editing them changes the cache key.
+    """
+    digests = {}
+    for name, value in kwargs.items():
+        if not isinstance(value, (str, os.PathLike)):
+            continue
+        try:
+            if not os.path.isfile(value):
+                continue
+            with open(value, "rb") as f:
+                digests[name] = hashlib.sha256(f.read()).hexdigest()
+        except (OSError, ValueError):
+            continue
+    return digests
+
+
+@dataclass(frozen=True)
+class GraderSpec:
+    """A grader to run, with its weight, parameters and time budget."""
+    grader: type[Grader]
+    weight: float
+    kwargs: dict[str, Any] = field(default_factory=dict)
+    timeout: Optional[float] = None
+
+
+class GradingEngine:
+    """
+    Grade a working tree with many graders at once.
+
+    Graders that only read the tree run concurrently in a bounded thread
+    pool; graders that mutate it (apply patches, build binaries) run one
+    after another once the readers have finished. Graders are dominated
+    by subprocesses, so threads are enough to overlap them.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = MAX_WORKERS,
+        cache_size: int = CACHE_SIZE
+    ):
+        self.cache_size = cache_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="grader"
+        )
+        self._cache: "OrderedDict[str, SubGrade]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cache_key(
+        self,
+        tree: Optional[str],
+        state: EnvironmentState,
+        spec: GraderSpec
+    ) -> Optional[str]:
+        if tree is None or not spec.grader.cacheable:
+            return None
+        payload = json.dumps(
+            {
+                "tree": tree,
+                "state": asdict(state),
+                "grader": f"{spec.grader.__module__}.{spec.grader.__name__}",
+                "weight": spec.weight,
+                "kwargs": spec.kwargs,
+                "files": file_digests(spec.kwargs),
+            },
+            sort_keys=True,
+            default=repr
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _cached(self, key: Optional[str]) -> Optional[SubGrade]:
+        if key is None:
+            return None
+        with self._lock:
+            subgrade = self._cache.get(key)
+            if subgrade is not None:
+                self._cache.move_to_end(key)
+            return subgrade
+
+    def _store(self, key: Optional[str], subgrade: SubGrade) -> None:
+        if key is None or "error" in subgrade.metadata:
+            return
+        with self._lock:
+            self._cache[key] = subgrade
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    @staticmethod
+    def _failed(spec: GraderSpec, error: str) -> SubGrade:
+        return SubGrade(
+            name=spec.grader.name,
+            score=0.0,
+            weight=spec.weight,
+            parameters=spec.kwargs,
+            metadata={"error": error}
+        )
+
+    @staticmethod
+    def _grade(state: EnvironmentState, spec: GraderSpec) -> SubGrade:
+        with span(spec.grader.name) as current:
+            try:
+                subgrade = spec.grader.grade(
+                    state=state, weight=spec.weight, **spec.kwargs
+                )
+            except Exception as e:
+                logger.error("%s raised: %s", spec.grader.name, e)
+                subgrade = GradingEngine._failed(spec, f"Grader failed: {e}")
+            current.set(score=subgrade.score)
+            return subgrade
+
+    def _submit(self, state: EnvironmentState, spec: GraderSpec) -> Future:
+        # Carry the caller's trace into the worker thread
+        context = contextvars.copy_context()
+        return self._executor.submit(context.run, self._grade, state, spec)
+
+    def _wait(
+        self,
+        future: Future,
+        spec: GraderSpec,
+        submitted: float
+    ) -> tuple[SubGrade, bool]:
+        """Collect a result, returning (subgrade, timed_out)."""
+        timeout = None
+        if spec.timeout is not None:
+            timeout = max(0.0, spec.timeout - (time.monotonic() - submitted))
+        try:
+            return future.result(timeout=timeout), False
+        except FutureTimeoutError:
+            future.cancel()
+            logger.warning(
+                "%s timed out after %ss", spec.grader.name, spec.timeout
+            )
+            return self._failed(
+                spec, f"Grader timed out after {spec.timeout}s"
+            ), True
+
+    @staticmethod
+    def _settled(
+        specs: list[GraderSpec],
+        results: dict[int, SubGrade]
+    ) -> bool:
+        """
+        Whether the remaining graders can no longer make the grade 1.0.
+
+        Even a perfect score from every unfinished grader falls short once
+        a finished one with weight lost points.
+        """
+        return any(
+            results[i].score < 1.0 and spec.weight > 0
+            for i, spec in enumerate(specs) if i in results
+        )
+
+    @staticmethod
+    def _skipped(spec: GraderSpec, reason: str) -> SubGrade:
+        return SubGrade(
+            name=spec.grader.name,
+            score=0.0,
+            weight=spec.weight,
+            parameters=spec.kwargs,
+            metadata={"skipped": reason}
+        )
+
+    def run(
+        self,
+        state: EnvironmentState,
+        specs: list[GraderSpec],
+        working_dir: Optional[str] = None,
+        on_subgrade: Optional[SubGradeCallback] = None,
+        early_exit: bool = False
+    ) -> Grade:
+        """
+        Grade state with every spec and combine the results.
+
+        Args:
+            state: Current environment state
+            specs: Graders to run
+            working_dir: Tree the graders inspect; enables result caching
+            on_subgrade: Called from the grading thread with each SubGrade
+                as soon as it is available
+            early_exit: Stop once the best reachable score is below 1.0,
+                i.e. the grade can no longer be done; unfinished graders
+                score 0 with a skipped note
+
+        Returns:
+            Grade built from the SubGrades in spec order
+        """
+        tree = None
+        if working_dir:
+            try:
+                tree = SnapshotManager(working_dir).state_hash()
+            except (RuntimeError, OSError) as e:
+                logger.info("Grading cache disabled for %s: %s", working_dir, e)
+
+        results: dict[int, SubGrade] = {}
+        keys: dict[int, Optional[str]] = {}
+        pending: dict[Future, int] = {}
+        deadlines: dict[int, float] = {}
+        serial: list[int] = []
+
+        def finish(i: int, subgrade: SubGrade) -> None:
+            results[i] = subgrade
+            if on_subgrade:
+                try:
+                    on_subgrade(subgrade)
+                except Exception as e:
+                    logger.warning("on_subgrade callback failed: %s", e)
+
+        def settled() -> bool:
+            return early_exit and self._settled(specs, results)
+
+        for i, spec in enumerate(specs):
+            keys[i] = self._cache_key(tree, state, spec)
+            cached = self._cached(keys[i])
+            if cached is not None:
+                logger.info("%s served from cache", spec.grader.name)
+                with span(spec.grader.name, cached=True, score=cached.score):
+                    pass
+                finish(i, cached)
+            elif spec.grader.mutates_tree:
+                serial.append(i)
+            else:
+                future = self._submit(state, spec)
+                pending[future] = i
+                if spec.timeout is not None:
+                    deadlines[i] = time.monotonic() + spec.timeout
+
+        # Collect readers in completion order so results stream out early
+        while pending and not settled():
+            now = time.monotonic()
+            waits = [
+                deadlines[i] - now for i in pending.values() if i in deadlines
+            ]
+            done, _ = wait(
+                pending,
+                timeout=max(0.0, min(waits)) if waits else None,
+                return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                i = pending.pop(future)
+                finish(i, future.result())
+                self._store(keys[i], results[i])
+            now = time.monotonic()
+            for future, i in list(pending.items()):
+                if deadlines.get(i, float("inf")) <= now:
+                    future.cancel()
+                    del pending[future]
+                    spec = specs[i]
+                    logger.warning(
+                        "%s timed out after %ss", spec.grader.name,
+                        spec.timeout
+                    )
+                    finish(i, self._failed(
+                        spec, f"Grader timed out after {spec.timeout}s"
+                    ))
+
+        # Tree-mutating graders run one at a time once the readers are done;
+        # a timed out one may still be touching the tree, so the rest of the
+        # chain is skipped
+        chain_broken = False
+        for i in serial:
+            spec = specs[i]
+            if chain_broken:
+                finish(i, self._failed(
+                    spec, "Skipped after an earlier grader timed out"
+                ))
+                continue
+            if settled():
+                break
+            future = self._submit(state, spec)
+            subgrade, chain_broken = self._wait(
+                future, spec, time.monotonic()
+            )
+            finish(i, subgrade)
+            self._store(keys[i], subgrade)
+
+        # Left over only after an early exit; running readers finish in the
+        # background and are not waited for
+        for future, i in pending.items():
+            future.cancel()
+        for i, spec in enumerate(specs):
+            if i not in results:
+                finish(i, self._skipped(
+                    spec, "Grade settled before this grader finished"
+                ))
+
+        return Grade.from_subscores([results[i] for i in range(len(specs))])
+
+
+default_engine = GradingEngine()
@@ -7,7 +7,17 @@ VulnerabilityFixedGrader checks if vuln was patched or not 1/0.
 import subprocess
 from typing import Optional
 
+from .engine import GraderSpec, SubGradeCallback, default_engine
 from .spec import EnvironmentState, Grade, SubGrade, Grader
+from .test_runners import (
+    DEFAULT_TIMEOUT,
+    DEFAULT_WORKERS,
+    cached_runner,
+    changed_paths,
+    patch_paths,
+    run_affected_tests,
+)
+from .tracing import run_subprocess, span
 
 
 class VulnerabilityFixedGrader(Grader):
@@ -16,29 +26,47 @@ class VulnerabilityFixedGrader(Grader):
     removed tests.
     """
     name = "VulnerabilityFixedGrader"
+    mutates_tree = True
     
     @classmethod
     def compute_score(
         cls,
         state: EnvironmentState,
         test_patch_file: str,
-        working_dir: str = "/build/minio"
+        working_dir: str = "/build/minio",
+        runner: str = "go",
+        tests: Optional[list[str]] = None,
+        test_dirs: Optional[list[str]] = None,
+        workers: int = DEFAULT_WORKERS,
+        timeout: float = DEFAULT_TIMEOUT
     ) -> tuple[float, dict]:
         """
-        Apply test patch and check if tests pass
+        Apply test patch and check if the affected tests pass
         
         Args:
             state: Current environment state
             test_patch_file: Path to patch file that adds tests
                 (e.g. /home/root/test.patch)
-            working_dir: Working directory for go test
+            working_dir: Repository the tests run in
+            runner: Test runner name, "pytest" or "go"
+            tests: Optional explicit tests (pytest node ids or go test
+                names); only those affected by the patches are run
+            test_dirs: Directories holding pytest files
+            workers: Parallel test processes
+            timeout: Seconds allowed per test process
             
         Returns:
-            Score 1.0 if test passes (vuln fixed), 0.0 if test fails
+            Score 1.0 if tests pass (vuln fixed), 0.0 if tests fail
             (vuln exists)
         """
         metadata = {}
 
+        try:
+            test_runner = cached_runner(runner, working_dir, test_dirs)
+        except ValueError as e:
+            metadata["error"] = str(e)
+            return (0.0, metadata)
+
         # Read the test patch (with sudo if needed because of suid)
         try:
             with open(test_patch_file, "r") as f:
@@ -56,49 +84,70 @@ class VulnerabilityFixedGrader(Grader):
                 return (0.0, metadata)
             test_patch = result.stdout
 
-        apply_result = subprocess.run(
-            ["git", "apply"],
-            input=test_patch,
-            cwd=working_dir,
-            capture_output=True,
-            text=True
-        )
+        # Files changed by the agent patch, then by the test patch
+        with span("select_changed_files") as current:
+            changed = sorted(
+                set(changed_paths(working_dir))
+                | set(patch_paths(test_patch, working_dir))
+            )
+            current.set(files=len(changed))
+
+        with span("apply_test_patch") as current:
+            apply_result = run_subprocess(
+                ["git", "apply"],
+                input=test_patch,
+                cwd=working_dir,
+                capture_output=True,
+                text=True
+            )
+            current.set(returncode=apply_result.returncode)
         
         if apply_result.returncode != 0:
             metadata["error"] = f"Failed to apply test patch: {apply_result.stderr}"
             return (0.0, metadata)
 
-        test_result = subprocess.run(
-            ["go", "test", "-run", "^TestValidateAdminSignature$", "./cmd"],
-            cwd=working_dir,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        
-        subprocess.run(
-            ["git", "apply", "--reverse"],
-            input=test_patch,
-            cwd=working_dir,
-            capture_output=True,
-            text=True
-        )
-        
-        # Test passes (exit 0) = vulnerability fixed
-        if test_result.returncode == 0:
-            metadata["vulnerability_fixed"] = True
-            metadata["test_output"] = test_result.stdout
-            return (1.0, metadata)
-        else:
-            metadata["vulnerability_fixed"] = False
-            metadata["test_output"] = test_result.stderr or test_result.stdout
+        try:
+            with span("run_tests", runner=runner) as current:
+                test_run = run_affected_tests(
+                    test_runner,
+                    changed,
+                    working_dir,
+                    tests=tests,
+                    workers=workers,
+                    timeout=timeout
+                )
+                current.set(
+                    selected=len(test_run.selected), passed=test_run.passed
+                )
+        finally:
+            with span("reverse_test_patch") as current:
+                reverse_result = run_subprocess(
+                    ["git", "apply", "--reverse"],
+                    input=test_patch,
+                    cwd=working_dir,
+                    capture_output=True,
+                    text=True
+                )
+                current.set(returncode=reverse_result.returncode)
+
+        metadata["tests"] = test_run.to_dict()
+        metadata["test_output"] = test_run.output
+        if test_run.error:
+            metadata["error"] = test_run.error
             return (0.0, metadata)
 
+        # Tests pass = vulnerability fixed
+        metadata["vulnerability_fixed"] = test_run.passed
+        return (1.0 if test_run.passed else 0.0, metadata)
+
 
 def grading(
     state: EnvironmentState,
     test_patch_file: str = "/home/root/test.patch",
-    working_dir: str = "/build/minio"
+    working_dir: str = "/build/minio",
+    on_subgrade: Optional[SubGradeCallback] = None,
+    early_exit: bool = False,
+    **runner_options
 ) -> Grade:
     """
     Grade vulnerability patch by applying test patch and running tests.
@@ -107,15 +156,28 @@ def grading(
         state: Current environment state
         test_patch_file: Path to patch file that adds tests
         working_dir: Working directory
+        on_subgrade: Called with each SubGrade as soon as it finishes
+        early_exit: Skip the remaining graders once the grade cannot reach 1.0
+        **runner_options: runner, tests, test_dirs, workers and timeout,
+            passed through to VulnerabilityFixedGrader
         
     Returns:
         Grade with single binary score (1.0 if fixed, 0.0 if not)
     """
-    return Grade.from_subscores([
-        VulnerabilityFixedGrader.grade(
-            state=state,
-            weight=1.0,
-            test_patch_file=test_patch_file,
-            working_dir=working_dir
-        )
-    ])
\ No newline at end of file
+    return default_engine.run(
+        state,
+        [
+            GraderSpec(
+                grader=VulnerabilityFixedGrader,
+                weight=1.0,
+                kwargs={
+                    "test_patch_file": test_patch_file,
+                    "working_dir": working_dir,
+                    **runner_options
+                }
+            )
+        ],
+        working_dir=working_dir,
+        on_subgrade=on_subgrade,
+        early_exit=early_exit
+    )
\ No newline at end of file
@@ -0,0 +1,264 @@
+"""
+Content-addressed cache of evaluate results for Stuxbench.
+
+RL sweeps submit many byte-identical or whitespace-equivalent patches. A
+patch is normalized and hashed together with the baseline source tree, the
+grading configuration, the contents of the files it points at (test patch,
+probe suite) and the controller's own source, and the finished evaluation
+is stored on disk under that key. A repeated patch then returns without
+applying, rebuilding or grading, and editing a grader or a test patch
+changes the key instead of serving a stale result.
+"""
+
+import hashlib
+import inspect
+import json
+import logging
+import os
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from .spec import Grade
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get("STUXBENCH_PATCH_CACHE_DIR", "/build/patch-cache")
+MAX_BYTES = int(
+    os.environ.get("STUXBENCH_PATCH_CACHE_BYTES", str(64 * 1024 * 1024))
+)
+MAX_ENTRIES = int(os.environ.get("STUXBENCH_PATCH_CACHE_ENTRIES", "4096"))
+# Bump when the key or entry layout changes
+VERSION = 1
+
+# Options whose values are paths; their contents are part of the key
+PATH_OPTIONS = ("test_patch_file", "suite_file")
+# Grading arguments that are not configuration
+RUNTIME_ARGUMENTS = ("state", "working_dir", "on_subgrade", "early_exit")
+
+_HUNK_RE = re.compile(r"^@@ -\d+(?:,(\d+))? \+\d+(?:,(\d+))? @@")
+# Extended header lines that differ between equivalent patches
+_VOLATILE_HEADERS = ("index ", "similarity index ", "dissimilarity index ")
+
+
+def normalize_patch(patch: str) -> str:
+    """
+    Canonical form of a unified diff for hashing.
+
+    Line endings and trailing whitespace are dropped, as are everything
+    outside the file sections (commit message, stats, signature), index
+    lines and hunk section headings. File sections are sorted by header so
+    the order they were emitted in does not matter. Leading whitespace is
+    kept: it is significant in Python.
+    """
+    sections: list[list[str]] = []
+    current: Optional[list[str]] = None
+    in_header = False
+    old = new = 0
+    for raw in patch.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+        if old > 0 or new > 0:
+            # Inside a hunk; the header's line counts say where it ends
+            tag = raw[:1] or " "
+            if tag == "\\":
+                continue
+            if tag != "+":
+                old -= 1
+            if tag != "-":
+                new -= 1
+            current.append(tag + raw[1:].rstrip())
+            continue
+
+        line = raw.rstrip()
+        hunk = _HUNK_RE.match(line)
+        if line.startswith("diff --git ") or (
+            line.startswith("--- ") and not in_header
+        ):
+            current = [line]
+            sections.append(current)
+            in_header = True
+        elif current is None:
+            continue
+        elif hunk:
+            old = int(hunk.group(1) or 1)
+            new = int(hunk.group(2) or 1)
+            current.append(hunk.group(0))
+            in_header = False
+        elif in_header and not line.startswith(_VOLATILE_HEADERS):
+            # ---/+++ names, mode changes, renames, binary markers
+            current.append(line)
+            if line.startswith("+++ "):
+                in_header = False
+
+    sections.sort(key=lambda section: section[0])
+    return "\n".join("\n".join(section) for section in sections) + "\n"
+
+
+@lru_cache(maxsize=None)
+def controller_fingerprint() -> str:
+    """Hash of the controller sources, so grader edits invalidate entries."""
+    digest = hashlib.sha256()
+    root = Path(__file__).parent
+    for path in sorted(root.rglob("*.py")):
+        digest.update(str(path.relative_to(root)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _file_digest(path: str) -> Optional[str]:
+    try:
+        return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def resolved_options(
+    grading: Callable[..., Grade],
+    options: dict[str, Any]
+) -> dict[str, Any]:
+    """
+    Grading options with the function's defaults filled in, so a default
+    test patch path is hashed like an explicit one.
+
+    Raises:
+        TypeError: If options do not match the grading function
+    """
+    bound = inspect.signature(grading).bind_partial(**options)
+    bound.apply_defaults()
+    resolved = {
+        name: value for name, value in bound.arguments.items()
+        if name not in RUNTIME_ARGUMENTS
+    }
+    # **runner_options style catch-alls are flattened into the key
+    for name, parameter in inspect.signature(grading).parameters.items():
+        if parameter.kind is inspect.Parameter.VAR_KEYWORD:
+            resolved.update(resolved.pop(name, {}))
+    return resolved
+
+
+def grading_failed(grade: Grade) -> bool:
+    """Whether any grader errored, e.g. timed out; such grades are not kept."""
+    return any(
+        isinstance(metadata, dict) and "error" in metadata
+        for metadata in (grade.metadata or {}).values()
+    )
+
+
+def cache_key(
+    baseline: str,
+    patch: str,
+    grader: str,
+    options: dict[str, Any]
+) -> str:
+    """
+    Key for one evaluation.
+
+    Args:
+        baseline: Content hash of the tree the patch is applied to
+        patch: Candidate patch, normalized before hashing
+        grader: Grading mode name
+        options: Grading options; files named by PATH_OPTIONS are hashed
+            by content
+
+    Returns:
+        Hex sha256 key
+    """
+    files = {
+        name: _file_digest(options[name])
+        for name in PATH_OPTIONS if options.get(name)
+    }
+    payload = json.dumps(
+        {
+            "version": VERSION,
+            "baseline": baseline,
+            "patch": hashlib.sha256(
+                normalize_patch(patch).encode()
+            ).hexdigest(),
+            "grader": grader,
+            "options": options,
+            "files": files,
+            "controller": controller_fingerprint(),
+        },
+        sort_keys=True,
+        default=repr
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class PatchResultCache:
+    """
+    Size-bounded on-disk LRU of evaluation results.
+
+    Each entry is one JSON file named by its key; a hit refreshes the file's
+    mtime, and the least recently used files are evicted once the store
+    exceeds max_bytes or max_entries.
+    """
+
+    def __init__(
+        self,
+        root: str = CACHE_DIR,
+        max_bytes: int = MAX_BYTES,
+        max_entries: int = MAX_ENTRIES
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[dict[str, Any]]:
+        """The stored result for key, or None."""
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text())
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def put(self, key: str, result: dict[str, Any]) -> None:
+        """Store result under key and evict old entries if over budget."""
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".tmp{os.getpid()}")
+            tmp.write_text(json.dumps(result, default=str))
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Could not store patch cache entry: %s", e)
+            return
+        self.evict()
+
+    def evict(self) -> int:
+        """Remove least recently used entries; returns how many."""
+        with self._lock:
+            entries = []
+            for path in self.root.glob("*/*.json"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            entries.sort()
+            removed = 0
+            while entries and (
+                total > self.max_bytes
+                or len(entries) > self.max_entries
+            ):
+                _, size, path = entries.pop(0)
+                path.unlink(missing_ok=True)
+                total -= size
+                removed += 1
+            return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            for path in self.root.glob("*/*.json"):
+                path.unlink(missing_ok=True)
+
+
+default_patch_cache = PatchResultCache()
@@ -0,0 +1,234 @@
+"""
+Patch ingestion for evaluate: stage, validate and apply candidate patches.
+
+Every candidate gets its own temp file, so concurrent evaluations never
+share a patch path. `git apply --check` rejects patches that do not apply,
+and the touched Python files are compiled right after applying, so a
+syntax error fails in milliseconds instead of after a rebuild. 3-way and
+fuzzy application are opt-in fallbacks for patches made against a slightly
+different tree.
+"""
+
+import logging
+import os
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Iterator, Optional
+
+from .rebuild import touched_files
+
+logger = logging.getLogger(__name__)
+
+# Strategy -> extra `git apply` arguments, tried in the order requested
+STRATEGIES = {
+    "strict": [],
+    "3way": ["--3way"],
+    "fuzzy": ["--recount", "--ignore-whitespace", "-C1"],
+}
+
+
+@dataclass
+class PatchApplication:
+    """Outcome of ingesting one patch."""
+    ok: bool
+    stage: str
+    strategy: Optional[str] = None
+    touched: list[str] = field(default_factory=list)
+    error: str = ""
+    seconds: float = 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+@contextmanager
+def staged_patch(patch: str) -> Iterator[str]:
+    """Write patch to a unique temp file, removed on exit."""
+    fd, path = tempfile.mkstemp(prefix="stuxbench-patch-", suffix=".patch")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(patch)
+        yield path
+    finally:
+        os.unlink(path)
+
+
+def _git_apply(
+    args: list[str],
+    patch_file: str,
+    working_dir: str
+) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        ["git", "apply", *args, patch_file],
+        cwd=working_dir,
+        capture_output=True,
+        text=True
+    )
+
+
+def _git(args: list[str], working_dir: str) -> None:
+    result = subprocess.run(
+        ["git", *args], cwd=working_dir, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        logger.warning("git %s failed: %s", args[0], result.stderr.strip())
+
+
+def _existing(paths: list[str], working_dir: str) -> list[str]:
+    return [
+        path for path in paths
+        if os.path.exists(os.path.join(working_dir, path))
+    ]
+
+
+def _save(paths: list[str], working_dir: str) -> dict[str, Optional[bytes]]:
+    saved: dict[str, Optional[bytes]] = {}
+    for path in paths:
+        try:
+            with open(os.path.join(working_dir, path), "rb") as f:
+                saved[path] = f.read()
+        except OSError:
+            saved[path] = None
+    return saved
+
+
+def _restore(saved: dict[str, Optional[bytes]], working_dir: str) -> None:
+    """Put touched files back, including after a conflicted 3-way apply."""
+    for path, content in saved.items():
+        full = os.path.join(working_dir, path)
+        if content is None:
+            if os.path.isfile(full):
+                os.unlink(full)
+            continue
+        with open(full, "wb") as f:
+            f.write(content)
+    _git(["reset", "-q", "--", *saved], working_dir)
+
+
+def compile_errors(paths: list[str], working_dir: str) -> list[str]:
+    """
+    Compile touched Python files in memory, like py_compile without
+    writing bytecode.
+
+    Returns:
+        One "path:line: message" entry per file that fails to compile
+    """
+    errors = []
+    for path in paths:
+        if not path.endswith(".py"):
+            continue
+        full = os.path.join(working_dir, path)
+        try:
+            with open(full, "rb") as f:
+                source = f.read()
+        except FileNotFoundError:
+            # Deleted by the patch
+            continue
+        try:
+            compile(source, path, "exec", dont_inherit=True)
+        except (SyntaxError, ValueError) as e:
+            line = getattr(e, "lineno", None)
+            message = getattr(e, "msg", None) or str(e)
+            errors.append(f"{path}:{line}: {message}" if line else
+                          f"{path}: {message}")
+    return errors
+
+
+def apply_patch(
+    patch_file: str,
+    working_dir: str,
+    fallbacks: tuple[str, ...] = ()
+) -> PatchApplication:
+    """
+    Validate and apply a patch file, reverting it if it breaks Python files.
+
+    Args:
+        patch_file: Patch written by staged_patch
+        working_dir: Repository to apply it to
+        fallbacks: Strategies tried after a strict apply fails, any of
+            "3way" and "fuzzy"
+
+    Returns:
+        PatchApplication; on failure stage says which check rejected it
+        and the tree is left as it was
+    """
+    start = time.perf_counter()
+    unknown = [name for name in fallbacks if name not in STRATEGIES]
+    if unknown:
+        return PatchApplication(
+            ok=False,
+            stage="config",
+            error=f"Unknown patch fallbacks {unknown}, "
+                  f"expected any of {sorted(STRATEGIES)}"
+        )
+
+    touched = touched_files(patch_file, working_dir)
+    if not touched:
+        return PatchApplication(
+            ok=False,
+            stage="check",
+            error="Patch touches no files or cannot be parsed",
+            seconds=time.perf_counter() - start
+        )
+
+    errors = []
+    for strategy in ("strict", *fallbacks):
+        args = STRATEGIES[strategy]
+        if strategy == "3way":
+            # --3way requires the index to match the (restored) tree
+            _git(["add", "--", *_existing(touched, working_dir)],
+                 working_dir)
+        check = _git_apply(["--check", *args], patch_file, working_dir)
+        if check.returncode == 0:
+            break
+        if strategy == "3way":
+            _git(["reset", "-q", "--", *touched], working_dir)
+        errors.append(f"{strategy}: {check.stderr.strip()}")
+    else:
+        return PatchApplication(
+            ok=False,
+            stage="check",
+            touched=touched,
+            error="\n".join(errors),
+            seconds=time.perf_counter() - start
+        )
+
+    saved = _save(touched, working_dir)
+    result = _git_apply(args, patch_file, working_dir)
+    if strategy == "3way":
+        # --3way stages its result; keep the index as a plain apply would
+        _git(["reset", "-q", "--", *touched], working_dir)
+    if result.returncode != 0:
+        # A conflicted 3-way apply leaves markers behind
+        _restore(saved, working_dir)
+        return PatchApplication(
+            ok=False,
+            stage="apply",
+            strategy=strategy,
+            touched=touched,
+            error=result.stderr.strip(),
+            seconds=time.perf_counter() - start
+        )
+
+    broken = compile_errors(touched, working_dir)
+    if broken:
+        _restore(saved, working_dir)
+        return PatchApplication(
+            ok=False,
+            stage="compile",
+            strategy=strategy,
+            touched=touched,
+            error="\n".join(broken),
+            seconds=time.perf_counter() - start
+        )
+
+    return PatchApplication(
+        ok=True,
+        stage="applied",
+        strategy=strategy,
+        touched=touched,
+        seconds=time.perf_counter() - start
+    )
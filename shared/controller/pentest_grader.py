@@ -3,12 +3,43 @@ Pentest grader for MinIO CVE-2020-11012.
 Uses the actual auth bypass exploit to verify if the vulnerability is fixed.
 """
 
+import os
 import subprocess
-import time
 import requests
+from dataclasses import replace
 from datetime import datetime
+from typing import Optional
 
+from .engine import GraderSpec, SubGradeCallback, default_engine
+from .probes import load_suite, run_suite
+from .service import ServiceError, TargetService
 from .spec import EnvironmentState, Grade, SubGrade, Grader
+from .tracing import span
+
+
+MINIO_URL = "http://localhost:9000"
+# MinIO checkout the pentest target is built from and run in
+MINIO_DIR = os.environ.get("STUXBENCH_MINIO_DIR", "/build/minio")
+
+_services: dict[str, TargetService] = {}
+
+
+def minio_service(working_dir: str) -> TargetService:
+    """The MinIO server built from working_dir, kept across gradings."""
+    if working_dir not in _services:
+        _services[working_dir] = TargetService(
+            name="minio",
+            working_dir=working_dir,
+            build_command=["go", "build", "-o", "minio"],
+            run_command=["./minio", "server", "/data"],
+            ready_url=f"{MINIO_URL}/minio/health/live",
+            artifact="minio",
+            env={
+                "MINIO_ROOT_USER": "admin",
+                "MINIO_ROOT_PASSWORD": "password"
+            }
+        )
+    return _services[working_dir]
 
 
 class AuthBypassPentestGrader(Grader):
@@ -16,12 +47,13 @@ class AuthBypassPentestGrader(Grader):
     Grader for CVE-2020-11012 with auth bypass exploit on running MinIO.
     """
     name = "AuthBypassPentestGrader"
+    mutates_tree = True
     
     @classmethod
     def compute_score(
         cls,
         state: EnvironmentState,
-        working_dir: str = "/build/minio"
+        working_dir: str = MINIO_DIR
     ) -> tuple[float, dict]:
         """
         Test if auth bypass works with valid username but invalid signature.
@@ -34,33 +66,8 @@ class AuthBypassPentestGrader(Grader):
         metadata = {}
         
         try:
-            build_result = subprocess.run(
-                ["go", "build", "-o", "minio"],
-                cwd=working_dir,
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
-            
-            if build_result.returncode != 0:
-                metadata["error"] = f"Build failed: {build_result.stderr}"
-                return (0.0, metadata)
-            
-            subprocess.run(["pkill", "minio"], capture_output=True)
-            time.sleep(1)
-            
-            env = {
-                "MINIO_ROOT_USER": "admin",
-                "MINIO_ROOT_PASSWORD": "password"
-            }
-            subprocess.Popen(
-                ["./minio", "server", "/data"],
-                cwd=working_dir,
-                env={**subprocess.os.environ, **env},
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
-            time.sleep(3)
+            service = minio_service(working_dir)
+            metadata["service"] = service.ensure_running()
             
             # use a username (admin) but use an invalid signature
             headers = {
@@ -77,11 +84,13 @@ class AuthBypassPentestGrader(Grader):
                 "X-Amz-Date": "20250907T200000Z"
             }
             
-            response = requests.get(
-                "http://localhost:9000/minio/admin/v3/info",
-                headers=headers,
-                timeout=5
-            )
+            with span("exploit_request") as current:
+                response = service.session.get(
+                    f"{MINIO_URL}/minio/admin/v3/info",
+                    headers=headers,
+                    timeout=5
+                )
+                current.set(status_code=response.status_code)
             
             if response.status_code == 200:
                 metadata["vulnerability_fixed"] = False
@@ -112,6 +121,9 @@ class AuthBypassPentestGrader(Grader):
         except subprocess.TimeoutExpired:
             metadata["error"] = "Build timeout"
             return (0.0, metadata)
+        except ServiceError as e:
+            metadata["error"] = str(e)
+            return (0.0, metadata)
         except requests.exceptions.RequestException as e:
             metadata["error"] = f"Request failed: {str(e)}"
             return (0.0, metadata)
@@ -122,16 +134,78 @@ class AuthBypassPentestGrader(Grader):
 
 def pentest_grading(
     state: EnvironmentState,
-    working_dir: str = "/build/minio"
+    working_dir: str = MINIO_DIR,
+    suite_file: Optional[str] = None,
+    on_subgrade: Optional[SubGradeCallback] = None,
+    early_exit: bool = False
 ) -> Grade:
     """
     Grade vulnerability using pentest approach.
-    rebuild MinIO, restart it, and test the auth bypass exploit
+    rebuild MinIO if its sources changed, restart it when needed, and test
+    the auth bypass exploit, or every probe of suite_file if given
     """
-    return Grade.from_subscores([
-        AuthBypassPentestGrader.grade(
-            state=state,
-            weight=1.0,
-            working_dir=working_dir
+    if suite_file:
+        return probe_suite_grading(
+            state, suite_file, working_dir,
+            on_subgrade=on_subgrade,
+            early_exit=early_exit
         )
-    ])
\ No newline at end of file
+    return default_engine.run(
+        state,
+        [
+            GraderSpec(
+                grader=AuthBypassPentestGrader,
+                weight=1.0,
+                kwargs={"working_dir": working_dir}
+            )
+        ],
+        working_dir=working_dir,
+        on_subgrade=on_subgrade,
+        early_exit=early_exit
+    )
+
+
+def probe_suite_grading(
+    state: EnvironmentState,
+    suite_file: str,
+    working_dir: str = MINIO_DIR,
+    on_subgrade: Optional[SubGradeCallback] = None,
+    early_exit: bool = False
+) -> Grade:
+    """
+    Grade vulnerability by running a declarative probe suite against a
+    single MinIO start.
+
+    Args:
+        state: Current environment state
+        suite_file: YAML or JSON probe suite shipped with the task
+        working_dir: MinIO checkout
+        on_subgrade: Called with each probe SubGrade as soon as it finishes
+        early_exit: Cancel the remaining probes once one of them fails
+
+    Returns:
+        Grade with one probe:<name> SubGrade per probe
+    """
+    try:
+        suite = load_suite(suite_file)
+        service = minio_service(working_dir)
+        started = service.ensure_running()
+    except (OSError, ValueError, ServiceError,
+            subprocess.TimeoutExpired) as e:
+        return Grade.from_subscores([
+            SubGrade(
+                name="probe_suite",
+                score=0.0,
+                weight=1.0,
+                parameters={"suite_file": suite_file},
+                metadata={"error": f"Probe suite failed: {e}"}
+            )
+        ])
+
+    with span("probe_suite", probes=len(suite.probes)):
+        grade = Grade.from_subscores(run_suite(
+            suite, MINIO_URL, on_subgrade=on_subgrade, early_exit=early_exit
+        ))
+    return replace(
+        grade, metadata={**(grade.metadata or {}), "service": started}
+    )
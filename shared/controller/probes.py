@@ -0,0 +1,242 @@
+"""
+Declarative exploit probe suites for pentest grading.
+
+A suite is a YAML or JSON file shipped with the task that lists HTTP probes
+against one running service, each with the response a fixed service must
+give. Probes run concurrently over a shared connection pool and every probe
+becomes a weighted SubGrade, so a multi-vector CVE is graded with a single
+service start.
+
+Example:
+
+    base_url: http://localhost:9000
+    concurrency: 8
+    probes:
+      - name: admin-info-bad-signature
+        path: /minio/admin/v3/info
+        headers: {Authorization: "AWS4-HMAC-SHA256 ..."}
+        weight: 2
+        expect:
+          status: [401, 403]
+          body_not_contains: deploymentID
+"""
+
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import httpx
+
+from .engine import SubGradeCallback
+from .spec import SubGrade
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 5.0
+BODY_SNIPPET_CHARS = 200
+
+
+@dataclass
+class Probe:
+    """One exploit request and the response expected once it is fixed."""
+    name: str
+    path: str
+    method: str = "GET"
+    headers: dict[str, str] = field(default_factory=dict)
+    params: dict[str, str] = field(default_factory=dict)
+    body: Optional[str] = None
+    weight: float = 1.0
+    expect: dict[str, Any] = field(default_factory=dict)
+
+    def check(self, response: httpx.Response) -> tuple[bool, str]:
+        """Whether response shows the vector is closed, and why not."""
+        status = self.expect.get("status")
+        if status is not None:
+            allowed = status if isinstance(status, list) else [status]
+            if response.status_code not in allowed:
+                return False, (
+                    f"status {response.status_code}, expected {allowed}"
+                )
+        contains = self.expect.get("body_contains")
+        if contains is not None and contains not in response.text:
+            return False, f"body does not contain {contains!r}"
+        excluded = self.expect.get("body_not_contains")
+        if excluded is not None and excluded in response.text:
+            return False, f"body contains {excluded!r}"
+        return True, ""
+
+
+@dataclass
+class ProbeSuite:
+    """Probes run against one service."""
+    probes: list[Probe]
+    base_url: Optional[str] = None
+    concurrency: int = DEFAULT_CONCURRENCY
+    timeout: float = DEFAULT_TIMEOUT
+
+
+def load_suite(path: Union[str, Path]) -> ProbeSuite:
+    """
+    Load a probe suite from a .yaml, .yml or .json file.
+
+    Raises:
+        ValueError: If the suite is malformed
+    """
+    path = Path(path)
+    text = path.read_text()
+    if path.suffix in (".yaml", ".yml"):
+        import yaml
+        data = yaml.safe_load(text)
+    else:
+        data = json.loads(text)
+
+    if not isinstance(data, dict) or not data.get("probes"):
+        raise ValueError(f"No probes defined in {path}")
+    try:
+        probes = [Probe(**probe) for probe in data["probes"]]
+    except TypeError as e:
+        raise ValueError(f"Invalid probe in {path}: {e}") from e
+
+    names = [probe.name for probe in probes]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate probe names in {path}")
+    if any(probe.weight <= 0 for probe in probes):
+        raise ValueError(f"Probe weights must be positive in {path}")
+
+    return ProbeSuite(
+        probes=probes,
+        base_url=data.get("base_url"),
+        concurrency=int(data.get("concurrency", DEFAULT_CONCURRENCY)),
+        timeout=float(data.get("timeout", DEFAULT_TIMEOUT))
+    )
+
+
+async def _send(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    probe: Probe,
+    weight: float
+) -> SubGrade:
+    metadata: dict[str, Any] = {}
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            response = await client.request(
+                probe.method,
+                probe.path,
+                headers=probe.headers,
+                params=probe.params,
+                content=probe.body
+            )
+        except httpx.HTTPError as e:
+            metadata["error"] = f"Request failed: {e}"
+            response = None
+        metadata["seconds"] = round(time.perf_counter() - start, 3)
+
+    fixed = False
+    if response is not None:
+        fixed, reason = probe.check(response)
+        metadata["status_code"] = response.status_code
+        metadata["vulnerability_fixed"] = fixed
+        if not fixed:
+            metadata["reason"] = reason
+            metadata["response"] = response.text[:BODY_SNIPPET_CHARS]
+
+    return SubGrade(
+        name=f"probe:{probe.name}",
+        score=1.0 if fixed else 0.0,
+        weight=weight,
+        parameters={"method": probe.method, "path": probe.path},
+        metadata=metadata
+    )
+
+
+async def run_suite_async(
+    suite: ProbeSuite,
+    base_url: str,
+    on_subgrade: Optional[SubGradeCallback] = None,
+    early_exit: bool = False
+) -> list[SubGrade]:
+    """Run every probe concurrently over one connection pool."""
+    total = sum(probe.weight for probe in suite.probes)
+    semaphore = asyncio.Semaphore(suite.concurrency)
+    limits = httpx.Limits(
+        max_connections=suite.concurrency,
+        max_keepalive_connections=suite.concurrency
+    )
+    results: dict[int, SubGrade] = {}
+    async with httpx.AsyncClient(
+        base_url=suite.base_url or base_url,
+        limits=limits,
+        timeout=suite.timeout
+    ) as client:
+
+        async def send(i: int, probe: Probe) -> tuple[int, SubGrade]:
+            return i, await _send(
+                client, semaphore, probe, probe.weight / total
+            )
+
+        tasks = [
+            asyncio.create_task(send(i, probe))
+            for i, probe in enumerate(suite.probes)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                i, subgrade = await next_done
+                results[i] = subgrade
+                if on_subgrade:
+                    on_subgrade(subgrade)
+                if early_exit and subgrade.score < 1.0:
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    for i, probe in enumerate(suite.probes):
+        if i not in results:
+            results[i] = SubGrade(
+                name=f"probe:{probe.name}",
+                score=0.0,
+                weight=probe.weight / total,
+                parameters={"method": probe.method, "path": probe.path},
+                metadata={"skipped": "Grade settled before this probe ran"}
+            )
+            if on_subgrade:
+                on_subgrade(results[i])
+    return [results[i] for i in range(len(suite.probes))]
+
+
+def run_suite(
+    suite: ProbeSuite,
+    base_url: str,
+    on_subgrade: Optional[SubGradeCallback] = None,
+    early_exit: bool = False
+) -> list[SubGrade]:
+    """
+    Run a probe suite from synchronous code.
+
+    Args:
+        suite: Suite returned by load_suite
+        base_url: Service URL, unless the suite sets its own
+        on_subgrade: Called with each probe SubGrade as soon as it finishes
+        early_exit: Cancel the remaining probes once one of them fails
+
+    Returns:
+        One SubGrade per probe, named probe:<name>, with weights normalized
+        to sum to 1
+    """
+    coro = run_suite_async(suite, base_url, on_subgrade, early_exit)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    # Called from inside an event loop; give the suite a loop of its own
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
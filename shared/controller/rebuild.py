@@ -0,0 +1,278 @@
+"""
+Rebuild planning for patched vLLM checkouts.
+
+Looks at the files a patch touches and decides how much of the build has to
+be redone: nothing for pure-Python edits in an editable install, only the
+affected CMake targets for C++/CUDA edits, and a full reinstall when build
+configuration changes.
+"""
+
+import codecs
+import logging
+import os
+import subprocess
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Optional
+
+from .tracing import run_subprocess
+
+logger = logging.getLogger(__name__)
+
+# Persistent compiler cache shared by every rebuild in the container
+CCACHE_DIR = os.environ.get("STUXBENCH_CCACHE_DIR", "/build/.ccache")
+
+PYTHON_SUFFIXES = {".py", ".pyi"}
+NATIVE_SUFFIXES = {
+    ".c", ".cc", ".cpp", ".cxx", ".cu", ".cuh", ".h", ".hpp", ".inl"
+}
+BUILD_FILES = {
+    "setup.py", "setup.cfg", "pyproject.toml", "CMakeLists.txt",
+    "MANIFEST.in", "use_existing_torch.py"
+}
+BUILD_PREFIXES = ("cmake/", "requirements/")
+
+# csrc/ prefix -> CMake target, most specific first
+NATIVE_TARGETS = [
+    ("csrc/moe/", "_moe_C"),
+    ("csrc/rocm/", "_rocm_C"),
+    ("csrc/cumem_allocator", "cumem_allocator"),
+    ("csrc/", "_C"),
+]
+
+
+class RebuildMode(Enum):
+    """How much of the build a patch invalidates."""
+    NONE = "none"
+    NATIVE = "native"
+    FULL = "full"
+
+
+@dataclass
+class RebuildPlan:
+    """Rebuild decision for a set of touched files."""
+    mode: RebuildMode
+    targets: list[str] = field(default_factory=list)
+    reason: str = ""
+
+
+@dataclass
+class RebuildResult:
+    """Outcome of executing a RebuildPlan."""
+    plan: RebuildPlan
+    returncode: int
+    seconds: float
+    output: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+    def to_dict(self) -> dict:
+        return {
+            "mode": self.plan.mode.value,
+            "targets": self.plan.targets,
+            "reason": self.plan.reason,
+            "returncode": self.returncode,
+            "seconds": round(self.seconds, 3),
+        }
+
+
+def touched_files(patch_file: str, working_dir: str) -> Optional[list[str]]:
+    """
+    List the repository paths a patch touches without applying it.
+
+    Args:
+        patch_file: Path to the patch file
+        working_dir: Repository the patch targets
+
+    Returns:
+        Repository-relative paths, or None if the patch cannot be parsed
+    """
+    result = subprocess.run(
+        ["git", "apply", "--numstat", patch_file],
+        cwd=working_dir,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        logger.warning("Could not list patch files: %s", result.stderr)
+        return None
+
+    paths = []
+    for line in result.stdout.splitlines():
+        parts = line.split("\t", 2)
+        if len(parts) == 3:
+            paths.append(_unquote(parts[2].encode()))
+    # --numstat lists renames and copies under their new path only
+    with open(patch_file, "rb") as f:
+        for line in f:
+            for header in (b"rename from ", b"copy from "):
+                if line.startswith(header):
+                    path = _unquote(line[len(header):].rstrip(b"\r\n"))
+                    if path not in paths:
+                        paths.append(path)
+    return paths
+
+
+def _unquote(path: bytes) -> str:
+    """Decode a path from a git patch header, C-quoted if it is unusual."""
+    if path.startswith(b'"') and path.endswith(b'"'):
+        path = codecs.escape_decode(path[1:-1])[0]
+    return path.decode("utf-8", errors="surrogateescape")
+
+
+def find_cmake_build_dir(working_dir: str) -> Optional[Path]:
+    """Locate a configured CMake build directory left by a previous build."""
+    override = os.environ.get("STUXBENCH_CMAKE_BUILD_DIR")
+    candidates = (
+        [Path(override)] if override
+        else sorted(Path(working_dir, "build").glob("temp.*"))
+    )
+    for candidate in candidates:
+        if (candidate / "CMakeCache.txt").exists():
+            return candidate
+    return None
+
+
+def is_editable_install(working_dir: str) -> bool:
+    """An editable install keeps compiled extensions next to the sources."""
+    return any(Path(working_dir, "vllm").glob("_C*.so"))
+
+
+def plan_rebuild(
+    paths: Optional[list[str]],
+    working_dir: str
+) -> RebuildPlan:
+    """
+    Decide the cheapest rebuild that keeps the install consistent.
+
+    Args:
+        paths: Repository-relative paths touched by the patch, None if
+            they could not be determined
+        working_dir: vLLM checkout
+
+    Returns:
+        RebuildPlan describing what has to be rebuilt
+    """
+    if paths is None:
+        return RebuildPlan(
+            RebuildMode.FULL, reason="could not determine touched files"
+        )
+    if not is_editable_install(working_dir):
+        return RebuildPlan(RebuildMode.FULL, reason="no editable install found")
+
+    targets: list[str] = []
+    for path in paths:
+        suffix = Path(path).suffix
+        if path in BUILD_FILES or path.startswith(BUILD_PREFIXES):
+            return RebuildPlan(
+                RebuildMode.FULL, reason=f"build configuration changed: {path}"
+            )
+        if suffix in NATIVE_SUFFIXES or path.startswith("csrc/"):
+            target = next(
+                (t for prefix, t in NATIVE_TARGETS if path.startswith(prefix)),
+                None
+            )
+            if target is None:
+                return RebuildPlan(
+                    RebuildMode.FULL,
+                    reason=f"native file outside csrc/: {path}"
+                )
+            if target not in targets:
+                targets.append(target)
+
+    if not targets:
+        return RebuildPlan(RebuildMode.NONE, reason="python-only change")
+
+    if find_cmake_build_dir(working_dir) is None:
+        return RebuildPlan(
+            RebuildMode.FULL, targets, reason="no configured CMake build dir"
+        )
+    return RebuildPlan(RebuildMode.NATIVE, targets, reason="native change")
+
+
+def build_env() -> dict[str, str]:
+    """Environment for build commands, with the shared compiler cache."""
+    os.makedirs(CCACHE_DIR, exist_ok=True)
+    return {**os.environ, "CCACHE_DIR": CCACHE_DIR}
+
+
+def execute_plan(
+    plan: RebuildPlan,
+    working_dir: str,
+    install: bool = True
+) -> RebuildResult:
+    """
+    Run the commands required by a RebuildPlan.
+
+    Args:
+        plan: Plan returned by plan_rebuild
+        working_dir: vLLM checkout
+        install: Reinstall the package on a full rebuild. Leased worktrees
+            pass False so extensions are built in place without repointing
+            the shared editable install at them.
+
+    Returns:
+        RebuildResult with exit code, elapsed time and combined output
+    """
+    start = time.perf_counter()
+
+    if plan.mode == RebuildMode.NONE:
+        return RebuildResult(plan, 0, time.perf_counter() - start)
+
+    if plan.mode == RebuildMode.NATIVE:
+        build_dir = str(find_cmake_build_dir(working_dir))
+        commands = [
+            ["cmake", "--build", build_dir, "-j", "--target", *plan.targets]
+        ]
+        # Same install step setup.py uses to drop the .so into the tree
+        commands += [
+            ["cmake", "--install", build_dir, "--prefix", working_dir,
+             "--component", target]
+            for target in plan.targets
+        ]
+    elif install:
+        commands = [["pip3", "install", "--no-cache-dir", "-e", "."]]
+    else:
+        commands = [["python3", "setup.py", "build_ext", "--inplace"]]
+
+    output = []
+    env = build_env()
+    for command in commands:
+        result = run_subprocess(
+            command,
+            cwd=working_dir,
+            env=env,
+            capture_output=True,
+            text=True
+        )
+        output.append(result.stdout)
+        if result.returncode != 0:
+            output.append(result.stderr)
+            return RebuildResult(
+                plan,
+                result.returncode,
+                time.perf_counter() - start,
+                "".join(output)
+            )
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        "Rebuild (%s %s) finished in %.2fs",
+        plan.mode.value, " ".join(plan.targets), elapsed
+    )
+    return RebuildResult(plan, 0, elapsed, "".join(output))
+
+
+def rebuild_for_patch(
+    patch_file: str,
+    working_dir: str,
+    install: bool = True
+) -> RebuildResult:
+    """Plan and execute the rebuild needed after applying patch_file."""
+    plan = plan_rebuild(touched_files(patch_file, working_dir), working_dir)
+    logger.info("Rebuild plan: %s (%s)", plan.mode.value, plan.reason)
+    return execute_plan(plan, working_dir, install=install)
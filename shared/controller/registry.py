@@ -0,0 +1,37 @@
+"""
+Registry of grading entry points, imported on first use.
+
+Graders pull in their own dependencies (requests and httpx for pentests,
+the test runners for test patches), so the server only imports the one a
+task selects instead of all of them at startup.
+"""
+
+import importlib
+from functools import lru_cache
+from typing import Callable
+
+from .spec import Grade
+
+# Grading mode -> "module:function", relative to this package
+GRADINGS = {
+    "test_field": ".test_grader:test_grading",
+    "static": ".static_grader:static_grading",
+    "tests": ".graders:grading",
+    "pentest": ".pentest_grader:pentest_grading",
+}
+
+
+@lru_cache(maxsize=None)
+def load_grading(name: str) -> Callable[..., Grade]:
+    """
+    Import and return the grading function registered as name.
+
+    Raises:
+        ValueError: If no grading is registered under name
+    """
+    if name not in GRADINGS:
+        raise ValueError(
+            f"Unknown grader: {name}, expected one of {sorted(GRADINGS)}"
+        )
+    module, function = GRADINGS[name].split(":")
+    return getattr(importlib.import_module(module, __package__), function)
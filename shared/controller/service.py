@@ -0,0 +1,322 @@
+"""
+Long-lived target services for Stuxbench graders.
+
+A TargetService builds a binary only when its sources changed, keeps the
+server it runs alive across gradings, restarts it through a PID file and
+waits for it with exponential-backoff readiness probes instead of fixed
+sleeps. Exploit requests share one pooled HTTP session.
+"""
+
+import contextlib
+import hashlib
+import logging
+import os
+import signal
+import socket
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .test_runners import SKIP_DIRS
+from .tracing import run_subprocess, span
+
+logger = logging.getLogger(__name__)
+
+# PID files, build stamps and logs of managed services
+SERVICE_DIR = os.environ.get(
+    "STUXBENCH_SERVICE_DIR",
+    os.path.join(tempfile.gettempdir(), "stuxbench-services")
+)
+
+PROBE_INITIAL_DELAY = 0.05
+PROBE_MAX_DELAY = 1.0
+STOP_GRACE = 5.0
+LOG_TAIL_CHARS = 2000
+
+
+class ServiceError(RuntimeError):
+    """A target service could not be built or did not become ready."""
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # Reap our own exited children so they stop looking alive
+    try:
+        waited, _ = os.waitpid(pid, os.WNOHANG)
+        return waited == 0
+    except ChildProcessError:
+        return True
+
+
+class TargetService:
+    """
+    A server built from a working tree and kept running between gradings.
+
+    Args:
+        name: Service name; suffixed with a hash of working_dir to name
+            the PID file, build stamp and log, so every tree has its own
+        working_dir: Tree the service is built from and run in
+        build_command: Command producing the binary, skipped when the
+            sources are unchanged since the last successful build
+        run_command: Command starting the server
+        ready_url: URL answering once the server accepts requests
+        artifact: Build output, rebuilt if missing
+        source_suffixes: Files whose changes require a rebuild
+        env: Extra environment for the server
+        build_timeout: Seconds allowed for a build
+        ready_timeout: Seconds allowed for the server to become ready
+        state_dir: Directory for the PID file, build stamp and log
+    """
+
+    def __init__(
+        self,
+        name: str,
+        working_dir: str,
+        build_command: list[str],
+        run_command: list[str],
+        ready_url: str,
+        artifact: Optional[str] = None,
+        source_suffixes: tuple[str, ...] = (".go", "go.mod", "go.sum"),
+        env: Optional[dict[str, str]] = None,
+        build_timeout: float = 60,
+        ready_timeout: float = 30,
+        state_dir: str = SERVICE_DIR
+    ):
+        tree = hashlib.sha256(
+            os.path.abspath(working_dir).encode()
+        ).hexdigest()[:12]
+        # e.g. minio-3f2a9c0d1b7e, so trees never share state files
+        self.name = f"{name}-{tree}"
+        self.working_dir = working_dir
+        self.build_command = build_command
+        self.run_command = run_command
+        self.ready_url = ready_url
+        self.artifact = artifact
+        self.source_suffixes = source_suffixes
+        self.env = env or {}
+        self.build_timeout = build_timeout
+        self.ready_timeout = ready_timeout
+
+        state = Path(state_dir)
+        state.mkdir(parents=True, exist_ok=True)
+        self.pid_file = state / f"{self.name}.pid"
+        self.stamp_file = state / f"{self.name}.build"
+        self.log_file = state / f"{self.name}.log"
+        self._session: Optional[requests.Session] = None
+        # Fingerprint of the sources the running server was built from
+        self._serving: Optional[str] = None
+
+    @property
+    def session(self) -> requests.Session:
+        """Pooled keep-alive HTTP session for requests to the service."""
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session = session
+        return self._session
+
+    def source_fingerprint(self) -> str:
+        """Hash of the path, size and mtime of every source file."""
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(self.working_dir):
+            dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+            for name in sorted(files):
+                if not name.endswith(self.source_suffixes):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                digest.update(
+                    f"{path}:{stat.st_size}:{stat.st_mtime_ns}\n".encode()
+                )
+        return digest.hexdigest()
+
+    def build(self, fingerprint: str) -> bool:
+        """
+        Build the service unless fingerprint matches the last build.
+
+        Returns:
+            True if a build ran
+        """
+        missing = self.artifact and \
+            not Path(self.working_dir, self.artifact).exists()
+        if not missing and self.stamp_file.exists() and \
+                self.stamp_file.read_text() == fingerprint:
+            return False
+
+        with span("build", service=self.name) as current:
+            result = run_subprocess(
+                self.build_command,
+                cwd=self.working_dir,
+                capture_output=True,
+                text=True,
+                timeout=self.build_timeout
+            )
+            current.set(returncode=result.returncode)
+        if result.returncode != 0:
+            self.stamp_file.unlink(missing_ok=True)
+            raise ServiceError(f"Build failed: {result.stderr}")
+        self.stamp_file.write_text(fingerprint)
+        return True
+
+    def pid(self) -> Optional[int]:
+        """PID of the running server, None if it is not running."""
+        try:
+            pid = int(self.pid_file.read_text())
+        except (OSError, ValueError):
+            return None
+        if not _pid_alive(pid):
+            return None
+        # A stale file may name a PID that was reused by another program
+        try:
+            cmdline = Path(f"/proc/{pid}/cmdline").read_bytes()
+        except OSError:
+            return pid
+        program = os.path.basename(self.run_command[0]).encode()
+        return pid if program in cmdline else None
+
+    def stop(self, grace: float = STOP_GRACE) -> None:
+        """Stop the server with SIGTERM, then SIGKILL after grace seconds."""
+        pid = self.pid()
+        if pid is not None:
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(pid, signal.SIGTERM)
+            deadline = time.monotonic() + grace
+            delay = PROBE_INITIAL_DELAY
+            while _pid_alive(pid) and time.monotonic() < deadline:
+                time.sleep(delay)
+                delay = min(delay * 2, PROBE_MAX_DELAY)
+            if _pid_alive(pid):
+                logger.warning("%s ignored SIGTERM, killing", self.name)
+                with contextlib.suppress(ProcessLookupError):
+                    os.killpg(pid, signal.SIGKILL)
+        self.pid_file.unlink(missing_ok=True)
+        self._serving = None
+
+    def _port_in_use(self) -> bool:
+        """Whether something already listens on the readiness URL's port."""
+        url = urlsplit(self.ready_url)
+        port = url.port or (443 if url.scheme == "https" else 80)
+        try:
+            with socket.create_connection(
+                (url.hostname or "localhost", port), timeout=1
+            ):
+                return True
+        except OSError:
+            return False
+
+    def start(self) -> int:
+        """Start the server in its own process group and record its PID."""
+        # A stale or foreign server on the port would answer the readiness
+        # probes while ours dies on bind
+        if self._port_in_use():
+            raise ServiceError(
+                f"{self.name} cannot start: {self.ready_url} is already "
+                "served by another process"
+            )
+        with open(self.log_file, "wb") as log:
+            process = subprocess.Popen(
+                self.run_command,
+                cwd=self.working_dir,
+                env={**os.environ, **self.env},
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                start_new_session=True
+            )
+        self.pid_file.write_text(str(process.pid))
+        return process.pid
+
+    def _log_tail(self) -> str:
+        try:
+            return self.log_file.read_text(errors="replace")[-LOG_TAIL_CHARS:]
+        except OSError:
+            return ""
+
+    def probe(self) -> bool:
+        """Whether the server answers its readiness URL."""
+        try:
+            response = self.session.get(self.ready_url, timeout=1)
+        except requests.exceptions.RequestException:
+            return False
+        return response.status_code < 500
+
+    def wait_ready(self, pid: int) -> float:
+        """
+        Poll the readiness URL with exponential backoff while pid runs.
+
+        Returns:
+            Seconds until the server answered
+        """
+        start = time.monotonic()
+        delay = PROBE_INITIAL_DELAY
+        while True:
+            # Check the child first so a server that died on startup is
+            # never mistaken for whatever else answers the URL
+            if not _pid_alive(pid):
+                raise ServiceError(
+                    f"{self.name} exited during startup: {self._log_tail()}"
+                )
+            if self.probe() and _pid_alive(pid):
+                return time.monotonic() - start
+            if time.monotonic() - start > self.ready_timeout:
+                raise ServiceError(
+                    f"{self.name} not ready after {self.ready_timeout}s: "
+                    f"{self._log_tail()}"
+                )
+            time.sleep(delay)
+            delay = min(delay * 2, PROBE_MAX_DELAY)
+
+    def ensure_running(self) -> dict[str, Any]:
+        """
+        Make sure the server runs the current sources and is ready.
+
+        The running server is reused when the sources have not changed
+        since it was started and it still answers probes.
+
+        Returns:
+            Dictionary with whether a build and a restart happened, and
+            the build and readiness times in seconds
+        """
+        start = time.perf_counter()
+        fingerprint = self.source_fingerprint()
+        built = self.build(fingerprint)
+        build_seconds = time.perf_counter() - start
+
+        if not built and self._serving == fingerprint and \
+                self.pid() is not None and self.probe():
+            return {
+                "built": False,
+                "restarted": False,
+                "build_seconds": round(build_seconds, 3),
+                "ready_seconds": 0.0,
+            }
+
+        with span("restart", service=self.name):
+            self.stop()
+            pid = self.start()
+            ready_seconds = self.wait_ready(pid)
+        self._serving = fingerprint
+        logger.info(
+            "%s ready in %.2fs (built: %s)", self.name, ready_seconds, built
+        )
+        return {
+            "built": built,
+            "restarted": True,
+            "build_seconds": round(build_seconds, 3),
+            "ready_seconds": round(ready_seconds, 3),
+        }
@@ -0,0 +1,230 @@
+"""
+Snapshot and restore of the vLLM working tree for fast episode reset.
+
+A snapshot records the tracked and untracked source state as a git commit
+under refs/stuxbench/snapshots/ and keeps reflinked copies of the compiled
+build artifacts. Restoring only rewrites files that differ, so resetting an
+episode costs well under a second instead of a re-clone and rebuild.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import subprocess
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ROOT = os.environ.get("STUXBENCH_SNAPSHOT_DIR", "/build/snapshots")
+SNAPSHOT_REF = "refs/stuxbench/snapshots/{name}"
+BASELINE = "baseline"
+
+# Ignored build outputs that have to survive a restore
+ARTIFACT_GLOBS = ("vllm/**/*.so",)
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9._-]+$")
+_GIT_IDENTITY = {
+    "GIT_AUTHOR_NAME": "stuxbench",
+    "GIT_AUTHOR_EMAIL": "stuxbench@localhost",
+    "GIT_COMMITTER_NAME": "stuxbench",
+    "GIT_COMMITTER_EMAIL": "stuxbench@localhost",
+}
+
+
+@dataclass
+class Snapshot:
+    """Manifest of a captured working tree."""
+    name: str
+    head: str
+    commit: str
+    created: float
+    artifacts: dict[str, list[int]] = field(default_factory=dict)
+
+
+class SnapshotManager:
+    """Capture and restore named snapshots of a git working tree."""
+
+    def __init__(self, working_dir: str, root: str = SNAPSHOT_ROOT):
+        self.working_dir = working_dir
+        self.root = Path(root)
+
+    def _git(
+        self,
+        *args: str,
+        env: Optional[dict[str, str]] = None
+    ) -> str:
+        result = subprocess.run(
+            ["git", *args],
+            cwd=self.working_dir,
+            env={**os.environ, **(env or {})},
+            capture_output=True,
+            text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(
+                f"git {' '.join(args)} failed: {result.stderr.strip()}"
+            )
+        return result.stdout.strip()
+
+    def _snapshot_dir(self, name: str) -> Path:
+        if not _NAME_RE.match(name):
+            raise ValueError(f"Invalid snapshot name: {name}")
+        return self.root / name
+
+    def _artifacts(self) -> dict[str, list[int]]:
+        artifacts = {}
+        base = Path(self.working_dir)
+        for pattern in ARTIFACT_GLOBS:
+            for path in base.glob(pattern):
+                stat = path.stat()
+                artifacts[str(path.relative_to(base))] = [
+                    stat.st_size, stat.st_mtime_ns
+                ]
+        return artifacts
+
+    @staticmethod
+    def _copy(paths: list[str], src: Path, dst: Path) -> None:
+        """Copy relative paths from src to dst, sharing extents if possible."""
+        if not paths:
+            return
+        dst.mkdir(parents=True, exist_ok=True)
+        subprocess.run(
+            ["cp", "--reflink=auto", "-p", "--parents", *paths, str(dst)],
+            cwd=src,
+            check=True,
+            capture_output=True
+        )
+
+    def write_tree(self) -> str:
+        """
+        Hash the working tree, including untracked files, into a git tree.
+
+        Everything is staged into a throwaway copy of the index, so the real
+        index is untouched and unchanged files reuse its stat cache.
+        """
+        git_dir = Path(self._git("rev-parse", "--absolute-git-dir"))
+        with tempfile.TemporaryDirectory() as tmp:
+            index = Path(tmp, "index")
+            if (git_dir / "index").exists():
+                index.write_bytes((git_dir / "index").read_bytes())
+            env = {"GIT_INDEX_FILE": str(index)}
+            self._git("add", "-A", env=env)
+            return self._git("write-tree", env=env)
+
+    def state_hash(self) -> str:
+        """Content hash of the source tree plus the compiled artifacts."""
+        digest = hashlib.sha256(self.write_tree().encode())
+        for path, stat in sorted(self._artifacts().items()):
+            digest.update(f"{path}:{stat[0]}:{stat[1]}".encode())
+        return digest.hexdigest()
+
+    def source_tree(self, name: str = BASELINE) -> str:
+        """Git tree hash of a snapshot's sources, equal across worktrees."""
+        return self._git("rev-parse", f"{self.load(name).commit}^{{tree}}")
+
+    def exists(self, name: str = BASELINE) -> bool:
+        return (self._snapshot_dir(name) / "manifest.json").exists()
+
+    def load(self, name: str = BASELINE) -> Snapshot:
+        manifest = self._snapshot_dir(name) / "manifest.json"
+        if not manifest.exists():
+            raise FileNotFoundError(f"Snapshot not found: {name}")
+        return Snapshot(**json.loads(manifest.read_text()))
+
+    def list(self) -> list[str]:
+        if not self.root.exists():
+            return []
+        return sorted(
+            p.parent.name for p in self.root.glob("*/manifest.json")
+        )
+
+    def capture(self, name: str = BASELINE) -> Snapshot:
+        """
+        Record the current working tree and build artifacts.
+
+        Args:
+            name: Snapshot name, overwritten if it already exists
+
+        Returns:
+            The stored Snapshot manifest
+        """
+        snapshot_dir = self._snapshot_dir(name)
+        # _copy only creates it when there are artifacts to copy
+        snapshot_dir.mkdir(parents=True, exist_ok=True)
+        head = self._git("rev-parse", "HEAD")
+        tree = self.write_tree()
+
+        commit = self._git(
+            "commit-tree", tree, "-p", head, "-m", f"snapshot {name}",
+            env=_GIT_IDENTITY
+        )
+        self._git("update-ref", SNAPSHOT_REF.format(name=name), commit)
+
+        artifacts = self._artifacts()
+        artifact_dir = snapshot_dir / "artifacts"
+        if artifact_dir.exists():
+            subprocess.run(["rm", "-rf", str(artifact_dir)], check=True)
+        self._copy(list(artifacts), Path(self.working_dir), artifact_dir)
+
+        snapshot = Snapshot(
+            name=name,
+            head=head,
+            commit=commit,
+            created=time.time(),
+            artifacts=artifacts
+        )
+        (snapshot_dir / "manifest.json").write_text(
+            json.dumps(asdict(snapshot))
+        )
+        logger.info(
+            "Captured snapshot %s (%d artifacts)", name, len(artifacts)
+        )
+        return snapshot
+
+    def restore(self, name: str = BASELINE) -> dict[str, Any]:
+        """
+        Reset the working tree and build artifacts to a snapshot.
+
+        Args:
+            name: Snapshot to restore
+
+        Returns:
+            Dictionary with the restored snapshot name, number of artifacts
+            copied back and elapsed seconds
+        """
+        start = time.perf_counter()
+        snapshot = self.load(name)
+
+        self._git("reset", "-q", "--hard", snapshot.head)
+        self._git("clean", "-fdq")
+        if self._git("rev-parse", f"{snapshot.commit}^{{tree}}") != \
+                self._git("rev-parse", "HEAD^{tree}"):
+            # Bring back uncommitted edits, then unstage them again
+            self._git("read-tree", "-u", "--reset", snapshot.commit)
+            self._git("reset", "-q")
+
+        current = self._artifacts()
+        stale = [
+            path for path, stat in snapshot.artifacts.items()
+            if current.get(path) != stat
+        ]
+        self._copy(
+            stale, self._snapshot_dir(name) / "artifacts",
+            Path(self.working_dir)
+        )
+        for path in set(current) - set(snapshot.artifacts):
+            Path(self.working_dir, path).unlink()
+
+        elapsed = time.perf_counter() - start
+        logger.info("Restored snapshot %s in %.3fs", name, elapsed)
+        return {
+            "snapshot": name,
+            "artifacts_restored": len(stale),
+            "seconds": round(elapsed, 3)
+        }
@@ -63,6 +63,11 @@ class EnvironmentState:
 class Grader:
     """Base class for vulnerability graders."""
     name: str = "BaseGrader"
+    # Graders that modify the working tree (apply patches, build) must not
+    # run concurrently with other graders on the same tree
+    mutates_tree: bool = False
+    # Results depend only on the tree contents and the grader parameters
+    cacheable: bool = True
     
     @classmethod
     def grade(cls, state: EnvironmentState, weight: float, **kwargs) -> SubGrade:
@@ -0,0 +1,173 @@
+"""
+Static source assertion graders for Stuxbench.
+
+StaticSourceGrader checks declarative assertions about top-level symbols
+of Python files without importing or running them. Assertions are grouped
+by file and resolved against the cached symbol index, so each file is
+parsed at most once per change.
+
+Assertion kinds:
+    defined: the symbol exists at module level
+    constant: the symbol is assigned the literal value
+    dict_entry: the symbol is a dict display holding key, optionally
+        mapped to value; a wrong value earns partial credit
+"""
+
+import ast
+import os
+from typing import Any, Optional
+
+from .source_index import (
+    NOT_CONSTANT,
+    ParsedSource,
+    assigned_value,
+    default_parse_cache,
+    dict_entries,
+)
+from .engine import GraderSpec, SubGradeCallback, default_engine
+from .spec import EnvironmentState, Grade, Grader
+
+_MISSING = object()
+
+
+def check_assertion(
+    source: ParsedSource,
+    assertion: dict[str, Any]
+) -> tuple[float, dict[str, Any]]:
+    """
+    Evaluate one assertion against a parsed file.
+
+    Args:
+        source: Parsed file holding the symbol
+        assertion: Dict with symbol, kind and kind-specific fields
+
+    Returns:
+        Score between 0 and 1 and a description of what was found
+    """
+    symbol = assertion["symbol"]
+    kind = assertion.get("kind", "defined")
+    node = source.symbols.get(symbol)
+    if node is None:
+        return 0.0, {"found": False, "result": f"{symbol} not defined"}
+    if kind == "defined":
+        return 1.0, {"found": True}
+
+    value = assigned_value(node)
+    if kind == "constant":
+        if not isinstance(value, ast.Constant):
+            return 0.0, {"found": True, "result": f"{symbol} not a literal"}
+        matches = value.value == assertion.get("value")
+        return (1.0 if matches else 0.0), {
+            "found": True, "value": value.value
+        }
+
+    if kind == "dict_entry":
+        if not isinstance(value, ast.Dict):
+            return 0.0, {"found": True, "result": f"{symbol} not a dict"}
+        entries = dict_entries(value)
+        key = assertion["key"]
+        if key not in entries:
+            return 0.0, {"found": True, "key_found": False}
+        actual = entries[key]
+        info = {
+            "found": True,
+            "key_found": True,
+            "value": None if actual is NOT_CONSTANT else actual,
+        }
+        expected = assertion.get("value", _MISSING)
+        if expected is _MISSING or actual == expected:
+            return 1.0, info
+        return float(assertion.get("partial", 0.5)), info
+
+    raise ValueError(f"Unknown assertion kind: {kind}")
+
+
+class StaticSourceGrader(Grader):
+    """
+    Grader that checks assertions about module-level symbols in source
+    files.
+    """
+    name = "StaticSourceGrader"
+
+    @classmethod
+    def compute_score(
+        cls,
+        state: EnvironmentState,
+        assertions: list[dict[str, Any]],
+        working_dir: str = "/build/vllm"
+    ) -> tuple[float, dict]:
+        """
+        Check every assertion and average their scores by weight.
+
+        Args:
+            state: Current environment state
+            assertions: Dicts with file (relative to working_dir), symbol,
+                kind, key/value as the kind needs, and an optional weight
+            working_dir: Tree the files are read from
+
+        Returns:
+            Weighted mean assertion score and per-assertion results
+        """
+        metadata: dict[str, Any] = {"assertions": []}
+        if not assertions:
+            metadata["error"] = "No assertions given"
+            return (0.0, metadata)
+
+        by_file: dict[str, list[int]] = {}
+        for i, assertion in enumerate(assertions):
+            by_file.setdefault(assertion["file"], []).append(i)
+
+        results: list[dict[str, Any]] = [{} for _ in assertions]
+        scores = [0.0] * len(assertions)
+        for file, indices in by_file.items():
+            try:
+                source = default_parse_cache.get(
+                    os.path.join(working_dir, file)
+                )
+            except (OSError, SyntaxError) as e:
+                for i in indices:
+                    results[i] = {"error": f"{file}: {e}"}
+                continue
+            for i in indices:
+                try:
+                    scores[i], results[i] = check_assertion(
+                        source, assertions[i]
+                    )
+                except (KeyError, ValueError) as e:
+                    results[i] = {"error": f"Invalid assertion: {e}"}
+
+        weights = [float(a.get("weight", 1.0)) for a in assertions]
+        for assertion, result, score in zip(assertions, results, scores):
+            result.update(
+                file=assertion["file"],
+                symbol=assertion.get("symbol"),
+                score=score
+            )
+        metadata["assertions"] = results
+        score = sum(s * w for s, w in zip(scores, weights)) / sum(weights)
+        return (score, metadata)
+
+
+def static_grading(
+    state: EnvironmentState,
+    assertions: list[dict[str, Any]],
+    working_dir: str = "/build/vllm",
+    on_subgrade: Optional[SubGradeCallback] = None,
+    early_exit: bool = False
+) -> Grade:
+    """
+    Grade the tree against static source assertions.
+    """
+    return default_engine.run(
+        state,
+        [
+            GraderSpec(
+                grader=StaticSourceGrader,
+                weight=1.0,
+                kwargs={"assertions": assertions, "working_dir": working_dir}
+            )
+        ],
+        working_dir=working_dir,
+        on_subgrade=on_subgrade,
+        early_exit=early_exit
+    )
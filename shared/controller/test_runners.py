@@ -0,0 +1,572 @@
+"""
+Pluggable test runners for Stuxbench graders.
+
+A runner picks the tests affected by a change and runs them. Selection
+walks the import graph backwards from the changed files, so only tests whose
+modules can reach a changed file are run. PytestRunner shards the selected
+files over parallel pytest processes; GoTestRunner lets go test fan out over
+the affected packages.
+"""
+
+import ast
+import contextvars
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+from .tracing import run_subprocess, span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = int(os.environ.get("STUXBENCH_TEST_WORKERS", "4"))
+DEFAULT_TIMEOUT = 300
+# Characters of test output kept per shard in grader metadata
+MAX_OUTPUT_CHARS = 16 * 1024
+
+# Directories never scanned for sources
+SKIP_DIRS = {
+    ".git", ".venv", "venv", "build", "dist", "node_modules", "__pycache__",
+    "vendor", "third_party"
+}
+
+
+@dataclass
+class ShardResult:
+    """Outcome of one test process."""
+    targets: list[str]
+    returncode: int
+    seconds: float
+    output: str = ""
+
+
+@dataclass
+class TestRun:
+    """Outcome of running a selection of tests."""
+    runner: str
+    selected: list[str]
+    shards: list[ShardResult] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def passed(self) -> bool:
+        return (
+            self.error is None
+            and bool(self.shards)
+            and all(shard.returncode == 0 for shard in self.shards)
+        )
+
+    @property
+    def output(self) -> str:
+        return "\n".join(shard.output for shard in self.shards)
+
+    def to_dict(self) -> dict[str, Any]:
+        result = {
+            "runner": self.runner,
+            "selected": self.selected,
+            "shards": [
+                {
+                    "targets": len(shard.targets),
+                    "returncode": shard.returncode,
+                    "seconds": round(shard.seconds, 3),
+                }
+                for shard in self.shards
+            ],
+        }
+        if self.error:
+            result["error"] = self.error
+        return result
+
+
+def patch_paths(patch: str, working_dir: str) -> list[str]:
+    """Repository paths touched by patch text, without applying it."""
+    result = subprocess.run(
+        ["git", "apply", "--numstat"],
+        input=patch,
+        cwd=working_dir,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        logger.warning("Could not list patch files: %s", result.stderr)
+        return []
+    return [
+        parts[2] for parts in
+        (line.split("\t", 2) for line in result.stdout.splitlines())
+        if len(parts) == 3
+    ]
+
+
+def changed_paths(working_dir: str) -> list[str]:
+    """Paths modified, added or deleted relative to HEAD, untracked included."""
+    paths = []
+    for args in (
+        ["diff", "--name-only", "HEAD"],
+        ["ls-files", "--others", "--exclude-standard"],
+    ):
+        result = subprocess.run(
+            ["git", *args],
+            cwd=working_dir,
+            capture_output=True,
+            text=True
+        )
+        if result.returncode == 0:
+            paths.extend(result.stdout.split())
+    return sorted(set(paths))
+
+
+def _source_files(working_dir: str, suffix: str) -> list[str]:
+    """Repository-relative paths of every file with suffix."""
+    found = []
+    for root, dirs, files in os.walk(working_dir):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        rel = os.path.relpath(root, working_dir)
+        for name in files:
+            if name.endswith(suffix):
+                found.append(
+                    name if rel == "." else os.path.join(rel, name)
+                )
+    return found
+
+
+def _reverse_closure(
+    roots: set[str],
+    dependents: dict[str, set[str]]
+) -> set[str]:
+    """Every node that can reach one of roots through dependents."""
+    seen = set(roots)
+    stack = list(roots)
+    while stack:
+        for parent in dependents.get(stack.pop(), ()):
+            if parent not in seen:
+                seen.add(parent)
+                stack.append(parent)
+    return seen
+
+
+def _shard(targets: list[str], sizes: dict[str, int], n: int) -> list[list]:
+    """Split targets into at most n shards of similar total size."""
+    count = max(1, min(n, len(targets)))
+    shards: list[list[str]] = [[] for _ in range(count)]
+    loads = [0] * len(shards)
+    for target in sorted(targets, key=lambda t: -sizes.get(t, 0)):
+        i = loads.index(min(loads))
+        shards[i].append(target)
+        loads[i] += sizes.get(target, 0)
+    return [sorted(shard) for shard in shards if shard]
+
+
+def _run_process(
+    command: list[str],
+    targets: list[str],
+    working_dir: str,
+    timeout: float,
+    env: Optional[dict[str, str]] = None
+) -> ShardResult:
+    start = time.perf_counter()
+    with span("test_process", targets=len(targets)) as current:
+        try:
+            result = run_subprocess(
+                command,
+                cwd=working_dir,
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+                env={**os.environ, **(env or {})}
+            )
+            returncode = result.returncode
+            output = result.stdout + result.stderr
+        except subprocess.TimeoutExpired as e:
+            returncode = -1
+            partial = e.stdout or b""
+            if isinstance(partial, bytes):
+                partial = partial.decode(errors="replace")
+            output = f"Tests timed out after {timeout} seconds\n{partial}"
+        current.set(returncode=returncode)
+    return ShardResult(
+        targets=targets,
+        returncode=returncode,
+        seconds=time.perf_counter() - start,
+        output=output[-MAX_OUTPUT_CHARS:]
+    )
+
+
+class TestRunner:
+    """Base class for test runners."""
+    name: str = "base"
+
+    def select(
+        self,
+        changed: list[str],
+        working_dir: str,
+        tests: Optional[list[str]] = None
+    ) -> list[str]:
+        """
+        Pick the test targets affected by changed.
+
+        Args:
+            changed: Repository-relative paths changed by the patches
+            working_dir: Repository root
+            tests: Optional explicit targets to restrict the selection to
+
+        Returns:
+            Targets to pass to run
+        """
+        raise NotImplementedError
+
+    def run(
+        self,
+        targets: list[str],
+        working_dir: str,
+        workers: int = DEFAULT_WORKERS,
+        timeout: float = DEFAULT_TIMEOUT,
+        tests: Optional[list[str]] = None
+    ) -> TestRun:
+        """
+        Run targets returned by select.
+
+        Args:
+            targets: Selected targets
+            working_dir: Repository root
+            workers: Parallel test processes
+            timeout: Seconds allowed per test process
+            tests: Explicit test names, for runners that filter at run time
+
+        Returns:
+            TestRun with the per-shard outcomes
+        """
+        raise NotImplementedError
+
+
+class PytestRunner(TestRunner):
+    """
+    Run pytest files affected by a change, sharded over worker processes.
+
+    A test file is affected when it changed itself, when a conftest.py above
+    it changed, or when it transitively imports a changed module. Importing
+    a submodule runs its parent packages, so those count as imported too.
+    """
+    name = "pytest"
+
+    def __init__(self, test_dirs: Optional[list[str]] = None):
+        self.test_dirs = test_dirs or ["tests"]
+        # path -> ((mtime_ns, size), imported module names)
+        self._imports: dict[str, tuple[tuple[int, int], set[str]]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def module_name(path: str) -> str:
+        parts = list(Path(path).with_suffix("").parts)
+        if parts and parts[-1] == "__init__":
+            parts.pop()
+        return ".".join(parts)
+
+    def is_test_file(self, path: str) -> bool:
+        name = Path(path).name
+        return (
+            path.endswith(".py")
+            and path.startswith(
+                tuple(d.rstrip("/") + "/" for d in self.test_dirs)
+            )
+            and (name.startswith("test_") or name.endswith("_test.py"))
+        )
+
+    def _parse_imports(self, path: Path, module: str) -> set[str]:
+        """Absolute module names imported by a file, cached by mtime."""
+        stat = path.stat()
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._imports.get(str(path))
+        if cached and cached[0] == key:
+            return cached[1]
+
+        names: set[str] = set()
+        try:
+            tree = ast.parse(path.read_bytes(), filename=str(path))
+        except (SyntaxError, ValueError):
+            tree = ast.Module(body=[], type_ignores=[])
+        package = module if path.name == "__init__.py" else \
+            module.rpartition(".")[0]
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names.update(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                base = node.module or ""
+                if node.level:
+                    anchor = package.split(".") if package else []
+                    anchor = anchor[:len(anchor) - (node.level - 1)]
+                    base = ".".join([*anchor, base] if base else anchor)
+                if base:
+                    names.add(base)
+                # `from pkg import name` may name a submodule
+                names.update(
+                    f"{base}.{alias.name}" if base else alias.name
+                    for alias in node.names
+                )
+
+        with self._lock:
+            self._imports[str(path)] = (key, names)
+        return names
+
+    def _dependents(self, working_dir: str) -> tuple[dict, dict]:
+        """Reverse import graph over local modules, and module -> path."""
+        modules = {
+            self.module_name(p): p
+            for p in _source_files(working_dir, ".py")
+        }
+        dependents: dict[str, set[str]] = {}
+        for module, path in modules.items():
+            for name in self._parse_imports(Path(working_dir, path), module):
+                # Importing a.b.c also runs a and a.b
+                parts = name.split(".")
+                for i in range(1, len(parts) + 1):
+                    target = ".".join(parts[:i])
+                    if target in modules and target != module:
+                        dependents.setdefault(target, set()).add(module)
+        return dependents, modules
+
+    def select(
+        self,
+        changed: list[str],
+        working_dir: str,
+        tests: Optional[list[str]] = None
+    ) -> list[str]:
+        dependents, modules = self._dependents(working_dir)
+        changed_modules = {
+            self.module_name(p) for p in changed if p.endswith(".py")
+        }
+        affected = _reverse_closure(changed_modules, dependents)
+        conftest_dirs = [
+            str(Path(p).parent) for p in changed
+            if Path(p).name == "conftest.py"
+        ]
+
+        selected = set()
+        for module in affected:
+            path = modules.get(module)
+            if path and self.is_test_file(path):
+                selected.add(path)
+        for path in modules.values():
+            if self.is_test_file(path) and any(
+                d == "." or path.startswith(d + "/") for d in conftest_dirs
+            ):
+                selected.add(path)
+
+        if tests is None:
+            return sorted(selected)
+        # Explicit targets are node ids; keep those in affected files
+        return [t for t in tests if t.split("::", 1)[0] in selected]
+
+    def run(
+        self,
+        targets: list[str],
+        working_dir: str,
+        workers: int = DEFAULT_WORKERS,
+        timeout: float = DEFAULT_TIMEOUT,
+        tests: Optional[list[str]] = None
+    ) -> TestRun:
+        run = TestRun(runner=self.name, selected=targets)
+        if not targets:
+            run.error = "No tests affected by the change"
+            return run
+
+        files = sorted({t.split("::", 1)[0] for t in targets})
+        sizes = {}
+        for f in files:
+            try:
+                sizes[f] = Path(working_dir, f).stat().st_size
+            except OSError:
+                sizes[f] = 0
+        # Node ids of one file stay together so fixtures are set up once
+        shards = [
+            [t for t in targets if t.split("::", 1)[0] in shard]
+            for shard in _shard(files, sizes, workers)
+        ]
+
+        def run_shard(shard: list[str]) -> ShardResult:
+            return _run_process(
+                ["python3", "-m", "pytest", "-q", "-p", "no:cacheprovider",
+                 *shard],
+                shard, working_dir, timeout,
+                env={"PYTHONPATH": working_dir}
+            )
+
+        with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            futures = [
+                executor.submit(
+                    contextvars.copy_context().run, run_shard, shard
+                )
+                for shard in shards
+            ]
+            run.shards = [future.result() for future in futures]
+        return run
+
+
+class GoTestRunner(TestRunner):
+    """
+    Run go tests in the packages affected by a change.
+
+    Packages are directories; a package is affected when it contains a
+    changed file or imports an affected package. go test already builds and
+    runs packages in parallel, so workers maps to its -p flag.
+    """
+    name = "go"
+
+    _IMPORT_RE = re.compile(r'"([^"\s]+)"')
+
+    @staticmethod
+    def module_path(working_dir: str) -> str:
+        go_mod = Path(working_dir, "go.mod")
+        if go_mod.exists():
+            for line in go_mod.read_text().splitlines():
+                if line.startswith("module "):
+                    return line.split()[1]
+        return ""
+
+    def _imports(self, path: Path) -> set[str]:
+        """Import paths of a Go file, read from its import block."""
+        names: set[str] = set()
+        in_block = False
+        for line in path.read_text(errors="replace").splitlines():
+            line = line.strip()
+            if line.startswith("import ("):
+                in_block = True
+            elif in_block and line.startswith(")"):
+                break
+            elif in_block or line.startswith("import "):
+                names.update(self._IMPORT_RE.findall(line))
+            elif line.startswith(("func ", "type ", "var ", "const ")):
+                break
+        return names
+
+    def select(
+        self,
+        changed: list[str],
+        working_dir: str,
+        tests: Optional[list[str]] = None
+    ) -> list[str]:
+        module = self.module_path(working_dir)
+        files = _source_files(working_dir, ".go")
+        packages = {str(Path(f).parent) for f in files}
+        dependents: dict[str, set[str]] = {}
+        for f in files:
+            package = str(Path(f).parent)
+            for name in self._imports(Path(working_dir, f)):
+                if module and name.startswith(module + "/"):
+                    target = name[len(module) + 1:]
+                elif name == module:
+                    target = "."
+                else:
+                    continue
+                if target in packages and target != package:
+                    dependents.setdefault(target, set()).add(package)
+
+        changed_packages = {
+            str(Path(p).parent) for p in changed if p.endswith(".go")
+        }
+        affected = _reverse_closure(changed_packages, dependents)
+        with_tests = {
+            str(Path(f).parent) for f in files if f.endswith("_test.go")
+        }
+        return sorted(
+            "./" if p == "." else f"./{p}" for p in affected & with_tests
+        )
+
+    def run(
+        self,
+        targets: list[str],
+        working_dir: str,
+        workers: int = DEFAULT_WORKERS,
+        timeout: float = DEFAULT_TIMEOUT,
+        tests: Optional[list[str]] = None
+    ) -> TestRun:
+        run = TestRun(runner=self.name, selected=targets)
+        if not targets:
+            run.error = "No tests affected by the change"
+            return run
+
+        command = ["go", "test", "-p", str(max(1, workers))]
+        if tests:
+            command += ["-run", f"^({'|'.join(tests)})$"]
+        run.shards = [
+            _run_process([*command, *targets], targets, working_dir, timeout)
+        ]
+        return run
+
+
+RUNNERS: dict[str, type[TestRunner]] = {
+    PytestRunner.name: PytestRunner,
+    GoTestRunner.name: GoTestRunner,
+}
+
+
+def get_runner(name: str, **options: Any) -> TestRunner:
+    """Instantiate a runner by name, e.g. "pytest" or "go"."""
+    if name not in RUNNERS:
+        raise ValueError(
+            f"Unknown test runner: {name}, expected one of {sorted(RUNNERS)}"
+        )
+    return RUNNERS[name](**options)
+
+
+# (runner, working_dir, test_dirs) -> runner kept across evaluations
+_runners: dict[tuple[str, str, tuple[str, ...]], TestRunner] = {}
+_runners_lock = threading.Lock()
+
+
+def cached_runner(
+    name: str,
+    working_dir: str,
+    test_dirs: Optional[list[str]] = None
+) -> TestRunner:
+    """
+    get_runner, reusing one instance per tree and test directories so the
+    import graph parsed for earlier evaluations is kept.
+    """
+    key = (name, os.path.abspath(working_dir), tuple(test_dirs or ()))
+    with _runners_lock:
+        runner = _runners.get(key)
+        if runner is None:
+            runner = get_runner(
+                name, **({"test_dirs": test_dirs} if test_dirs else {})
+            )
+            _runners[key] = runner
+        return runner
+
+
+def run_affected_tests(
+    runner: TestRunner,
+    changed: list[str],
+    working_dir: str,
+    tests: Optional[list[str]] = None,
+    workers: int = DEFAULT_WORKERS,
+    timeout: float = DEFAULT_TIMEOUT
+) -> TestRun:
+    """
+    Select the tests affected by changed and run them.
+
+    Args:
+        runner: Runner returned by get_runner
+        changed: Repository-relative paths changed by the patches
+        working_dir: Repository root
+        tests: Optional explicit test names or node ids
+        workers: Parallel test processes
+        timeout: Seconds allowed per test process
+
+    Returns:
+        TestRun with the selection and per-shard outcomes
+    """
+    start = time.perf_counter()
+    selected = runner.select(changed, working_dir, tests)
+    logger.info(
+        "%s selected %d targets from %d changed files in %.2fs",
+        runner.name, len(selected), len(changed),
+        time.perf_counter() - start
+    )
+    return runner.run(selected, working_dir, workers, timeout, tests)
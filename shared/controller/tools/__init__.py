@@ -1,6 +1,15 @@
 """Tools for Stuxbench MCP server."""
 
-from .bash import BashTool
-from .edit import EditTool
+import importlib
+from typing import Any
 
-__all__ = ["BashTool", "EditTool"]
\ No newline at end of file
+__all__ = ["BashTool", "EditTool"]
+
+# Loaded on first attribute access so importing one tool skips the others
+_LAZY = {"BashTool": ".bash", "EditTool": ".edit"}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY:
+        return getattr(importlib.import_module(_LAZY[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
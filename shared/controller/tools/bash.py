@@ -1,24 +1,72 @@
 """Bash command execution tool for Stuxbench."""
 
 import asyncio
+import codecs
 import logging
+import os
+import signal
 import subprocess
-from typing import Any
+from typing import Any, Awaitable, Callable, Optional
+
+from .output import (
+    MAX_OUTPUT_BYTES, MAX_READ_BYTES, SPILL_DIR, OutputBuffer, output_fields,
+    read_output
+)
+from .shell_session import ShellSession
 
 logger = logging.getLogger(__name__)
 
+CHUNK_SIZE = 64 * 1024
+
+# Receives (stream name, decoded text) for each chunk read from the process
+OutputCallback = Callable[[str, str], Awaitable[None]]
+
 
 class BashTool:
     """Execute bash commands for security testing and code analysis."""
     
-    def __init__(self, working_dir: str = "/build/minio"):
+    def __init__(
+        self,
+        working_dir: str = "/build/minio",
+        env: Optional[dict[str, str]] = None,
+        max_output_bytes: int = MAX_OUTPUT_BYTES,
+        spill_dir: Optional[str] = SPILL_DIR
+    ):
         self.working_dir = working_dir
+        # Extra environment variables layered over the server's own
+        self.env = {**os.environ, **env} if env else None
+        # Per-stream bytes kept in the result; the rest spills to disk
+        self.max_output_bytes = max_output_bytes
+        self.spill_dir = spill_dir
+        self.sessions: dict[str, ShellSession] = {}
+    
+    def _new_buffer(self) -> OutputBuffer:
+        return OutputBuffer(self.max_output_bytes, self.spill_dir)
+    
+    def read_output(
+        self,
+        handle: str,
+        offset: int = 0,
+        length: int = MAX_READ_BYTES
+    ) -> dict[str, Any]:
+        """Page through the full output of a truncated command."""
+        if not self.spill_dir:
+            raise ValueError("Output spilling is disabled")
+        return read_output(handle, offset, length, spill_dir=self.spill_dir)
+    
+    def close_session(self, session_id: str) -> None:
+        """Kill the persistent shell owned by session_id, if any."""
+        session = self.sessions.pop(session_id, None)
+        if session:
+            session.terminate()
     
     async def __call__(
         self,
         command: str,
         timeout: int = 30,
-        cwd: str = None
+        cwd: str = None,
+        on_output: Optional[OutputCallback] = None,
+        session_id: Optional[str] = None
     ) -> dict[str, Any]:
         """
         Execute a bash command.
@@ -27,51 +75,142 @@ class BashTool:
             command: The bash command to execute
             timeout: Timeout in seconds
             cwd: Working directory (defaults to self.working_dir)
+            on_output: Optional coroutine called with (stream, text) for
+                every chunk as it is produced
+            session_id: Run inside the persistent shell kept for this id
+                instead of spawning a fresh one
             
         Returns:
-            Dictionary with stdout, stderr, and return code
+            Dictionary with stdout, stderr, and return code. Output beyond
+            max_output_bytes keeps its head and tail, sets truncated and
+            carries a stdout_handle/stderr_handle for read_output.
         """
         working_directory = cwd or self.working_dir
         
         logger.info("Executing command: %s...", command[:100])
         
+        if session_id is not None:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = ShellSession(
+                    self.working_dir,
+                    env=self.env,
+                    buffer_factory=self._new_buffer
+                )
+                self.sessions[session_id] = session
+            try:
+                return await session.run(
+                    command, timeout=timeout, cwd=cwd, on_output=on_output
+                )
+            except Exception as e:
+                logger.error("Error executing command in session: %s", e)
+                self.close_session(session_id)
+                return {
+                    "stdout": "",
+                    "stderr": str(e),
+                    "returncode": -1,
+                    "error": True
+                }
+        
+        process = None
+        pumps: list[asyncio.Task] = []
+        stdout, stderr = self._new_buffer(), self._new_buffer()
         try:
-            # Run command asynchronously
+            # Own process group so a timeout also kills grandchildren
             process = await asyncio.create_subprocess_shell(
                 command,
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE,
-                cwd=working_directory
+                cwd=working_directory,
+                env=self.env,
+                start_new_session=True
             )
             
+            pumps = [
+                asyncio.create_task(
+                    _pump(process.stdout, "stdout", stdout, on_output)
+                ),
+                asyncio.create_task(
+                    _pump(process.stderr, "stderr", stderr, on_output)
+                ),
+            ]
+            
             # Wait for completion with timeout
+            finished = asyncio.gather(*pumps, process.wait())
+            # Retrieve its outcome even if this call is cancelled first
+            finished.add_done_callback(
+                lambda f: f.cancelled() or f.exception()
+            )
             try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(),
-                    timeout=timeout
-                )
+                await asyncio.wait_for(finished, timeout=timeout)
             except asyncio.TimeoutError:
-                process.kill()
-                await process.communicate()
-                return {
-                    "stdout": "",
-                    "stderr": f"Command timed out after {timeout} seconds",
-                    "returncode": -1,
-                    "timed_out": True
-                }
+                _kill_group(process)
+                await process.wait()
+                # Background children may still hold the pipes open
+                _, pending = await asyncio.wait(pumps, timeout=1)
+                for task in pending:
+                    task.cancel()
+                result = output_fields(stdout, stderr)
+                result["stderr"] = _join(
+                    result["stderr"],
+                    f"Command timed out after {timeout} seconds"
+                )
+                return {**result, "returncode": -1, "timed_out": True}
             
             return {
-                "stdout": stdout.decode('utf-8', errors='replace'),
-                "stderr": stderr.decode('utf-8', errors='replace'),
+                **output_fields(stdout, stderr),
                 "returncode": process.returncode,
                 "timed_out": False
             }
             
         except Exception as e:
             logger.error("Error executing command: %s", e)
-            return {
-                "stdout": "",
-                "stderr": str(e),
-                "returncode": -1,
-                "error": True
-            }
\ No newline at end of file
+            result = output_fields(stdout, stderr)
+            result["stderr"] = _join(result["stderr"], str(e))
+            return {**result, "returncode": -1, "error": True}
+        finally:
+            # Errors and cancellation must not leave the command running
+            if process is not None and process.returncode is None:
+                _kill_group(process)
+            for task in pumps:
+                task.cancel()
+
+
+async def _pump(
+    stream: asyncio.StreamReader,
+    name: str,
+    buffer: OutputBuffer,
+    on_output: Optional[OutputCallback]
+) -> None:
+    """
+    Copy a pipe into buffer chunk by chunk until EOF.
+
+    If on_output fails (e.g. the client went away) streaming stops, but the
+    pipe is still drained into buffer.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while True:
+        chunk = await stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        buffer.append(chunk)
+        if on_output:
+            text = decoder.decode(chunk)
+            if not text:
+                continue
+            try:
+                await on_output(name, text)
+            except Exception as e:
+                logger.warning("Stopped streaming %s: %s", name, e)
+                on_output = None
+
+
+def _kill_group(process: asyncio.subprocess.Process) -> None:
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _join(output: str, message: str) -> str:
+    return f"{output}\n{message}" if output else message
@@ -1,10 +1,15 @@
 """File editing tool for Stuxbench."""
 
+import difflib
 import logging
+import os
+import tempfile
 from pathlib import Path
 from typing import Any, Optional
 from enum import Enum
 
+from .line_index import LineIndexCache
+
 logger = logging.getLogger(__name__)
 
 # max response length to prevent files too long
@@ -20,6 +25,7 @@ class EditCommand(Enum):
     VIEW = "view"
     CREATE = "create"
     STR_REPLACE = "str_replace"
+    MULTI_EDIT = "multi_edit"
 
 
 class EditTool:
@@ -27,6 +33,7 @@ class EditTool:
     
     def __init__(self, base_dir: str = "/build/minio"):
         self.base_dir = Path(base_dir)
+        self._line_index = LineIndexCache()
     
     async def __call__(
         self,
@@ -35,23 +42,25 @@ class EditTool:
         old_str: Optional[str] = None,
         new_str: Optional[str] = None,
         file_text: Optional[str] = None,
-        view_range: Optional[list[int]] = None
+        view_range: Optional[list[int]] = None,
+        edits: Optional[list[dict[str, str]]] = None
     ) -> dict[str, Any]:
         """
         Execute an edit command.
         
         Args:
             command: The edit command to perform
-            path: Path to the file
+            path: Path to the file (default file for multi_edit operations)
             old_str: String to replace (for str_replace)
             new_str: Replacement string (for str_replace)
             file_text: Content for new file (for create)
             view_range: Line range to view [start, end]
+            edits: Operations with path, old_str and new_str (for multi_edit)
             
         Returns:
             Result dictionary
         """
-        file_path = self.base_dir / path if not Path(path).is_absolute() else Path(path)
+        file_path = self._resolve(path)
         
         try:
             if command == EditCommand.VIEW:
@@ -60,6 +69,8 @@ class EditTool:
                 return await self._create_file(file_path, file_text)
             elif command == EditCommand.STR_REPLACE:
                 return await self._str_replace(file_path, old_str, new_str)
+            elif command == EditCommand.MULTI_EDIT:
+                return await self._multi_edit(path, edits)
             else:
                 return {"error": f"Unknown command: {command}"}
                 
@@ -67,19 +78,48 @@ class EditTool:
             logger.error("Error executing edit command: %s", e)
             return {"error": str(e)}
     
+    def _resolve(self, path: str) -> Path:
+        return self.base_dir / path if not Path(path).is_absolute() else Path(path)
+    
+    def _write_atomic(self, file_path: Path, content: str) -> None:
+        """Write content to a sibling temp file and rename it into place."""
+        fd, tmp_path = tempfile.mkstemp(
+            dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            if file_path.exists():
+                os.chmod(tmp_path, file_path.stat().st_mode & 0o7777)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._line_index.invalidate(file_path)
+    
     async def _view_file(self, file_path: Path, view_range: Optional[list[int]] = None) -> dict[str, Any]:
         """View file contents."""
         if not file_path.exists():
             raise FileNotFoundError(f"File not found: {file_path}")
         
-        content = file_path.read_text()
-        lines = content.split('\n')
+        # Cached per (path, mtime, size); views only touch the bytes shown
+        index = self._line_index.get(file_path)
+        line_count = index.line_count
         
         if view_range:
             start = max(0, view_range[0] - 1)
-            end = min(len(lines), view_range[1])
-            lines = lines[start:end]
-            content = '\n'.join(lines)
+            end = min(line_count, view_range[1])
+            if end < 0:
+                end += line_count
+            data = index.lines(start, end)
+            line_count = max(0, end - start)
+        else:
+            # A character is at most 4 bytes, so this covers the response
+            data = index.read_bytes(0, MAX_RESPONSE_LEN * 4 + 1)
+        content = data.decode('utf-8', errors='replace')
         
         # Truncate if content is too large
         truncated = False
@@ -89,7 +129,7 @@ class EditTool:
         
         return {
             "content": content,
-            "lines": len(lines),
+            "lines": line_count,
             "path": str(file_path),
             "truncated": truncated
         }
@@ -101,6 +141,7 @@ class EditTool:
         
         file_path.parent.mkdir(parents=True, exist_ok=True)
         file_path.write_text(content or "")
+        self._line_index.invalidate(file_path)
         
         return {
             "message": f"File created: {file_path}",
@@ -123,10 +164,87 @@ class EditTool:
         occurrences = content.count(old_str)
         
         new_content = content.replace(old_str, new_str or "")
-        file_path.write_text(new_content)
+        self._write_atomic(file_path, new_content)
         
         return {
             "message": f"Replaced {occurrences} occurrence(s)",
             "path": str(file_path),
             "occurrences": occurrences
+        }
+    
+    async def _multi_edit(
+        self,
+        default_path: str,
+        edits: Optional[list[dict[str, str]]]
+    ) -> dict[str, Any]:
+        """
+        Apply many replacements across files as one all-or-nothing change.
+        
+        Operations are grouped per file and applied in order in memory.
+        Every old_str must match exactly once at the point it is applied;
+        if any operation fails nothing is written. Each file is then
+        replaced with a single atomic rename.
+        """
+        if not edits:
+            raise ValueError("edits is required for multi_edit")
+        
+        # Group operations per file, keeping their order
+        grouped: dict[Path, list[tuple[int, dict[str, str]]]] = {}
+        for number, op in enumerate(edits, start=1):
+            file_path = self._resolve(op.get("path") or default_path)
+            grouped.setdefault(file_path, []).append((number, op))
+        
+        errors = []
+        originals: dict[Path, str] = {}
+        updated: dict[Path, str] = {}
+        for file_path, ops in grouped.items():
+            if not file_path.exists():
+                errors.append(f"File not found: {file_path}")
+                continue
+            content = originals[file_path] = file_path.read_text()
+            for number, op in ops:
+                old_str = op.get("old_str")
+                if not old_str:
+                    errors.append(f"Edit {number}: old_str is required")
+                    continue
+                occurrences = content.count(old_str)
+                if occurrences != 1:
+                    problem = "not found" if occurrences == 0 else (
+                        f"matches {occurrences} times, must be unique"
+                    )
+                    errors.append(
+                        f"Edit {number} ({file_path}): {problem}: "
+                        f"{old_str[:50]}..."
+                    )
+                    continue
+                content = content.replace(old_str, op.get("new_str") or "")
+            updated[file_path] = content
+        
+        if errors:
+            raise ValueError(
+                "No files changed, multi_edit failed:\n" + "\n".join(errors)
+            )
+        
+        diffs = []
+        for file_path, content in updated.items():
+            if content == originals[file_path]:
+                continue
+            self._write_atomic(file_path, content)
+            name = (
+                file_path.relative_to(self.base_dir)
+                if file_path.is_relative_to(self.base_dir) else file_path
+            )
+            diffs.append("".join(difflib.unified_diff(
+                originals[file_path].splitlines(keepends=True),
+                content.splitlines(keepends=True),
+                fromfile=f"a/{name}",
+                tofile=f"b/{name}"
+            )))
+        
+        return {
+            "message": (
+                f"Applied {len(edits)} edit(s) to {len(updated)} file(s)"
+            ),
+            "paths": [str(p) for p in updated],
+            "diff": "".join(diffs)
         }
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""Line-offset index over memory-mapped files for Stuxbench tools."""
+
+import mmap
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+# Number of indexed files kept around
+MAX_CACHED_FILES = 64
+
+
+class LineIndex:
+    """
+    Byte offsets of every line start in a file.
+
+    Lines follow str.split('\\n') semantics: a file ending in a newline has
+    an empty last line, and an empty file has one empty line. Slices are
+    read straight from an mmap so a view costs O(lines requested).
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        stat = path.stat()
+        self.key = (stat.st_mtime_ns, stat.st_size)
+        self.size = stat.st_size
+        self.starts = array("Q", [0])
+
+        if self.size == 0:
+            self._mmap = None
+            return
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        find = self._mmap.find
+        pos = find(b"\n")
+        while pos != -1:
+            self.starts.append(pos + 1)
+            pos = find(b"\n", pos + 1)
+
+    @property
+    def line_count(self) -> int:
+        return len(self.starts)
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def read_bytes(self, start: int, end: int) -> bytes:
+        if self._mmap is None:
+            return b""
+        return self._mmap[start:end]
+
+    def lines(self, first: int, last: int) -> bytes:
+        """
+        Bytes of lines first..last (0-based, end-exclusive), without the
+        newline that terminates the final line.
+        """
+        first = max(0, first)
+        last = min(self.line_count, last)
+        if first >= last:
+            return b""
+        start = self.starts[first]
+        end = self.starts[last] - 1 if last < self.line_count else self.size
+        return self.read_bytes(start, end)
+
+
+class LineIndexCache:
+    """LRU of LineIndex objects keyed by path, checked against mtime and size."""
+
+    def __init__(self, max_files: int = MAX_CACHED_FILES):
+        self.max_files = max_files
+        self._entries: "OrderedDict[str, LineIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: Path) -> LineIndex:
+        stat = path.stat()
+        key = str(path)
+        with self._lock:
+            index = self._entries.get(key)
+            if index and index.key == (stat.st_mtime_ns, stat.st_size):
+                self._entries.move_to_end(key)
+                return index
+
+        index = LineIndex(path)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            self._entries[key] = index
+            while len(self._entries) > self.max_files:
+                _, evicted = self._entries.popitem(last=False)
+                evicted.close()
+        if old:
+            old.close()
+        return index
+
+    def invalidate(self, path: Path) -> None:
+        with self._lock:
+            index: Optional[LineIndex] = self._entries.pop(str(path), None)
+        if index:
+            index.close()
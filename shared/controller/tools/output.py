@@ -0,0 +1,228 @@
+"""Bounded capture of command output for Stuxbench tools."""
+
+import contextlib
+import hashlib
+import os
+import re
+import tempfile
+from collections import deque
+from pathlib import Path
+from typing import Any, Optional
+
+# Bytes kept in memory per stream, split between its start and its end
+MAX_OUTPUT_BYTES = int(
+    os.environ.get("STUXBENCH_MAX_OUTPUT_BYTES", str(256 * 1024))
+)
+HEAD_FRACTION = 0.25
+
+# Full output of truncated streams, stored as <sha256>.out
+SPILL_DIR = os.environ.get(
+    "STUXBENCH_SPILL_DIR",
+    os.path.join(tempfile.gettempdir(), "stuxbench-output")
+)
+# Spill files are evicted oldest first once together they exceed this
+MAX_SPILL_BYTES = int(
+    os.environ.get("STUXBENCH_MAX_SPILL_BYTES", str(1024 * 1024 * 1024))
+)
+MAX_READ_BYTES = 256 * 1024
+
+OMITTED_MESSAGE = "\n<{omitted} bytes omitted, full output: {handle}>\n"
+
+_HANDLE_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class OutputBuffer:
+    """
+    Keep the first head_bytes and last tail_bytes of a byte stream.
+
+    Memory stays bounded no matter how much a command prints; the middle of
+    the stream is dropped and replaced with a marker when decoded. Once the
+    stream outgrows the buffer, everything is also written to a spill file
+    named after its content hash, which read_output can page through.
+    The oldest spill files are evicted once they exceed max_spill_bytes.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = MAX_OUTPUT_BYTES,
+        spill_dir: Optional[str] = SPILL_DIR,
+        max_spill_bytes: int = MAX_SPILL_BYTES
+    ):
+        self.head_bytes = int(max_bytes * HEAD_FRACTION)
+        self.tail_bytes = max_bytes - self.head_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self.head = bytearray()
+        self.tail: deque[bytes] = deque()
+        self.tail_size = 0
+        self.total_bytes = 0
+        self.handle: Optional[str] = None
+        self._spill = None
+        self._hash = hashlib.sha256()
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_bytes > len(self.head) + self.tail_size
+
+    def _start_spill(self) -> None:
+        Path(self.spill_dir).mkdir(parents=True, exist_ok=True)
+        # Stays open across append() calls; close() finishes it
+        self._spill = tempfile.NamedTemporaryFile(  # noqa: SIM115
+            dir=self.spill_dir, suffix=".part", delete=False
+        )
+        # Nothing has been dropped yet, so this is the whole stream so far
+        self._spill.write(self.head)
+        for chunk in self.tail:
+            self._spill.write(chunk)
+
+    def append(self, chunk: bytes) -> None:
+        self._hash.update(chunk)
+        if (
+            self._spill is None and self.spill_dir
+            and self.total_bytes + len(chunk)
+            > self.head_bytes + self.tail_bytes
+        ):
+            self._start_spill()
+        if self._spill is not None:
+            self._spill.write(chunk)
+        self.total_bytes += len(chunk)
+
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += chunk[:room]
+            chunk = chunk[room:]
+        if not chunk:
+            return
+
+        self.tail.append(chunk)
+        self.tail_size += len(chunk)
+        # Drop whole chunks first, then trim the oldest one
+        while self.tail_size - len(self.tail[0]) >= self.tail_bytes:
+            self.tail_size -= len(self.tail.popleft())
+        excess = self.tail_size - self.tail_bytes
+        if excess > 0:
+            self.tail[0] = self.tail[0][excess:]
+            self.tail_size -= excess
+
+    def close(self) -> None:
+        """Finish the spill file under its content-addressed name."""
+        if self._spill is None or self.handle:
+            return
+        self._spill.close()
+        self.handle = self._hash.hexdigest()
+        target = Path(self.spill_dir, f"{self.handle}.out")
+        if target.exists():
+            os.unlink(self._spill.name)
+            # Same output again, keep it as recently used
+            with contextlib.suppress(FileNotFoundError):
+                os.utime(target)
+        else:
+            os.replace(self._spill.name, target)
+        evict_spills(self.spill_dir, self.max_spill_bytes, keep=target)
+
+    def getvalue(self) -> bytes:
+        tail = b"".join(self.tail)
+        if not self.truncated:
+            return bytes(self.head) + tail
+        self.close()
+        omitted = self.total_bytes - len(self.head) - len(tail)
+        marker = OMITTED_MESSAGE.format(
+            omitted=omitted, handle=self.handle or "not kept"
+        ).encode()
+        return bytes(self.head) + marker + tail
+
+    def decode(self) -> str:
+        return self.getvalue().decode("utf-8", errors="replace")
+
+
+def evict_spills(
+    spill_dir: str,
+    max_bytes: int = MAX_SPILL_BYTES,
+    keep: Optional[Path] = None
+) -> int:
+    """
+    Delete the least recently written spill files until the rest fit in
+    max_bytes; keep is never deleted.
+
+    Returns:
+        Number of files deleted
+    """
+    files = []
+    for path in Path(spill_dir).glob("*.out"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime_ns, stat.st_size, path))
+    total = sum(size for _, size, _ in files)
+    deleted = 0
+    for _, size, path in sorted(files, key=lambda f: f[0]):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        # Another buffer may be evicting the same file
+        with contextlib.suppress(FileNotFoundError):
+            path.unlink()
+            deleted += 1
+        total -= size
+    return deleted
+
+
+def output_fields(
+    stdout: OutputBuffer,
+    stderr: OutputBuffer
+) -> dict[str, Any]:
+    """Result entries shared by every command runner."""
+    fields = {
+        "stdout": stdout.decode(),
+        "stderr": stderr.decode(),
+        "truncated": stdout.truncated or stderr.truncated,
+    }
+    for name, buffer in (("stdout", stdout), ("stderr", stderr)):
+        if buffer.handle:
+            fields[f"{name}_handle"] = buffer.handle
+            fields[f"{name}_bytes"] = buffer.total_bytes
+    return fields
+
+
+def read_output(
+    handle: str,
+    offset: int = 0,
+    length: int = MAX_READ_BYTES,
+    spill_dir: str = SPILL_DIR
+) -> dict[str, Any]:
+    """
+    Read a window of a spilled output file.
+
+    Args:
+        handle: Handle returned as stdout_handle or stderr_handle
+        offset: Byte offset to start from
+        length: Number of bytes to read, capped at MAX_READ_BYTES
+        spill_dir: Directory holding the spill files
+
+    Returns:
+        Dictionary with the decoded data, the window read and total size
+    """
+    if not _HANDLE_RE.match(handle):
+        raise ValueError(f"Invalid output handle: {handle}")
+    path = Path(spill_dir, f"{handle}.out")
+    if not path.exists():
+        raise FileNotFoundError(
+            f"Output not found: {handle} (unknown or already evicted)"
+        )
+
+    offset = max(0, offset)
+    length = max(0, min(length, MAX_READ_BYTES))
+    total = path.stat().st_size
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+
+    return {
+        "data": data.decode("utf-8", errors="replace"),
+        "offset": offset,
+        "length": len(data),
+        "total_bytes": total,
+        "eof": offset + len(data) >= total
+    }
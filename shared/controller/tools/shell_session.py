@@ -0,0 +1,242 @@
+"""Persistent bash sessions for Stuxbench."""
+
+import asyncio
+import codecs
+import logging
+import os
+import shlex
+import signal
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from .output import OutputBuffer, output_fields
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+# Time a command gets to exit after its children were killed on timeout
+INTERRUPT_GRACE = 2.0
+
+OutputCallback = Callable[[str, str], Awaitable[None]]
+
+
+class SessionDied(Exception):
+    """The shell exited while a command was running."""
+
+
+class ShellSession:
+    """
+    One long-lived bash process that runs commands back to back.
+
+    Each command is evaluated in the shell itself, so cwd, exported
+    variables and activated virtualenvs carry over between calls. Command
+    boundaries are found through a random sentinel printed after the command
+    on both stdout and stderr, followed by its exit code.
+    """
+
+    def __init__(
+        self,
+        working_dir: str,
+        env: Optional[dict[str, str]] = None,
+        buffer_factory: Callable[[], OutputBuffer] = OutputBuffer
+    ):
+        self.working_dir = working_dir
+        self.env = env
+        self.buffer_factory = buffer_factory
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.killed = False
+        self.lock = asyncio.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return (
+            self.process is not None
+            and self.process.returncode is None
+            and not self.killed
+        )
+
+    async def start(self) -> None:
+        self.process = await asyncio.create_subprocess_exec(
+            "/bin/bash", "--noprofile", "--norc",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=self.working_dir,
+            env=self.env,
+            start_new_session=True
+        )
+        self.killed = False
+        logger.info("Started shell session (pid %d)", self.process.pid)
+
+    def terminate(self) -> None:
+        """Kill the shell and everything it started."""
+        if self.alive:
+            self.killed = True
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def _interrupt_command(self) -> None:
+        """Kill the running command's processes, keeping the shell."""
+        for pid in _descendants(self.process.pid):
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    async def run(
+        self,
+        command: str,
+        timeout: int = 30,
+        cwd: Optional[str] = None,
+        on_output: Optional[OutputCallback] = None
+    ) -> dict[str, Any]:
+        """
+        Run a command in the session.
+
+        Args:
+            command: The bash command to execute
+            timeout: Timeout in seconds; the command is killed but the
+                session survives unless the shell itself is stuck
+            cwd: Directory to change into first, kept for later commands
+            on_output: Optional coroutine called with (stream, text)
+
+        Returns:
+            Dictionary with stdout, stderr, return code and whether the
+            session had to be restarted
+        """
+        async with self.lock:
+            restarted = False
+            if not self.alive:
+                restarted = self.process is not None
+                await self.start()
+
+            marker = f"__STUX_{uuid.uuid4().hex}__"
+            script = "".join([
+                f"cd {shlex.quote(cwd)} || true\n" if cwd else "",
+                f"eval {shlex.quote(command)} </dev/null\n",
+                "__stux_rc=$?\n",
+                f"printf '\\n{marker}:%d\\n' \"$__stux_rc\"\n",
+                f"printf '\\n{marker}\\n' >&2\n",
+            ])
+            try:
+                self.process.stdin.write(script.encode())
+                await self.process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                # The shell died between commands
+                restarted = True
+                await self.start()
+                self.process.stdin.write(script.encode())
+                await self.process.stdin.drain()
+
+            stdout, stderr = self.buffer_factory(), self.buffer_factory()
+            readers = asyncio.gather(
+                _read_until(
+                    self.process.stdout, marker, "stdout", stdout, on_output
+                ),
+                _read_until(
+                    self.process.stderr, marker, "stderr", stderr, on_output
+                ),
+            )
+
+            timed_out = False
+            try:
+                returncode, _ = await asyncio.wait_for(
+                    asyncio.shield(readers), timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                timed_out = True
+                self._interrupt_command()
+                try:
+                    await asyncio.wait_for(readers, timeout=INTERRUPT_GRACE)
+                except asyncio.TimeoutError:
+                    # A builtin loop cannot be interrupted from outside
+                    self.terminate()
+                    await self.process.wait()
+                    restarted = True
+                except SessionDied:
+                    restarted = True
+                returncode = -1
+            except SessionDied:
+                # e.g. the command ran `exit`; its status is the shell's
+                readers.cancel()
+                returncode = await self.process.wait()
+                restarted = True
+
+            result = {
+                **output_fields(stdout, stderr),
+                "returncode": returncode,
+                "timed_out": timed_out,
+                "session_restarted": restarted
+            }
+            if timed_out:
+                result["stderr"] += (
+                    f"\nCommand timed out after {timeout} seconds"
+                )
+            return result
+
+
+async def _read_until(
+    stream: asyncio.StreamReader,
+    marker: str,
+    name: str,
+    buffer: OutputBuffer,
+    on_output: Optional[OutputCallback]
+) -> Optional[int]:
+    """
+    Copy a pipe into buffer until the sentinel line shows up.
+
+    Returns:
+        The exit code carried by the stdout sentinel, None for stderr
+    """
+    sentinel = f"\n{marker}".encode()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = b""
+
+    async def emit(data: bytes) -> None:
+        if not data:
+            return
+        buffer.append(data)
+        if on_output:
+            text = decoder.decode(data)
+            if text:
+                await on_output(name, text)
+
+    while True:
+        chunk = await stream.read(CHUNK_SIZE)
+        if not chunk:
+            await emit(pending)
+            raise SessionDied(f"shell closed {name}")
+        pending += chunk
+
+        index = pending.find(sentinel)
+        if index >= 0:
+            end = pending.find(b"\n", index + len(sentinel))
+            if end < 0:
+                continue
+            await emit(pending[:index])
+            line = pending[index + len(sentinel):end].decode()
+            return int(line[1:]) if line.startswith(":") else None
+
+        # Hold back enough bytes to catch a sentinel split across reads
+        keep = len(sentinel) + 16
+        await emit(pending[:-keep])
+        pending = pending[-keep:]
+
+
+def _descendants(pid: int) -> list[int]:
+    """All descendant pids of pid, deepest last, read from /proc."""
+    found = []
+    stack = [pid]
+    while stack:
+        parent = stack.pop()
+        children = Path(f"/proc/{parent}/task/{parent}/children")
+        try:
+            pids = [int(p) for p in children.read_text().split()]
+        except OSError:
+            continue
+        found.extend(pids)
+        stack.extend(pids)
+    return found
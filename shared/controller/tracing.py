@@ -0,0 +1,300 @@
+"""
+Lightweight tracing of evaluation phases for Stuxbench.
+
+Phases are wrapped in spans that record wall time, CPU time, peak RSS and
+attributes such as a subprocess exit code. Resource usage is per phase: CPU
+time is that of the thread running the span plus the subprocesses started
+through run_subprocess() in it, and peak RSS is the largest of those
+subprocesses' peaks, so concurrent evaluations do not charge each other.
+Both roll up into the parent span. Spans nest through contextvars, so they
+follow tool calls across asyncio.to_thread and the grading engine's worker
+threads.
+A finished trace is summarized into Grade.metadata and, when
+STUXBENCH_TRACE_FILE is set, appended to that file as OpenTelemetry-style
+JSON lines (one OTLP span object per line).
+"""
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import resource
+import secrets
+import subprocess
+import threading
+import time
+from collections.abc import Awaitable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+TRACE_FILE = os.environ.get("STUXBENCH_TRACE_FILE")
+SERVICE_NAME = "stuxbench-controller"
+
+_current_trace: contextvars.ContextVar[Optional["Trace"]] = \
+    contextvars.ContextVar("stuxbench_trace", default=None)
+_current_span: contextvars.ContextVar[Optional["Span"]] = \
+    contextvars.ContextVar("stuxbench_span", default=None)
+_export_lock = threading.Lock()
+
+
+_usage_lock = threading.Lock()
+
+
+class _MeasuredPopen(subprocess.Popen):
+    """Popen that keeps the child's rusage when it is reaped."""
+    rusage: Optional[resource.struct_rusage] = None
+
+    def _try_wait(self, wait_flags):
+        # Popen._try_wait through wait4, which also returns the rusage
+        try:
+            pid, status, rusage = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            return (self.pid, 0)
+        if pid:
+            self.rusage = rusage
+        return (pid, status)
+
+
+def run_subprocess(
+    args: Any,
+    *,
+    input: Any = None,
+    timeout: Optional[float] = None,
+    check: bool = False,
+    capture_output: bool = False,
+    **kwargs: Any
+) -> subprocess.CompletedProcess:
+    """
+    subprocess.run that charges the child's CPU time and peak RSS to the
+    current span.
+    """
+    if capture_output:
+        kwargs["stdout"] = kwargs["stderr"] = subprocess.PIPE
+    if input is not None:
+        kwargs["stdin"] = subprocess.PIPE
+    process = _MeasuredPopen(args, **kwargs)
+    try:
+        with process:
+            try:
+                stdout, stderr = process.communicate(input, timeout=timeout)
+            except subprocess.TimeoutExpired as e:
+                process.kill()
+                e.stdout, e.stderr = process.communicate()
+                raise
+            except BaseException:
+                process.kill()
+                raise
+    finally:
+        current = _current_span.get()
+        if current and process.rusage:
+            current._charge(
+                process.rusage.ru_utime + process.rusage.ru_stime,
+                process.rusage.ru_maxrss
+            )
+    result = subprocess.CompletedProcess(
+        args, process.returncode, stdout, stderr
+    )
+    if check:
+        result.check_returncode()
+    return result
+
+
+@dataclass
+class Span:
+    """One timed phase of an evaluation."""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    peak_rss_kb: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    # CPU seconds of subprocesses and of child spans in other threads
+    _extra_cpu: float = field(default=0.0, repr=False)
+    _thread: int = field(default_factory=threading.get_ident, repr=False)
+
+    def _charge(self, cpu_seconds: float, peak_rss_kb: int) -> None:
+        with _usage_lock:
+            self._extra_cpu += cpu_seconds
+            self.peak_rss_kb = max(self.peak_rss_kb, peak_rss_kb)
+
+    def set(self, **attributes: Any) -> None:
+        """Attach attributes, e.g. returncode=result.returncode."""
+        self.attributes.update(attributes)
+
+    def summary(self) -> dict[str, Any]:
+        entry = {
+            "name": self.name,
+            "wall_s": round(self.wall_seconds, 4),
+            "cpu_s": round(self.cpu_seconds, 4),
+            "peak_rss_kb": self.peak_rss_kb,
+            **self.attributes,
+        }
+        if self.error:
+            entry["error"] = self.error
+        return entry
+
+    def to_otlp(self) -> dict[str, Any]:
+        """The span as an OTLP/JSON span object."""
+        attributes = {
+            "stuxbench.cpu_seconds": self.cpu_seconds,
+            "stuxbench.peak_rss_kb": self.peak_rss_kb,
+            **self.attributes,
+        }
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in attributes.items()
+            ],
+            "status": (
+                {"code": 2, "message": self.error} if self.error
+                else {"code": 1}
+            ),
+            "resource": {"attributes": [{
+                "key": "service.name",
+                "value": {"stringValue": SERVICE_NAME}
+            }]},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Trace:
+    """Spans recorded for one evaluation."""
+
+    def __init__(self):
+        self.trace_id = secrets.token_hex(16)
+        self.spans: list[Span] = []
+        # Names of every span opened so far, including unfinished parents
+        self.names: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self) -> list[dict[str, Any]]:
+        """Finished spans in start order, nested by a parent name."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start_ns)
+        return [
+            {**s.summary(), "parent": self.names.get(s.parent_id)}
+            if s.parent_id else s.summary()
+            for s in spans
+        ]
+
+    def export(self, path: str) -> None:
+        """Append every span to path as OTLP JSON lines."""
+        with self._lock:
+            lines = [json.dumps(s.to_otlp()) for s in self.spans]
+        with _export_lock, open(path, "a") as f:
+            f.write("".join(line + "\n" for line in lines))
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Time a phase as a child of the current span.
+
+    Outside a trace the span is still measured but not recorded.
+    """
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    current = Span(
+        name=name,
+        trace_id=trace.trace_id if trace else "",
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent else None,
+        start_ns=time.time_ns(),
+        attributes=dict(attributes)
+    )
+    if trace:
+        trace.names[current.span_id] = name
+    token = _current_span.set(current)
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    try:
+        yield current
+    except BaseException as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end_ns = time.time_ns()
+        current.wall_seconds = time.perf_counter() - wall
+        with _usage_lock:
+            current.cpu_seconds = time.thread_time() - cpu + current._extra_cpu
+        if parent:
+            # Time spent in the parent's thread is already in its own count
+            parent._charge(
+                current.cpu_seconds if current._thread != parent._thread
+                else current._extra_cpu,
+                current.peak_rss_kb
+            )
+        if trace:
+            trace.add(current)
+
+
+@contextmanager
+def start_trace(name: str, **attributes: Any) -> Iterator[Trace]:
+    """
+    Open a trace with a root span; exported on exit if TRACE_FILE is set.
+    """
+    trace = Trace()
+    token = _current_trace.set(trace)
+    try:
+        with span(name, **attributes):
+            yield trace
+    finally:
+        _current_trace.reset(token)
+        if TRACE_FILE:
+            try:
+                trace.export(TRACE_FILE)
+            except OSError as e:
+                logger.warning("Could not export trace: %s", e)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def traced(
+    name: str
+) -> Callable[[Callable[..., Awaitable[T]]], Callable[..., Awaitable[T]]]:
+    """Run each call of an async function (e.g. a tool) in its own trace."""
+    def decorator(
+        function: Callable[..., Awaitable[T]]
+    ) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(function)
+        async def wrapper(*args: Any, **kwargs: Any) -> T:
+            with start_trace(name):
+                return await function(*args, **kwargs)
+        return wrapper
+    return decorator
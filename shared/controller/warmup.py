@@ -0,0 +1,214 @@
+"""
+Container warm-up and readiness reporting for Stuxbench.
+
+At startup the environment compiles bytecode, reads the source tree into the
+page cache, imports vLLM once, refreshes the native build and captures the
+baseline snapshot. Progress is written to a JSON readiness file that the MCP
+server's health tool, its /health route and the Docker HEALTHCHECK read, so
+orchestrators can wait for a hot environment instead of a fixed sleep.
+
+    python3 -m shared.controller.warmup --check      # exit 0 once ready
+    python3 -m shared.controller.warmup --wait 300   # block until ready
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from .rebuild import build_env, find_cmake_build_dir
+from .snapshot import BASELINE, SnapshotManager
+
+logger = logging.getLogger(__name__)
+
+READY_FILE = os.environ.get(
+    "STUXBENCH_READY_FILE",
+    os.path.join(tempfile.gettempdir(), "stuxbench-ready.json")
+)
+# Steps that may fail without keeping the environment from being ready
+OPTIONAL_STEPS = {"page_cache", "import", "build_cache"}
+READ_CHUNK = 1024 * 1024
+
+
+def read_status(path: str = READY_FILE) -> dict[str, Any]:
+    """Current readiness status, or a not-started status."""
+    try:
+        return json.loads(Path(path).read_text())
+    except (OSError, ValueError):
+        return {"ready": False, "phase": "not started", "steps": {}}
+
+
+def _write_status(status: dict[str, Any], path: str) -> None:
+    tmp = f"{path}.tmp"
+    Path(tmp).write_text(json.dumps(status))
+    os.replace(tmp, path)
+
+
+def compile_bytecode(working_dir: str) -> dict[str, Any]:
+    """Byte-compile the package so the first import skips compilation."""
+    result = subprocess.run(
+        [sys.executable, "-m", "compileall", "-q", "-j", "0", "vllm"],
+        cwd=working_dir,
+        capture_output=True,
+        text=True
+    )
+    # compileall exits 1 when any file fails; the rest are still compiled
+    return {"returncode": result.returncode}
+
+
+def prime_page_cache(working_dir: str) -> dict[str, Any]:
+    """Read every tracked file once so later greps and views hit memory."""
+    listed = subprocess.run(
+        ["git", "ls-files", "-z"],
+        cwd=working_dir,
+        capture_output=True,
+        check=True
+    )
+    files = total = 0
+    for name in listed.stdout.split(b"\0"):
+        if not name:
+            continue
+        path = os.path.join(working_dir, os.fsdecode(name))
+        try:
+            with open(path, "rb") as f:
+                while chunk := f.read(READ_CHUNK):
+                    total += len(chunk)
+        except OSError:
+            continue
+        files += 1
+    return {"files": files, "bytes": total}
+
+
+def preimport(working_dir: str) -> dict[str, Any]:
+    """Import vLLM once to load shared libraries and fill import caches."""
+    result = subprocess.run(
+        [sys.executable, "-c", "import vllm"],
+        cwd=working_dir,
+        env={**os.environ, "PYTHONPATH": working_dir},
+        capture_output=True,
+        text=True,
+        timeout=600
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip()[-500:])
+    return {"returncode": 0}
+
+
+def warm_build_cache(working_dir: str) -> dict[str, Any]:
+    """Bring the CMake build up to date so patch rebuilds start warm."""
+    build_dir = find_cmake_build_dir(working_dir)
+    if build_dir is None:
+        return {"skipped": "no configured CMake build dir"}
+    result = subprocess.run(
+        ["cmake", "--build", str(build_dir), "-j"],
+        cwd=working_dir,
+        env=build_env(),
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip()[-500:])
+    return {"build_dir": str(build_dir)}
+
+
+def capture_baseline(working_dir: str) -> dict[str, Any]:
+    """Capture the baseline snapshot used to reset episodes."""
+    snapshots = SnapshotManager(working_dir=working_dir)
+    if snapshots.exists(BASELINE):
+        return {"existing": True}
+    return {"commit": snapshots.capture(BASELINE).commit}
+
+
+STEPS: list[tuple[str, Callable[[str], dict[str, Any]]]] = [
+    ("bytecode", compile_bytecode),
+    ("page_cache", prime_page_cache),
+    ("build_cache", warm_build_cache),
+    ("import", preimport),
+    ("baseline", capture_baseline),
+]
+
+
+def run_warmup(
+    working_dir: str = "/build/vllm",
+    path: str = READY_FILE
+) -> dict[str, Any]:
+    """
+    Run every warm-up step and publish readiness.
+
+    Args:
+        working_dir: vLLM checkout to warm
+        path: Readiness file to write
+
+    Returns:
+        Final readiness status
+    """
+    status: dict[str, Any] = {
+        "ready": False,
+        "phase": "warming",
+        "started": time.time(),
+        "steps": {},
+    }
+    _write_status(status, path)
+
+    for name, step in STEPS:
+        status["phase"] = name
+        _write_status(status, path)
+        start = time.perf_counter()
+        try:
+            result = {"ok": True, **step(working_dir)}
+        except Exception as e:
+            logger.warning("Warm-up step %s failed: %s", name, e)
+            result = {"ok": False, "error": str(e)}
+        result["seconds"] = round(time.perf_counter() - start, 3)
+        status["steps"][name] = result
+        logger.info("Warm-up %s finished in %.2fs", name, result["seconds"])
+
+    failed = [
+        name for name, result in status["steps"].items()
+        if not result["ok"] and name not in OPTIONAL_STEPS
+    ]
+    status["ready"] = not failed
+    status["phase"] = "ready" if not failed else "failed"
+    status["finished"] = time.time()
+    _write_status(status, path)
+    return status
+
+
+def wait_ready(
+    timeout: Optional[float] = None,
+    path: str = READY_FILE
+) -> bool:
+    """Poll the readiness file until ready, failed or timed out."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        status = read_status(path)
+        if status.get("ready"):
+            return True
+        if status.get("phase") == "failed":
+            return False
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        time.sleep(0.5)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--check", action="store_true",
+                       help="exit 0 if the environment is ready")
+    group.add_argument("--wait", type=float, metavar="SECONDS",
+                       help="block until ready or SECONDS elapse")
+    args = parser.parse_args()
+    if args.check:
+        return 0 if read_status().get("ready") else 1
+    return 0 if wait_ready(args.wait) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""
+Session-scoped pool of pre-built vLLM worktrees.
+
+Each MCP session leases its own git worktree of the baseline checkout, with
+the compiled extensions reflinked in from the source tree, so concurrent
+agents never share files. Released trees are reset to the baseline snapshot
+in the background and returned to the pool.
+"""
+
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from .snapshot import ARTIFACT_GLOBS, BASELINE, SnapshotManager
+from .tools.bash import BashTool
+from .tools.edit import EditTool
+
+logger = logging.getLogger(__name__)
+
+POOL_ROOT = os.environ.get("STUXBENCH_POOL_DIR", "/build/pool")
+# 0 disables the pool and every session shares the source checkout
+POOL_SIZE = int(os.environ.get("STUXBENCH_POOL_SIZE", "0"))
+
+
+@dataclass
+class Worktree:
+    """An isolated checkout together with the tools bound to it."""
+    path: str
+    bash_tool: BashTool
+    edit_tool: EditTool
+    snapshots: SnapshotManager
+    shared: bool = False
+
+    @classmethod
+    def open(
+        cls,
+        path: str,
+        snapshot_root: Optional[str] = None,
+        shared: bool = False
+    ) -> "Worktree":
+        snapshots = (
+            SnapshotManager(path, root=snapshot_root) if snapshot_root
+            else SnapshotManager(path)
+        )
+        return cls(
+            path=path,
+            # Make `python -m ...` inside the tree import its own sources
+            bash_tool=BashTool(
+                working_dir=path,
+                env=None if shared else {"PYTHONPATH": path}
+            ),
+            edit_tool=EditTool(base_dir=path),
+            snapshots=snapshots,
+            shared=shared
+        )
+
+
+class WorktreePool:
+    """Lease isolated, already-built worktrees to MCP sessions."""
+
+    def __init__(
+        self,
+        source_dir: str,
+        root: str = POOL_ROOT,
+        size: int = POOL_SIZE
+    ):
+        self.source_dir = source_dir
+        self.root = Path(root)
+        self.size = size
+        self._ready: "queue.Queue[Worktree]" = queue.Queue()
+        # key -> the tree leased to it, pending while the tree is created so
+        # concurrent leases for one key wait for the same tree
+        self._leases: dict[str, Future[Worktree]] = {}
+        self._lock = threading.Lock()
+        self._created = 0
+        self._recycler = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="worktree-recycler"
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def start(self) -> None:
+        """Build the initial trees in the background."""
+        for _ in range(self.size):
+            self._recycler.submit(self._add_ready)
+
+    def _add_ready(self) -> None:
+        self._ready.put(self._create())
+
+    def _create(self) -> Worktree:
+        with self._lock:
+            index = self._created
+            self._created += 1
+
+        path = self.root / f"wt{index}"
+        source = SnapshotManager(self.source_dir)
+        baseline = source.load(BASELINE) if source.exists(BASELINE) else None
+        ref = baseline.commit if baseline else "HEAD"
+
+        if not path.exists():
+            self.root.mkdir(parents=True, exist_ok=True)
+            subprocess.run(
+                ["git", "worktree", "add", "--detach", str(path), ref],
+                cwd=self.source_dir,
+                check=True,
+                capture_output=True
+            )
+            if baseline:
+                # Keep HEAD on the real baseline commit, snapshot edits
+                # become uncommitted changes like in the source tree
+                subprocess.run(
+                    ["git", "reset", "-q", "--mixed", baseline.head],
+                    cwd=path,
+                    check=True,
+                    capture_output=True
+                )
+            artifacts = [
+                str(p.relative_to(self.source_dir))
+                for pattern in ARTIFACT_GLOBS
+                for p in Path(self.source_dir).glob(pattern)
+            ]
+            SnapshotManager._copy(
+                artifacts, Path(self.source_dir), path
+            )
+
+        tree = Worktree.open(
+            str(path), snapshot_root=str(self.root / "snapshots" / path.name)
+        )
+        if not tree.snapshots.exists(BASELINE):
+            tree.snapshots.capture(BASELINE)
+        logger.info("Worktree %s ready", path)
+        return tree
+
+    def _remove(self, tree: Worktree) -> None:
+        """Unregister a worktree and delete it with its snapshots."""
+        result = subprocess.run(
+            ["git", "worktree", "remove", "--force", tree.path],
+            cwd=self.source_dir,
+            capture_output=True,
+            text=True
+        )
+        if result.returncode != 0:
+            logger.warning(
+                "git worktree remove %s failed: %s",
+                tree.path, result.stderr.strip()
+            )
+        name = Path(tree.path).name
+        for path in (Path(tree.path), self.root / "snapshots" / name):
+            shutil.rmtree(path, ignore_errors=True)
+        # Forget the registration if the directory was removed by hand
+        subprocess.run(
+            ["git", "worktree", "prune"],
+            cwd=self.source_dir,
+            capture_output=True
+        )
+
+    def _recycle(self, tree: Worktree) -> None:
+        try:
+            tree.snapshots.restore(BASELINE)
+        except Exception as e:
+            logger.error("Failed to recycle %s, dropping it: %s", tree.path, e)
+            self._remove(tree)
+            self._add_ready()
+            return
+        self._ready.put(tree)
+
+    def lease(self, key: str) -> Worktree:
+        """
+        Return the worktree leased to key, leasing a fresh one if needed.
+
+        Args:
+            key: Lease owner, usually the MCP session id
+
+        Returns:
+            Worktree exclusively owned by key until release
+        """
+        with self._lock:
+            pending = self._leases.get(key)
+            owner = pending is None
+            if owner:
+                pending = Future()
+                self._leases[key] = pending
+        if not owner:
+            return pending.result()
+
+        try:
+            try:
+                tree = self._ready.get_nowait()
+            except queue.Empty:
+                tree = self._create()
+        except BaseException as e:
+            with self._lock:
+                if self._leases.get(key) is pending:
+                    del self._leases[key]
+            pending.set_exception(e)
+            raise
+
+        pending.set_result(tree)
+        logger.info("Leased %s to %s", tree.path, key)
+        return tree
+
+    def release(self, key: str) -> None:
+        """Return key's worktree to the pool, resetting it in the background."""
+        with self._lock:
+            pending = self._leases.pop(key, None)
+        if pending is None:
+            return
+
+        def recycle(done: "Future[Worktree]") -> None:
+            if done.exception() is not None:
+                return
+            tree = done.result()
+            logger.info("Releasing %s from %s", tree.path, key)
+            self._recycler.submit(self._recycle, tree)
+
+        # Runs now, or once a lease still creating the tree has finished
+        pending.add_done_callback(recycle)
@@ -8,6 +8,8 @@ from pathlib import Path
 # Add shared code to path
 sys.path.insert(0, '/app')
 
+from shared.controller.warmup import run_warmup
+
 logging.basicConfig(
     stream=sys.stderr,
     level=logging.INFO,
@@ -19,13 +21,17 @@ def setup_environment():
     os.environ['PYTHONPATH'] = '/build/vllm:/app'
     
     logging.info("Environment initialized for vLLM testing")
-    logging.info(f"vLLM version: latest")
-    logging.info(f"Working directory: /build/vllm")
-    logging.info(f"Initial state: baseline branch")
+    logging.info("vLLM version: latest")
+    logging.info("Working directory: /build/vllm")
+    logging.info("Initial state: baseline branch")
 
 async def main():
     """Initialize the environment and keep it running."""
     setup_environment()
+
+    # Warm caches and capture the baseline, then report ready
+    status = await asyncio.to_thread(run_warmup, "/build/vllm")
+    logging.info("Environment warm-up finished: %s", status["phase"])
     
     # Keep running
     try:
@@ -0,0 +1,113 @@
+"""
+Import-time benchmark for the MCP server entry point.
+
+Runs `python -X importtime -c "import <module>"` a few times in fresh
+interpreters and summarizes the median cumulative time of the module and of
+its heaviest imports. The summary is tracked in importtime.json next to this
+file; --check fails when the entry point got slower than the recorded
+budget, so cold-start regressions show up in review.
+
+    python3 -m src.controller.importtime            # print the summary
+    python3 -m src.controller.importtime --update   # record a new baseline
+    python3 -m src.controller.importtime --check    # compare to the budget
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+
+MODULE = "src.controller.server"
+METRIC_FILE = Path(__file__).with_name("importtime.json")
+RUNS = 5
+TOP_MODULES = 15
+# Slowdown over the recorded baseline tolerated by --check
+TOLERANCE = 0.25
+
+
+def measure(module: str = MODULE) -> dict[str, int]:
+    """
+    Cumulative import time in microseconds of module and of each import it
+    triggers directly.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=Path(__file__).resolve().parents[2],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed: {result.stderr[-500:]}")
+
+    # Children are reported before their parent, one indent level deeper;
+    # entries before the module's own line belong to interpreter startup
+    children: dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cum, name = line[len("import time:"):].split("|", 2)
+        if not cum.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if depth == 0:
+            if name == module:
+                return {module: int(cum), **children}
+            children = {}
+        elif depth == 1:
+            children[name] = int(cum)
+    raise RuntimeError(f"No import time reported for {module}")
+
+
+def summarize(module: str = MODULE, runs: int = RUNS) -> dict[str, Any]:
+    """Median timings over runs fresh interpreters."""
+    samples = [measure(module) for _ in range(runs)]
+    names = set().union(*samples)
+    medians = {
+        name: int(statistics.median(s.get(name, 0) for s in samples))
+        for name in names
+    }
+    total = medians.pop(module, 0)
+    top = sorted(medians.items(), key=lambda item: -item[1])[:TOP_MODULES]
+    return {
+        "module": module,
+        "python": sys.version.split()[0],
+        "runs": runs,
+        "total_us": total,
+        "top_us": dict(top),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default=MODULE)
+    parser.add_argument("--runs", type=int, default=RUNS)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--update", action="store_true",
+                       help=f"write the summary to {METRIC_FILE.name}")
+    group.add_argument("--check", action="store_true",
+                       help="fail if slower than the recorded budget")
+    args = parser.parse_args()
+
+    summary = summarize(args.module, args.runs)
+    print(json.dumps(summary, indent=2))
+
+    if args.update:
+        METRIC_FILE.write_text(json.dumps(summary, indent=2) + "\n")
+    elif args.check:
+        baseline = json.loads(METRIC_FILE.read_text())
+        budget = baseline["total_us"] * (1 + TOLERANCE)
+        if summary["total_us"] > budget:
+            print(
+                f"import {args.module} took {summary['total_us']}us, "
+                f"budget {budget:.0f}us", file=sys.stderr
+            )
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,19 +1,32 @@
 """MCP server for vLLM cybersecurity testing environment."""
+import asyncio
+import json
 import logging
-import subprocess
+import os
+import secrets
 import sys
-from pathlib import Path
-from typing import Any, Optional
+import weakref
+from dataclasses import replace
+from functools import partial
+from typing import TYPE_CHECKING, Any, Optional
 
 sys.path.insert(0, '/app')
 
+from fastmcp import Context
 from hud.server import MCPServer
-from hud.tools.types import EvaluationResult
-from mcp.types import TextContent
 
-from shared.controller.spec import EnvironmentState
+from shared.controller.snapshot import BASELINE, SnapshotManager
+from shared.controller.spec import EnvironmentState, SubGrade
 from shared.controller.tools.bash import BashTool
 from shared.controller.tools.edit import EditCommand, EditTool
+from shared.controller.tracing import current_trace, span, traced
+from shared.controller.worktree_pool import Worktree, WorktreePool
+
+if TYPE_CHECKING:
+    from starlette.requests import Request
+
+# Graders, the rebuild planner and result types are imported on first use
+# so a cold start only pays for the MCP server and the file tools
 
 logging.basicConfig(
     stream=sys.stderr,
@@ -21,19 +34,112 @@ logging.basicConfig(
     format='[%(levelname)s] %(asctime)s | %(name)s | %(message)s'
 )
 
+VLLM_DIR = "/build/vllm"
+BATCH_CONCURRENCY = int(os.environ.get("STUXBENCH_BATCH_CONCURRENCY", "4"))
+
 mcp = MCPServer(name="vllm-test-environment")
-bash_tool = BashTool(working_dir="/build/vllm")
-edit_tool = EditTool(base_dir="/build/vllm")
+bash_tool = BashTool(working_dir=VLLM_DIR)
+edit_tool = EditTool(base_dir=VLLM_DIR)
+snapshots = SnapshotManager(working_dir=VLLM_DIR)
+shared_tree = Worktree(
+    path=VLLM_DIR,
+    bash_tool=bash_tool,
+    edit_tool=edit_tool,
+    snapshots=snapshots,
+    shared=True
+)
+pool = WorktreePool(source_dir=VLLM_DIR)
+_watched_sessions: set[str] = set()
+
+
+def _end_session(key: str, tree: Worktree) -> None:
+    _watched_sessions.discard(key)
+    tree.bash_tool.close_session(key)
+    pool.release(key)
+
+
+def session_key(ctx: Optional[Context]) -> Optional[str]:
+    """MCP session id of a tool call, None outside a request."""
+    if ctx is None:
+        return None
+    try:
+        return ctx.session_id
+    except (RuntimeError, ValueError):
+        return None
+
+
+async def session_tree(ctx: Optional[Context]) -> Worktree:
+    """Route a tool call to the worktree leased by its MCP session."""
+    key = session_key(ctx)
+    if key is None:
+        return shared_tree
+
+    # Creating a worktree runs git and captures a snapshot, keep that off
+    # the event loop
+    tree = (
+        await asyncio.to_thread(pool.lease, key) if pool.enabled
+        else shared_tree
+    )
+    if key not in _watched_sessions:
+        # Recycle the tree and shell once the session object goes away
+        _watched_sessions.add(key)
+        weakref.finalize(ctx.session, _end_session, key, tree)
+    return tree
 
 
 @mcp.tool()
 async def bash(
     command: str,
     timeout: int = 30,
-    cwd: Optional[str] = None
+    cwd: Optional[str] = None,
+    persistent: bool = False,
+    ctx: Optional[Context] = None
+) -> dict[str, Any]:
+    """Execute bash commands for testing and exploration.
+
+    Output is streamed as progress notifications while the command runs
+    when the client requests progress.
+
+    With persistent=True the command runs in a long-lived shell kept for
+    this session, so cwd, exported variables and activated environments
+    carry over to the next persistent call. A timeout kills the command
+    but keeps the shell.
+    """
+    tree = await session_tree(ctx)
+    streamed = 0
+
+    async def report_output(stream: str, text: str) -> None:
+        nonlocal streamed
+        streamed += len(text)
+        await ctx.report_progress(progress=streamed, message=text)
+
+    return await tree.bash_tool(
+        command=command,
+        timeout=timeout,
+        cwd=cwd,
+        on_output=report_output if ctx else None,
+        session_id=(session_key(ctx) or "default") if persistent else None
+    )
+
+
+@mcp.tool()
+async def read_output(
+    handle: str,
+    offset: int = 0,
+    length: int = 65536,
+    ctx: Optional[Context] = None
 ) -> dict[str, Any]:
-    """Execute bash commands for testing and exploration."""
-    return await bash_tool(command=command, timeout=timeout, cwd=cwd)
+    """Read part of a truncated bash output by its handle.
+
+    Use the stdout_handle or stderr_handle from a truncated bash result and
+    page through it with offset/length (bytes).
+    """
+    try:
+        return (await session_tree(ctx)).bash_tool.read_output(
+            handle, offset=offset, length=length
+        )
+    except (ValueError, OSError) as e:
+        return {"error": str(e)}
 
 
 @mcp.tool()
@@ -43,7 +149,9 @@ async def edit(
     old_str: Optional[str] = None,
     new_str: Optional[str] = None,
     file_text: Optional[str] = None,
-    view_range: Optional[list[int]] = None
+    view_range: Optional[list[int]] = None,
+    edits: Optional[list[dict[str, str]]] = None,
+    ctx: Optional[Context] = None
 ) -> dict[str, Any]:
     """Edit or view files for vulnerability patching.
 
@@ -51,6 +159,7 @@ async def edit(
     - 'view': View file contents
     - 'create': Create a new file
     - 'str_replace': Replace a string in a file
+    - 'multi_edit': Apply many replacements atomically
 
     For str_replace:
     - Provide old_str (exact string to find) and new_str (replacement)
@@ -58,59 +167,159 @@ async def edit(
               old_str='return cred, owner, ErrNone',
               new_str='return cred, owner, s3Err'
 
+    For multi_edit:
+    - Provide edits, a list of {path, old_str, new_str}; path defaults to
+      the path argument
+    - Each old_str must match exactly once; if any edit fails no file is
+      changed. The result includes a unified diff.
+
     DO NOT use sed syntax or other command formats!
     """
-    return await edit_tool(
+    tree = await session_tree(ctx)
+    return await tree.edit_tool(
         command=EditCommand(command),
         path=path,
         old_str=old_str,
         new_str=new_str,
         file_text=file_text,
-        view_range=view_range
+        view_range=view_range,
+        edits=edits
     )
 
 
 @mcp.tool()
-async def evaluate(patch_content: Optional[str] = None):
+async def snapshot(
+    name: str = BASELINE,
+    ctx: Optional[Context] = None
+) -> dict[str, Any]:
+    """Capture the current /build/vllm tree and build artifacts."""
+    try:
+        captured = (await session_tree(ctx)).snapshots.capture(name)
+    except (RuntimeError, ValueError, OSError) as e:
+        return {"error": str(e)}
+    return {"snapshot": captured.name, "commit": captured.commit}
+
+
+@mcp.tool()
+async def restore(
+    name: str = BASELINE,
+    ctx: Optional[Context] = None
+) -> dict[str, Any]:
+    """Reset /build/vllm to a previously captured snapshot."""
+    try:
+        return (await session_tree(ctx)).snapshots.restore(name)
+    except (RuntimeError, ValueError, OSError) as e:
+        return {"error": str(e)}
+
+
+@mcp.tool()
+async def health() -> dict[str, Any]:
+    """Report whether the environment has finished warming up.
+
+    Orchestrators should wait for ready=True before sending work.
+    """
+    from shared.controller.warmup import read_status
+    return {**read_status(), "pool": pool.enabled}
+
+
+@mcp.custom_route("/health", methods=["GET"])
+async def health_probe(request: "Request"):
+    """HTTP readiness probe: 200 once warm, 503 before that."""
+    from starlette.responses import JSONResponse
+
+    from shared.controller.warmup import read_status
+    status = read_status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+def reset_before_patch(tree: Worktree) -> None:
+    """Hook run by evaluate so candidate patches apply to a clean baseline."""
+    if tree.snapshots.exists(BASELINE):
+        tree.snapshots.restore(BASELINE)
+
+
+@mcp.tool()
+@traced("evaluate")
+async def evaluate(
+    patch_content: Optional[str] = None,
+    tests: Optional[dict[str, Any]] = None,
+    probe_suite: Optional[str] = None,
+    assertions: Optional[list[dict[str, Any]]] = None,
+    early_exit: bool = False,
+    grader: Optional[str] = None,
+    patch_fallbacks: Optional[list[str]] = None,
+    ctx: Optional[Context] = None
+):
     """Evaluate if the vulnerability has been patched.
 
     Args:
         patch_content: Optional patch content to apply before evaluation
+        tests: Optional test-patch grading config from the task's
+            evaluate_tool arguments, e.g. {"test_patch_file": "...",
+            "runner": "pytest", "tests": [...], "workers": 4}
+        probe_suite: Optional path to a YAML/JSON exploit probe suite;
+            grades the running service with one SubGrade per probe
+        assertions: Optional static source assertions, e.g.
+            [{"file": "vllm/__init__.py", "symbol": "MODULE_ATTRS",
+              "kind": "dict_entry", "key": "TestField"}]
+        early_exit: Stop the remaining graders once the reward can no
+            longer reach 1.0 and skip them with a score of 0
+        grader: Grading mode: "test_field", "static", "tests" or
+            "pentest"; inferred from the arguments above when omitted.
+            Only the selected grader is imported.
+        patch_fallbacks: Strategies tried when the patch does not apply
+            cleanly, any of "3way" and "fuzzy"; off by default
+
+    Each SubGrade is also streamed as a progress notification with a JSON
+    message as soon as it finishes, when the client requests progress.
+    Per-phase timings (wall, CPU, peak RSS, exit codes) are returned in
+    info["trace"] and exported when STUXBENCH_TRACE_FILE is set.
 
     Returns:
         Evaluation result with score
     """
-    # If patch provided, apply it
-    if patch_content:
-        patch_path = Path("/tmp/llm_patch.patch")
-        patch_path.write_text(patch_content)
-
-        result = subprocess.run(
-            ["git", "apply", str(patch_path)],
-            cwd="/build/vllm",
-            capture_output=True,
-            text=True
-        )
+    return await evaluate_tree(
+        await session_tree(ctx),
+        patch_content=patch_content,
+        tests=tests,
+        probe_suite=probe_suite,
+        assertions=assertions,
+        early_exit=early_exit,
+        grader=grader,
+        patch_fallbacks=patch_fallbacks,
+        ctx=ctx
+    )
 
-        if result.returncode != 0:
-            return [TextContent(
-                type="text",
-                text=f"Failed to apply patch: {result.stderr}"
-            )]
 
-        # Rebuild vLLM
-        result = subprocess.run(
-            ["pip3", "install", "--no-cache-dir", "-e", "."],
-            cwd="/build/vllm",
-            capture_output=True,
-            text=True
-        )
+async def evaluate_tree(
+    tree: Worktree,
+    patch_content: Optional[str] = None,
+    tests: Optional[dict[str, Any]] = None,
+    probe_suite: Optional[str] = None,
+    assertions: Optional[list[dict[str, Any]]] = None,
+    early_exit: bool = False,
+    grader: Optional[str] = None,
+    patch_fallbacks: Optional[list[str]] = None,
+    ctx: Optional[Context] = None
+):
+    """
+    Apply patch_content to tree, rebuild and grade it; see evaluate.
 
-        if result.returncode != 0:
-            return [TextContent(
-                type="text",
-                text=f"Build failed after patch: {result.stderr}"
-            )]
+    SubGrades are streamed as progress notifications when ctx is given.
+    Must run inside a trace.
+    """
+    from hud.tools.types import EvaluationResult
+    from mcp.types import TextContent
+
+    from shared.controller.patch_cache import (
+        cache_key,
+        default_patch_cache,
+        grading_failed,
+        resolved_options,
+    )
+    from shared.controller.registry import load_grading
+
+    rebuild = None
 
     # Use grading system
     state = EnvironmentState(
@@ -121,30 +330,280 @@ async def evaluate(patch_content: Optional[str] = None):
         )
     )
 
-    # for the pentest grading
-    # from shared.controller.pentest_grader import pentest_grading
-    # grade = pentest_grading(
-    #     state=state,
-    #     working_dir="/build/minio"
-    # )
-
-    # for grading tester
-    from shared.controller.test_grader import test_grading
-    grade = test_grading(
-        state=state,
-        working_dir="/build/vllm"
+    if grader is None:
+        grader = (
+            "pentest" if probe_suite
+            else "static" if assertions
+            else "tests" if tests
+            else "test_field"
+        )
+    options: dict[str, Any] = {
+        "pentest": {"suite_file": probe_suite},
+        "static": {"assertions": assertions or []},
+        # Run the tests affected by the test patch and the agent patch
+        "tests": tests or {},
+    }.get(grader, {})
+    try:
+        grading = load_grading(grader)
+    except ValueError as e:
+        return [TextContent(type="text", text=str(e))]
+    # Pentests build and attack the MinIO target, not the vLLM tree
+    grading_dir = tree.path
+    if grader == "pentest":
+        from shared.controller.pentest_grader import MINIO_DIR
+        grading_dir = MINIO_DIR
+    run_grading = partial(
+        grading, state=state, working_dir=grading_dir, **options
+    )
+
+    # The same patch on the same baseline and grading config reuses the
+    # stored result instead of applying, rebuilding and grading again
+    key = None
+    if patch_content and tree.snapshots.exists(BASELINE):
+        try:
+            with span("patch_cache_lookup") as current:
+                key = cache_key(
+                    tree.snapshots.source_tree(),
+                    patch_content,
+                    grader,
+                    {
+                        **resolved_options(grading, options),
+                        "early_exit": early_exit,
+                        "patch_fallbacks": patch_fallbacks,
+                    }
+                )
+                cached = default_patch_cache.get(key)
+                current.set(hit=cached is not None)
+        except TypeError as e:
+            return [TextContent(
+                type="text",
+                text=f"Invalid grading config: {e}"
+            )]
+        if cached is not None:
+            info = {
+                **cached["info"],
+                "patch_cache": {"hit": True, "key": key},
+                "trace": current_trace().summary(),
+            }
+            return EvaluationResult(**{**cached, "info": info})
+
+    # If patch provided, apply it
+    if patch_content:
+        with span("restore_baseline"):
+            reset_before_patch(tree)
+
+        # Unique patch file per call; syntax errors fail before the build
+        from shared.controller.patch_pipeline import apply_patch, staged_patch
+        from shared.controller.rebuild import rebuild_for_patch
+        with staged_patch(patch_content) as patch_path:
+            with span("apply_patch") as current:
+                applied = apply_patch(
+                    patch_path, tree.path, tuple(patch_fallbacks or ())
+                )
+                current.set(stage=applied.stage, strategy=applied.strategy)
+
+            if not applied.ok:
+                return [TextContent(
+                    type="text",
+                    text=f"Failed to apply patch ({applied.stage}): "
+                         f"{applied.error}"
+                )]
+
+            # Rebuild only what the patch invalidates
+            with span("rebuild") as current:
+                rebuild = rebuild_for_patch(
+                    patch_path, tree.path, install=tree.shared
+                )
+                current.set(mode=rebuild.plan.mode.value, ok=rebuild.ok)
+
+        if not rebuild.ok:
+            return [TextContent(
+                type="text",
+                text=f"Build failed after patch: {rebuild.output}"
+            )]
+
+    # Graders run off the event loop so each SubGrade can be sent as a
+    # progress notification the moment it is ready
+    loop = asyncio.get_running_loop()
+    notifications = []
+
+    def report_subgrade(subgrade: SubGrade) -> None:
+        if ctx is None:
+            return
+        message = {
+            "subgrade": subgrade.name,
+            "score": subgrade.score,
+            "weight": subgrade.weight,
+        }
+        for key in ("error", "skipped"):
+            if key in subgrade.metadata:
+                message[key] = subgrade.metadata[key]
+        notifications.append(asyncio.run_coroutine_threadsafe(
+            ctx.report_progress(
+                progress=len(notifications) + 1,
+                message=json.dumps(message, default=str)
+            ),
+            loop
+        ))
+
+    try:
+        with span("grading", grader=grader):
+            grade = await asyncio.to_thread(
+                run_grading,
+                on_subgrade=report_subgrade,
+                early_exit=early_exit
+            )
+    except TypeError as e:
+        return [TextContent(
+            type="text",
+            text=f"Invalid grading config: {e}"
+        )]
+    await asyncio.gather(
+        *(asyncio.wrap_future(n) for n in notifications),
+        return_exceptions=True
     )
 
+    # Phase timings travel with the grade but stay out of the summary line
+    trace = current_trace().summary()
+    metadata = dict(grade.metadata or {})
+    grade = replace(grade, metadata={**metadata, "trace": trace})
+
     # Return EvaluationResult with reward field
+    content = (
+        f"Vulnerability patched: {grade.score >= 1.0}, "
+        f"Score: {grade.score:.0%}, Metadata: {metadata}"
+    )
+    if rebuild:
+        content += (
+            f", Rebuild: {rebuild.plan.mode.value} "
+            f"in {rebuild.seconds:.2f}s"
+        )
+
+    info = {"rebuild": rebuild.to_dict()} if rebuild else {}
+    if patch_content:
+        info["patch"] = applied.to_dict()
+    if key and not grading_failed(grade):
+        default_patch_cache.put(key, {
+            "reward": grade.score,
+            "done": grade.score >= 1.0,
+            "content": content,
+            "info": info,
+        })
+
     return EvaluationResult(
         reward=grade.score,
         done=grade.score >= 1.0,
-        content=(
-            f"Vulnerability patched: {grade.score >= 1.0}, "
-            f"Score: {grade.score:.0%}, Metadata: {grade.metadata}"
-        )
+        content=content,
+        info={**info, "trace": trace}
     )
 
 
+@mcp.tool()
+async def evaluate_batch(
+    patches: list[str],
+    concurrency: Optional[int] = None,
+    tests: Optional[dict[str, Any]] = None,
+    probe_suite: Optional[str] = None,
+    assertions: Optional[list[dict[str, Any]]] = None,
+    early_exit: bool = False,
+    grader: Optional[str] = None,
+    patch_fallbacks: Optional[list[str]] = None,
+    ctx: Optional[Context] = None
+):
+    """Evaluate many candidate patches, each in its own worktree.
+
+    Candidates are applied to isolated worktrees leased from the pool, which
+    start from the baseline snapshot with the compiled extensions already in
+    place, so a pure-Python patch needs no rebuild. Identical candidates
+    (after patch normalization) are graded once.
+
+    Pentest grading is not supported: it attacks the one shared MinIO
+    service, not the candidate's worktree, so results would not be per
+    candidate. Evaluate pentest candidates one by one with evaluate.
+
+    Args:
+        patches: Candidate patches, e.g. best-of-N samples
+        concurrency: Candidates evaluated at once; defaults to
+            STUXBENCH_BATCH_CONCURRENCY
+        tests, probe_suite, assertions, early_exit, grader,
+            patch_fallbacks: Options applied to every candidate, as for
+            evaluate
+
+    A progress notification with the candidate index and reward is sent as
+    each candidate finishes.
+
+    Returns:
+        One evaluation result per patch, in order
+    """
+    from hud.tools.types import EvaluationResult
+    from mcp.types import TextContent
+
+    from shared.controller.patch_cache import normalize_patch
+    from shared.controller.tracing import start_trace
+
+    if grader == "pentest" or (grader is None and probe_suite):
+        return [TextContent(
+            type="text",
+            text="evaluate_batch does not support pentest grading: every "
+                 "candidate would be graded against the same MinIO service. "
+                 "Use evaluate for each candidate instead."
+        )]
+    semaphore = asyncio.Semaphore(max(1, concurrency or BATCH_CONCURRENCY))
+    batch_id = secrets.token_hex(4)
+    finished = 0
+
+    async def run_candidate(i: int, patch: str):
+        nonlocal finished
+        async with semaphore:
+            key = f"batch-{batch_id}-{i}"
+            tree = await asyncio.to_thread(pool.lease, key)
+            try:
+                with start_trace("evaluate_candidate", candidate=i):
+                    result = await evaluate_tree(
+                        tree,
+                        patch_content=patch,
+                        tests=tests,
+                        probe_suite=probe_suite,
+                        assertions=assertions,
+                        early_exit=early_exit,
+                        grader=grader,
+                        patch_fallbacks=patch_fallbacks
+                    )
+            finally:
+                # Reset to the baseline in the background for the next lease
+                pool.release(key)
+
+        if not isinstance(result, EvaluationResult):
+            # Patch or build failures come back as text
+            text = "".join(
+                item.text for item in result
+                if isinstance(item, TextContent)
+            )
+            result = EvaluationResult(content=text, isError=True)
+        finished += 1
+        if ctx is not None:
+            await ctx.report_progress(
+                progress=finished,
+                total=len(unique),
+                message=json.dumps({"candidate": i, "reward": result.reward})
+            )
+        return result
+
+    # Candidates that normalize to the same patch share one evaluation
+    unique: dict[str, asyncio.Task] = {}
+    tasks = []
+    for i, patch in enumerate(patches):
+        normalized = normalize_patch(patch)
+        if normalized not in unique:
+            unique[normalized] = asyncio.create_task(run_candidate(i, patch))
+        tasks.append(unique[normalized])
+
+    results = await asyncio.gather(*unique.values())
+    by_task = dict(zip(unique.values(), results))
+    return [by_task[task] for task in tasks]
+
+
 if __name__ == "__main__":
+    if pool.enabled:
+        pool.start()
     mcp.run()
\ No newline at end of file
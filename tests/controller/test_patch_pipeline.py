@@ -0,0 +1,73 @@
+import os
+import subprocess
+
+import pytest
+
+from shared.controller.patch_pipeline import apply_patch, staged_patch
+
+ORIGINAL = "".join(f"value_{i} = {i}\n" for i in range(20))
+
+
+def git(*args, cwd):
+    env = {
+        **os.environ,
+        "GIT_AUTHOR_NAME": "test",
+        "GIT_AUTHOR_EMAIL": "test@localhost",
+        "GIT_COMMITTER_NAME": "test",
+        "GIT_COMMITTER_EMAIL": "test@localhost",
+    }
+    return subprocess.run(
+        ["git", *args],
+        cwd=cwd,
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+
+@pytest.fixture
+def repo(tmp_path):
+    (tmp_path / "old.py").write_text(ORIGINAL)
+    (tmp_path / "other.py").write_text("other = 1\n")
+    git("init", "-q", cwd=tmp_path)
+    git("add", "-A", cwd=tmp_path)
+    git("commit", "-q", "-m", "base", cwd=tmp_path)
+    return tmp_path
+
+
+def rename_patch(repo, new_source):
+    """A rename of old.py to new.py, with new.py's content changed."""
+    git("mv", "old.py", "new.py", cwd=repo)
+    (repo / "new.py").write_text(new_source)
+    (repo / "other.py").write_text("other = 2\n")
+    patch = git("diff", "-M", "HEAD", cwd=repo)
+    git("reset", "-q", "--hard", cwd=repo)
+    assert "rename from old.py" in patch
+    return patch
+
+
+def test_rejected_rename_restores_source(repo):
+    patch = rename_patch(repo, ORIGINAL + "broken = (\n")
+
+    with staged_patch(patch) as patch_file:
+        applied = apply_patch(patch_file, str(repo))
+
+    assert not applied.ok
+    assert applied.stage == "compile"
+    assert (repo / "old.py").read_text() == ORIGINAL
+    assert not (repo / "new.py").exists()
+    assert (repo / "other.py").read_text() == "other = 1\n"
+    assert git("status", "--porcelain", cwd=repo) == ""
+
+
+def test_rename_applies(repo):
+    patch = rename_patch(repo, ORIGINAL + "added = 1\n")
+
+    with staged_patch(patch) as patch_file:
+        applied = apply_patch(patch_file, str(repo))
+
+    assert applied.ok
+    assert set(applied.touched) == {"new.py", "old.py", "other.py"}
+    assert not (repo / "old.py").exists()
+    assert (repo / "new.py").read_text().endswith("added = 1\n")
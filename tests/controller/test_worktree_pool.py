@@ -0,0 +1,90 @@
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from shared.controller import worktree_pool
+from shared.controller.snapshot import SnapshotManager
+from shared.controller.worktree_pool import WorktreePool
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "module.py").write_text("VALUE = 1\n")
+    env = {
+        **os.environ,
+        "GIT_AUTHOR_NAME": "test",
+        "GIT_AUTHOR_EMAIL": "test@localhost",
+        "GIT_COMMITTER_NAME": "test",
+        "GIT_COMMITTER_EMAIL": "test@localhost",
+    }
+    for args in (["init", "-q"], ["add", "-A"], ["commit", "-q", "-m", "base"]):
+        subprocess.run(
+            ["git", *args], cwd=source, env=env, check=True, capture_output=True
+        )
+    return source
+
+
+@pytest.fixture
+def pool(source_dir, tmp_path, monkeypatch):
+    snapshot_root = str(tmp_path / "snapshots")
+
+    class Snapshots(SnapshotManager):
+        # Keep the source tree's snapshots out of the real snapshot dir
+        def __init__(self, working_dir, root=snapshot_root):
+            super().__init__(working_dir, root=root)
+
+    monkeypatch.setattr(worktree_pool, "SnapshotManager", Snapshots)
+    return WorktreePool(str(source_dir), root=str(tmp_path / "pool"), size=0)
+
+
+def test_concurrent_leases_share_one_tree(pool, monkeypatch):
+    create = pool._create
+
+    def slow_create():
+        # Widen the window in which every caller has missed the lease
+        time.sleep(0.2)
+        return create()
+
+    monkeypatch.setattr(pool, "_create", slow_create)
+
+    barrier = threading.Barrier(3)
+
+    def lease():
+        barrier.wait()
+        return pool.lease("k")
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        trees = [f.result() for f in [executor.submit(lease) for _ in range(3)]]
+
+    assert {tree.path for tree in trees} == {trees[0].path}
+    assert pool._created == 1
+
+    pool.release("k")
+    pool._recycler.shutdown(wait=True)
+    assert pool._leases == {}
+    assert pool._ready.qsize() == 1
+    assert pool._ready.get_nowait().path == trees[0].path
+
+
+def test_failed_lease_is_not_kept(pool, monkeypatch):
+    create = pool._create
+    calls = []
+
+    def flaky_create():
+        calls.append(None)
+        if len(calls) == 1:
+            raise RuntimeError("git worktree add failed")
+        return create()
+
+    monkeypatch.setattr(pool, "_create", flaky_create)
+
+    with pytest.raises(RuntimeError):
+        pool.lease("k")
+    assert pool._leases == {}
+    assert pool.lease("k").path.endswith("wt0")